@@ -22,7 +22,7 @@ class Settings(BaseSettings):
     
     # 上传配置
     MAX_FILE_SIZE: int = 50 * 1024 * 1024  # 50MB
-    ALLOWED_EXTENSIONS: set = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp"}
+    ALLOWED_EXTENSIONS: frozenset[str] = frozenset({".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp"})
     THUMBNAIL_SIZE: int = 480
     THUMBNAIL_QUALITY: int = 86
     THUMBNAIL_WEBP_METHOD: int = 4
@@ -36,6 +36,8 @@ class Settings(BaseSettings):
     PORT: int = 8000
     DEBUG: bool = True
     ENABLE_API_DOCS: bool = False
+    # 同步路由与文件 IO 所用 anyio 线程池的并发上限（anyio 默认 40）
+    THREADPOOL_SIZE: int = 100
     
     # 安全配置
     SECRET_KEY: str = "your-secret-key-here"  # 在生产环境中应该设置为随机字符串
@@ -57,3 +59,12 @@ class Settings(BaseSettings):
 
 # 创建全局设置实例
 settings = Settings()
+
+# 常用目录只解析一次，调用方直接引用而不是每次重新拼接
+BASE_DIR: Path = Path(settings.BASE_DIR).resolve()
+DATA_DIR: Path = Path(settings.DATA_PATH).resolve()
+STORE_DIR: Path = Path(settings.STORE_PATH).resolve()
+TEMP_DIR: Path = Path(settings.TEMP_PATH).resolve()
+PENDING_DIR: Path = Path(settings.PENDING_PATH).resolve()
+THUMB_DIR: Path = Path(settings.THUMB_PATH).resolve()
+EMOJI_DIR: Path = Path(settings.EMOJI_PATH).resolve()
@@ -0,0 +1,122 @@
+"""In-process buffers for hot view/query counters.
+
+Image views and character queries are bumped in memory and flushed to SQLite
+in one upsert per table every few seconds instead of one commit per request.
+"""
+
+import threading
+from collections import defaultdict
+
+from sqlalchemy import text
+
+from .logger import log_error
+from .utils import utc_now
+
+FLUSH_INTERVAL_SECONDS = 5
+
+_lock = threading.Lock()
+_view_buffer: dict[str, int] = defaultdict(int)
+_query_buffer: dict[int, int] = defaultdict(int)
+_flusher_thread: threading.Thread | None = None
+_flusher_stop = threading.Event()
+
+# 每个键一行 upsert：新键插入，已有键在原值上累加；语句在模块加载时构造一次
+_UPSERT_IMAGE_VIEWS = text(
+    """
+    INSERT INTO image_view_counts (image_id, view_count, updated_at)
+    VALUES (:key, :count, :updated_at)
+    ON CONFLICT(image_id) DO UPDATE SET
+        view_count = COALESCE(image_view_counts.view_count, 0) + excluded.view_count,
+        updated_at = excluded.updated_at
+    """
+)
+# 角色存在性在写入时判断：不存在的 character_id 不插入，搜索路径无需预先查询
+_UPSERT_CHARACTER_QUERIES = text(
+    """
+    INSERT INTO character_query_counts (character_id, query_count, updated_at)
+    SELECT :key, :count, :updated_at
+    WHERE EXISTS (SELECT 1 FROM characters WHERE characters.id = :key)
+    ON CONFLICT(character_id) DO UPDATE SET
+        query_count = COALESCE(character_query_counts.query_count, 0) + excluded.query_count,
+        updated_at = excluded.updated_at
+    """
+)
+
+
+def bump_image_view(image_id: str) -> None:
+    with _lock:
+        _view_buffer[image_id] += 1
+
+
+def bump_character_query(character_id: int) -> None:
+    with _lock:
+        _query_buffer[character_id] += 1
+
+
+def _swap_buffers() -> tuple[dict[str, int], dict[int, int]]:
+    global _view_buffer, _query_buffer
+    with _lock:
+        views, queries = _view_buffer, _query_buffer
+        _view_buffer, _query_buffer = defaultdict(int), defaultdict(int)
+    return views, queries
+
+
+def _restore_buffers(views: dict[str, int], queries: dict[int, int]) -> None:
+    """写入失败时把取出的计数合并回缓冲区，留待下次写入"""
+    with _lock:
+        for key, count in views.items():
+            _view_buffer[key] += count
+        for key, count in queries.items():
+            _query_buffer[key] += count
+
+
+def flush_counters() -> None:
+    """把缓冲的计数合并写入数据库；失败时计数放回缓冲区并抛出异常"""
+    from .database import engine
+
+    views, queries = _swap_buffers()
+    if not views and not queries:
+        return
+
+    now = utc_now()
+    try:
+        with engine.begin() as conn:
+            if views:
+                conn.execute(_UPSERT_IMAGE_VIEWS, [{"key": key, "count": count, "updated_at": now} for key, count in views.items()])
+            if queries:
+                conn.execute(_UPSERT_CHARACTER_QUERIES, [{"key": key, "count": count, "updated_at": now} for key, count in queries.items()])
+    except Exception:
+        _restore_buffers(views, queries)
+        raise
+
+
+def _flush_logged() -> None:
+    try:
+        flush_counters()
+    except Exception as exc:
+        log_error(f"计数写入失败，将在下次重试: {exc}")
+
+
+def _worker() -> None:
+    while not _flusher_stop.wait(FLUSH_INTERVAL_SECONDS):
+        _flush_logged()
+
+
+def start_counter_flusher() -> None:
+    """启动后台线程，定期把计数写入数据库"""
+    global _flusher_thread
+    if _flusher_thread is not None:
+        return
+    _flusher_stop.clear()
+    _flusher_thread = threading.Thread(target=_worker, name="counter_flusher", daemon=True)
+    _flusher_thread.start()
+
+
+def stop_counter_flusher() -> None:
+    """停止后台线程，并把关闭前缓冲的计数写入数据库"""
+    global _flusher_thread
+    if _flusher_thread is not None:
+        _flusher_stop.set()
+        _flusher_thread.join()
+        _flusher_thread = None
+    _flush_logged()
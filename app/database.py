@@ -1,33 +1,106 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, exists, make_url, text
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import QueuePool
 from contextlib import contextmanager
+from typing import Iterator
 import os
 import shutil
-import hashlib
-import threading
-import time
+import asyncio
+import itertools
+import json
+import mmap
+import sqlite3
 from datetime import datetime, timedelta
 from .models import Base
-from .config import settings
+from .config import settings, DATA_DIR
 from .logger import log_success
+from .utils import utc_now
 
 # 数据库路径
-DATABASE_PATH = os.path.join(settings.DATA_PATH, "picmanager.db")
+DATABASE_PATH = str(DATA_DIR / "picmanager.db")
 DATABASE_URL = settings.DATABASE_URL
 
-# 创建数据库引擎
-engine = create_engine(
-    DATABASE_URL,
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+
+def _read_only_url(url: str) -> str:
+    """把 SQLite 地址转换为只读 URI 模式，其他数据库原样返回"""
+    if not IS_SQLITE:
+        return url
+    database = make_url(url).database
+    if not database or database == ":memory:":
+        return url
+    return f"sqlite:///file:{database}?mode=ro&uri=true"
+
+
+_engine_options = dict(
     echo=False,  # 设置为True可以看到SQL语句
-    connect_args={"check_same_thread": False}
+    # 编译后的 SQL 按语句结构缓存；路由里的查询形态较多，默认 500 条会被频繁淘汰
+    query_cache_size=1200,
+    poolclass=QueuePool,
+    connect_args={"check_same_thread": False} if IS_SQLITE else {},
 )
 
+if IS_SQLITE:
+    # SQLite 连接不会过期：写连接常驻一个，读连接在 WAL 下可以并行。
+    # 写连接被长请求占住时允许少量溢出连接，写入仍由 busy_timeout 串行化；
+    # 取连接最多等 10 秒，超时由应用返回 503
+    _write_pool = dict(pool_size=1, max_overflow=4, pool_timeout=10, pool_pre_ping=False, pool_recycle=-1)
+    _read_pool = dict(pool_size=8, max_overflow=0, pool_pre_ping=False, pool_recycle=-1)
+else:
+    # 网络数据库：放大连接池，取连接超时快速失败，并检测、定期回收被服务端断开的连接
+    _write_pool = _read_pool = dict(
+        pool_size=20, max_overflow=20, pool_timeout=10, pool_pre_ping=True, pool_recycle=3600,
+    )
+
+# 创建数据库引擎
+engine = create_engine(DATABASE_URL, **_write_pool, **_engine_options)
+read_engine = create_engine(_read_only_url(DATABASE_URL), **_read_pool, **_engine_options)
+
+SQLITE_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA busy_timeout=5000",
+)
+
+
+def _run_pragmas(dbapi_connection, pragmas) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in pragmas:
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+
+if IS_SQLITE:
+    @event.listens_for(engine, "connect")
+    def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+        """每个新连接启用 WAL 并调整同步/缓存参数，减少每次提交的 fsync"""
+        _run_pragmas(dbapi_connection, ("PRAGMA journal_mode=WAL",) + SQLITE_PRAGMAS)
+
+    @event.listens_for(read_engine, "connect")
+    def _apply_sqlite_read_pragmas(dbapi_connection, connection_record):
+        """只读连接不能切换日志模式，只调整缓存参数"""
+        _run_pragmas(dbapi_connection, SQLITE_PRAGMAS)
+
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-_snapshot_lock = threading.Lock()
-_commit_counter = 0
-_snapshot_daily_thread_started = False
+SessionLocalRO = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# 修改 apply_migrations() 时递增，已迁移到该版本的数据库启动时直接跳过
+SCHEMA_VERSION = 7
+SNAPSHOT_COMMIT_THRESHOLD = 50
+# itertools.count 的 next() 在 C 层完成，无需加锁即可线程安全地递增
+_commit_counter = itertools.count(1)
+# 快照任务由事件循环驱动，未启动时（如 CLI）请求会同步执行
+_snapshot_loop: asyncio.AbstractEventLoop | None = None
+_snapshot_requested: asyncio.Event | None = None
+_snapshot_task: asyncio.Task | None = None
+_snapshot_daily_handle: asyncio.TimerHandle | None = None
+_snapshot_stopping = False
 
 def create_tables():
     """创建所有数据表"""
@@ -35,14 +108,6 @@ def create_tables():
     os.makedirs(os.path.dirname(DATABASE_PATH), exist_ok=True)
     Base.metadata.create_all(bind=engine)
 
-def get_db() -> Session:
-    """获取数据库会话"""
-    db = SessionLocal()
-    try:
-        return db
-    finally:
-        pass  # 不在这里关闭，让调用者管理
-
 @contextmanager
 def get_db_context():
     """获取数据库会话的上下文管理器"""
@@ -57,12 +122,41 @@ def get_db_context():
     finally:
         db.close()
 
+def get_db() -> Iterator[Session]:
+    """FastAPI 依赖形式的 get_db_context：``db: Session = Depends(get_db)``，请求结束时提交并关闭"""
+    with get_db_context() as db:
+        yield db
+
+def row_exists(db: Session, *criteria) -> bool:
+    """只判断是否存在匹配行（SELECT EXISTS），不加载整行也不进入 identity map"""
+    return db.query(exists().where(*criteria)).scalar()
+
+def find_missing_ids(db: Session, id_column, ids) -> set:
+    """返回 ids 中在表里不存在的那部分；只查询主键列，不构造 ORM 实体"""
+    wanted = set(ids)
+    if not wanted:
+        return set()
+    found = {row[0] for row in db.query(id_column).filter(id_column.in_(wanted))}
+    return wanted - found
+
+@contextmanager
+def get_read_db_context():
+    """获取只读数据库会话，不提交也不计入快照阈值"""
+    db = SessionLocalRO()
+    try:
+        yield db
+    finally:
+        db.rollback()
+        db.close()
+
 def init_database():
     """初始化数据库"""
+    from .counters import start_counter_flusher
+
     restore_snapshot_if_needed()
     create_tables()
     apply_migrations()
-    start_daily_snapshot_scheduler()
+    start_counter_flusher()
     log_success(f"数据库初始化完成: {DATABASE_PATH}")
 
 
@@ -70,12 +164,90 @@ def get_snapshot_path() -> str:
     return f"{DATABASE_PATH}.snapshot"
 
 
-def file_hash(path: str) -> str:
-    hasher = hashlib.sha256()
-    with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(1024 * 1024), b""):
-            hasher.update(chunk)
-    return hasher.hexdigest()
+def get_snapshot_meta_path() -> str:
+    return f"{get_snapshot_path()}.meta"
+
+
+def file_fingerprint(path: str) -> dict:
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def database_fingerprint() -> dict:
+    """数据库文件指纹；WAL 模式下未检查点的修改只体现在 -wal 文件上。
+    空的 -wal 文件不含任何修改，最后一个连接关闭时会被删除，因此不计入指纹"""
+    fingerprint = file_fingerprint(DATABASE_PATH)
+    wal_path = f"{DATABASE_PATH}-wal"
+    if os.path.exists(wal_path):
+        wal = file_fingerprint(wal_path)
+        if wal["size"]:
+            fingerprint["wal"] = wal
+    return fingerprint
+
+
+def _remove_wal_files() -> None:
+    for suffix in ("-wal", "-shm"):
+        try:
+            os.remove(f"{DATABASE_PATH}{suffix}")
+        except FileNotFoundError:
+            pass
+
+
+def files_identical(path_a: str, path_b: str, chunk_size: int = 1024 * 1024) -> bool:
+    """逐字节比较两个文件，优先用 mmap 由 memcmp 完成，遇到第一个差异即返回"""
+    with open(path_a, "rb") as fa, open(path_b, "rb") as fb:
+        size = os.fstat(fa.fileno()).st_size
+        if size != os.fstat(fb.fileno()).st_size:
+            return False
+        if size == 0:
+            return True
+        try:
+            with mmap.mmap(fa.fileno(), 0, access=mmap.ACCESS_READ) as ma, \
+                    mmap.mmap(fb.fileno(), 0, access=mmap.ACCESS_READ) as mb:
+                # mmap 自身的 == 只比较对象身份，要通过 memoryview 比较内容
+                with memoryview(ma) as va, memoryview(mb) as vb:
+                    return va == vb
+        except (OSError, ValueError):
+            pass
+
+        fa.seek(0)
+        fb.seek(0)
+        buffer_a, buffer_b = bytearray(chunk_size), bytearray(chunk_size)
+        view_a, view_b = memoryview(buffer_a), memoryview(buffer_b)
+        while size := fa.readinto(buffer_a):
+            if fb.readinto(buffer_b) != size or view_a[:size] != view_b[:size]:
+                return False
+        return True
+
+
+def _read_snapshot_meta() -> dict | None:
+    try:
+        with open(get_snapshot_meta_path(), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_snapshot_meta(database_fingerprint: dict) -> None:
+    meta = {
+        "database": database_fingerprint,
+        "snapshot": file_fingerprint(get_snapshot_path()),
+    }
+    with open(get_snapshot_meta_path(), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+
+def snapshot_matches_database() -> bool:
+    """判断数据库自上次快照以来是否未被修改"""
+    current = database_fingerprint()
+    snapshot = file_fingerprint(get_snapshot_path())
+    meta = _read_snapshot_meta()
+    if meta:
+        return meta.get("database") == current and meta.get("snapshot") == snapshot
+    # 旧版本用 copy2 生成的快照没有 meta，属性不一致时再比较内容
+    if current == snapshot:
+        return True
+    return "wal" not in current and files_identical(DATABASE_PATH, get_snapshot_path())
 
 
 def restore_snapshot_if_needed() -> None:
@@ -85,42 +257,82 @@ def restore_snapshot_if_needed() -> None:
         return
 
     if not os.path.exists(DATABASE_PATH):
+        _remove_wal_files()
         shutil.copy2(snapshot_path, DATABASE_PATH)
         return
 
     try:
-        current_hash = file_hash(DATABASE_PATH)
-        snapshot_hash = file_hash(snapshot_path)
+        matches = snapshot_matches_database()
     except Exception:
         return
 
-    if current_hash != snapshot_hash:
+    if not matches:
         try:
             engine.dispose()
+            read_engine.dispose()
         except Exception:
             pass
+        # 旧的 WAL 帧不属于快照，必须与数据库文件一起替换掉
+        _remove_wal_files()
         shutil.copy2(snapshot_path, DATABASE_PATH)
 
 
 def create_db_snapshot() -> None:
-    """创建数据库快照"""
+    """通过 SQLite 在线备份接口创建一致的数据库快照"""
     if not os.path.exists(DATABASE_PATH):
         return
     snapshot_path = get_snapshot_path()
+    tmp_path = f"{snapshot_path}.tmp"
     try:
-        shutil.copy2(DATABASE_PATH, snapshot_path)
+        source = sqlite3.connect(DATABASE_PATH)
+        target = sqlite3.connect(tmp_path)
+        try:
+            # 先把 WAL 合并回主文件并截断，再记录指纹：否则之后的检查点（包括关闭时的）
+            # 会改变主文件，启动时指纹永远对不上。有读者占用时检查点可能不完整，
+            # 此时指纹里带上 WAL，最多多做一次恢复
+            source.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            fingerprint = database_fingerprint()
+            source.backup(target, pages=1024, sleep=0)
+        finally:
+            target.close()
+            source.close()
+        os.replace(tmp_path, snapshot_path)
+        _write_snapshot_meta(fingerprint)
     except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+async def _snapshot_job() -> None:
+    """唯一的快照执行者：合并期间到达的请求，在线程池中执行备份"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await _snapshot_requested.wait()
+        _snapshot_requested.clear()
+        await loop.run_in_executor(None, create_db_snapshot)
+        if _snapshot_stopping and not _snapshot_requested.is_set():
+            return
+
+
+def request_db_snapshot() -> None:
+    """请求创建快照，短时间内的多次请求只会触发一次"""
+    loop = _snapshot_loop
+    if loop is None:
+        create_db_snapshot()
+        return
+    try:
+        loop.call_soon_threadsafe(_snapshot_requested.set)
+    except RuntimeError:
+        # 事件循环已关闭，关闭流程会自行创建最后一次快照
         pass
 
 
 def register_db_commit() -> None:
-    """记录一次数据库提交，累计到阈值后更新快照"""
-    global _commit_counter
-    with _snapshot_lock:
-        _commit_counter += 1
-        if _commit_counter >= 50:
-            _commit_counter = 0
-            create_db_snapshot()
+    """记录一次数据库提交，累计到阈值后请求更新快照"""
+    if next(_commit_counter) % SNAPSHOT_COMMIT_THRESHOLD == 0:
+        request_db_snapshot()
 
 
 def _seconds_until_next_midnight() -> float:
@@ -129,24 +341,55 @@ def _seconds_until_next_midnight() -> float:
     return max((next_midnight - now).total_seconds(), 1.0)
 
 
-def start_daily_snapshot_scheduler() -> None:
+def _schedule_daily_snapshot() -> None:
     """每天 0 点创建一次快照"""
-    global _snapshot_daily_thread_started
-    if _snapshot_daily_thread_started:
-        return
-    _snapshot_daily_thread_started = True
+    global _snapshot_daily_handle
+    _snapshot_daily_handle = _snapshot_loop.call_later(_seconds_until_next_midnight(), _daily_snapshot)
 
-    def _worker():
-        while True:
-            time.sleep(_seconds_until_next_midnight())
-            create_db_snapshot()
 
-    threading.Thread(target=_worker, name="db_snapshot_scheduler", daemon=True).start()
+def _daily_snapshot() -> None:
+    _snapshot_requested.set()
+    _schedule_daily_snapshot()
+
+
+def init_snapshot_jobs() -> None:
+    """在运行中的事件循环上注册快照任务，需在 FastAPI 启动时调用"""
+    global _snapshot_loop, _snapshot_requested, _snapshot_task, _snapshot_stopping
+    if _snapshot_task is not None:
+        return
+    _snapshot_stopping = False
+    _snapshot_requested = asyncio.Event()
+    _snapshot_loop = asyncio.get_running_loop()
+    _snapshot_task = _snapshot_loop.create_task(_snapshot_job())
+    _schedule_daily_snapshot()
+
+
+async def stop_snapshot_jobs() -> None:
+    """停止快照任务，并在退出前创建最后一次快照"""
+    global _snapshot_loop, _snapshot_task, _snapshot_daily_handle, _snapshot_stopping
+    if _snapshot_task is None:
+        create_db_snapshot()
+        return
+    _snapshot_daily_handle.cancel()
+    _snapshot_daily_handle = None
+    # 由任务自身执行最后一次快照，避免与进行中的备份并发
+    _snapshot_stopping = True
+    _snapshot_requested.set()
+    await _snapshot_task
+    _snapshot_loop = None
+    _snapshot_task = None
 
 
 def apply_migrations():
     """对SQLite执行必要的结构迁移（增量）"""
     with engine.connect() as conn:
+        if conn.execute(text("PRAGMA user_version")).scalar() == SCHEMA_VERSION:
+            return
+
+    with engine.begin() as conn:
+        # 所有迁移放在同一个写事务里，只需一次提交
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
         # users.last_notice_at
         user_columns = [row[1] for row in conn.execute(text("PRAGMA table_info(users)"))]
         if "last_notice_at" not in user_columns:
@@ -203,6 +446,35 @@ def apply_migrations():
             conn.execute(text("CREATE INDEX IF NOT EXISTS ix_guestbook_messages_author_qq ON guestbook_messages (author_qq)"))
         conn.execute(text("CREATE INDEX IF NOT EXISTS ix_image_character_character_image ON image_character_association (character_id, image_id)"))
 
+        # guest_limits 按 (ip, date) 唯一；先合并历史上的重复记录
+        conn.execute(text(
+            """
+            DELETE FROM guest_limits
+            WHERE id NOT IN (SELECT MAX(id) FROM guest_limits GROUP BY ip_address, date)
+            """
+        ))
+        conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_guest_ip_date ON guest_limits (ip_address, date)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_session_expires ON user_sessions (session_id, expires_at)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_user_sessions_expires_at ON user_sessions (expires_at)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_role ON users (role)"))
+        # 部分索引无法匹配绑定参数形式的 status 条件，改为普通复合索引
+        conn.execute(text("DROP INDEX IF EXISTS ix_pending_requests_pending_created"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_pending_requests_status_created ON pending_requests (status, created_at)"))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_pending_requests_user_status_reviewed "
+            "ON pending_requests (user_id, status, reviewed_at)"
+        ))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_pending_requests_user_created ON pending_requests (user_id, created_at)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_characters_group_name ON characters (group_id, name)"))
+
+        # user_sessions.is_guest: "true"/"false" 文本改为布尔整数
+        session_columns = {row[1]: row[2] for row in conn.execute(text("PRAGMA table_info(user_sessions)"))}
+        if session_columns.get("is_guest", "").upper().startswith("VARCHAR"):
+            conn.execute(text("ALTER TABLE user_sessions ADD COLUMN is_guest_bool BOOLEAN NOT NULL DEFAULT 0"))
+            conn.execute(text("UPDATE user_sessions SET is_guest_bool = (is_guest = 'true')"))
+            conn.execute(text("ALTER TABLE user_sessions DROP COLUMN is_guest"))
+            conn.execute(text("ALTER TABLE user_sessions RENAME COLUMN is_guest_bool TO is_guest"))
+
         conn.execute(text(
             """
             CREATE TABLE IF NOT EXISTS feature_tags (
@@ -382,7 +654,7 @@ def apply_migrations():
         unchecked_images = conn.execute(text(
             "SELECT image_id, file_path FROM images WHERE file_checked_at IS NULL"
         )).fetchall()
-        checked_at = datetime.utcnow()
+        checked_at = utc_now()
         for image_id, file_path in unchecked_images:
             normalized = (file_path or "").replace("\\", "/").lstrip("/")
             full_path = os.path.join(settings.BASE_DIR, *normalized.split("/")) if normalized else ""
@@ -403,4 +675,4 @@ def apply_migrations():
                 "image_id": image_id,
             })
 
-        conn.commit()
+        conn.execute(text(f"PRAGMA user_version = {SCHEMA_VERSION}"))
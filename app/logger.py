@@ -1,9 +1,14 @@
 from __future__ import annotations
 
+from functools import partial
 from http import HTTPStatus
+from logging.handlers import QueueHandler, QueueListener
 from time import perf_counter
 import time
 from typing import Any, Awaitable, Callable
+import atexit
+import logging
+import queue
 import sys
 
 LogHook = Callable[[str, str], None]
@@ -15,21 +20,54 @@ _COLOR_SUCCESS = "\033[92m"
 _COLOR_ERROR = "\033[91m"
 
 
-def _default_log_hook(level: str, message: str) -> None:
-    color = _COLOR_INFO
-    if level == "SUCCESS":
-        color = _COLOR_SUCCESS
-    elif level == "ERROR":
-        color = _COLOR_ERROR
+_LEVEL_COLORS = {
+    "INFO": _COLOR_INFO,
+    "SUCCESS": _COLOR_SUCCESS,
+    "ERROR": _COLOR_ERROR,
+}
+# 输出到管道/文件（journald、docker logs）时不写 ANSI 颜色码
+_USE_COLOR = hasattr(sys.stdout, "isatty") and sys.stdout.isatty()
+_LEVEL_STYLES = {
+    level: (color, _COLOR_RESET) if _USE_COLOR else ("", "")
+    for level, color in _LEVEL_COLORS.items()
+}
+_PLAIN_STYLE = (_COLOR_INFO, _COLOR_RESET) if _USE_COLOR else ("", "")
+
 
-    formatted = f"[{level}] {message}"
-    sys.stdout.write(f"{color}{formatted}{_COLOR_RESET}\n")
+def _default_log_hook(level: str, message: str) -> None:
+    prefix, suffix = _LEVEL_STYLES.get(level, _PLAIN_STYLE)
+    sys.stdout.write(f"{prefix}[{level}] {message}{suffix}\n")
 
 
 _log_hook: LogHook = _default_log_hook
 _actor_cache: dict[str, tuple[float, str]] = {}
 _ACTOR_CACHE_TTL = 30
 
+SUCCESS = 25
+logging.addLevelName(SUCCESS, "SUCCESS")
+_LEVELS = {"INFO": logging.INFO, "SUCCESS": SUCCESS, "ERROR": logging.ERROR}
+
+
+class _HookHandler(logging.Handler):
+    """在后台监听线程中把日志记录交给当前的日志hook输出。"""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            _log_hook(record.levelname, record.getMessage())
+        except Exception:
+            self.handleError(record)
+
+
+# 调用方只把记录放进队列，写 stdout 的系统调用由监听线程完成
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+_logger = logging.getLogger("picmanager")
+_logger.setLevel(logging.INFO)
+_logger.propagate = False
+_logger.addHandler(QueueHandler(_log_queue))
+_listener = QueueListener(_log_queue, _HookHandler())
+_listener.start()
+atexit.register(_listener.stop)
+
 
 def set_log_hook(hook: LogHook) -> None:
     """设置日志hook，方便外部替换输出方式。"""
@@ -38,19 +76,12 @@ def set_log_hook(hook: LogHook) -> None:
 
 
 def _log(level: str, message: str) -> None:
-    _log_hook(level, message)
-
-
-def log_info(message: str) -> None:
-    _log("INFO", message)
-
-
-def log_success(message: str) -> None:
-    _log("SUCCESS", message)
+    _logger.log(_LEVELS.get(level, logging.INFO), message)
 
 
-def log_error(message: str) -> None:
-    _log("ERROR", message)
+log_info: Callable[[str], None] = partial(_log, "INFO")
+log_success: Callable[[str], None] = partial(_log, "SUCCESS")
+log_error: Callable[[str], None] = partial(_log, "ERROR")
 
 
 def _path_value(path: str, prefix: str) -> str:
@@ -73,19 +104,19 @@ def _request_actor(request: Any) -> str:
 
     # Local imports avoid a logger -> database -> logger circular import at app startup.
     try:
-        from .database import SessionLocal
+        from .database import SessionLocalRO
         from .models import User, UserSession
     except Exception:
         return "[unknown]"
 
-    db = SessionLocal()
+    db = SessionLocalRO()
     try:
         session = db.query(UserSession).filter(UserSession.session_id == session_id).first()
         if not session:
             actor = "[anonymous]"
             _actor_cache[session_id] = (now + _ACTOR_CACHE_TTL, actor)
             return actor
-        if session.is_guest == "true":
+        if session.is_guest:
             actor = f"[guest:{session.guest_ip or 'unknown'}]"
             _actor_cache[session_id] = (now + _ACTOR_CACHE_TTL, actor)
             return actor
@@ -175,6 +206,7 @@ def _describe_operation(method: str, path: str) -> str:
     admin_actions = {
         ("GET", "/api/admin/stats"): "查看管理统计",
         ("GET", "/api/admin/pending"): "查看待审核列表",
+        ("POST", "/api/admin/pending/bulk"): "批量处理审核请求",
         ("GET", "/api/admin/admins"): "查看管理员列表",
         ("POST", "/api/admin/admins"): "添加管理员",
         ("POST", "/api/system/cleanup"): "清理孤儿数据",
@@ -1,30 +1,70 @@
-from sqlalchemy import Column, String, Integer, Text, Table, ForeignKey, DateTime, Enum, Date
+from sqlalchemy import Column, String, Integer, Text, Table, ForeignKey, DateTime, Enum, Date, Index, Boolean, CheckConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
-from datetime import datetime
 import enum
 
+from .utils import utc_now
+
+try:
+    from enum import StrEnum
+except ImportError:  # Python 3.10
+    class StrEnum(str, enum.Enum):
+        def __str__(self) -> str:
+            return str(self.value)
+
 Base = declarative_base()
 
+
+def _enum_values(enum_cls) -> list:
+    return [member.value for member in enum_cls]
+
+
+class ChoiceEnum(StrEnum):
+    """取值集合在定义时计算一次，校验时直接复用同一个 frozenset"""
+
+    @classmethod
+    def values(cls) -> frozenset:
+        return cls._VALUES
+
+    @classmethod
+    def check_sql(cls, column: str) -> str:
+        quoted = ", ".join(f"'{value}'" for value in _enum_values(cls))
+        return f"{column} IN ({quoted})"
+
+
 # 用户角色枚举
-class UserRole(enum.Enum):
+class UserRole(ChoiceEnum):
     ROOT = "root"
     ADMIN = "admin"
     USER = "user"
     GUEST = "guest"
 
+# 管理员角色（root 与 admin），模块级常量避免每次请求重建列表
+ADMIN_ROLES = (UserRole.ROOT, UserRole.ADMIN)
+ADMIN_ROLE_SET = frozenset(ADMIN_ROLES)
+
 # 待审核请求类型枚举
-class RequestType(enum.Enum):
+class RequestType(ChoiceEnum):
     ADD = "add"
     EDIT = "edit"
     DELETE = "delete"
+    GROUP_ADD = "group_add"
+    GROUP_EDIT = "group_edit"
+    GROUP_DELETE = "group_delete"
+    CHARACTER_ADD = "character_add"
+    CHARACTER_EDIT = "character_edit"
+    CHARACTER_DELETE = "character_delete"
 
 # 待审核请求状态枚举
-class RequestStatus(enum.Enum):
+class RequestStatus(ChoiceEnum):
     PENDING = "pending"
     APPROVED = "approved"
     REJECTED = "rejected"
 
+
+for _choice_enum in (UserRole, RequestType, RequestStatus):
+    _choice_enum._VALUES = frozenset(_enum_values(_choice_enum))
+
 # 图片与角色的多对多关联表
 image_character_association = Table(
     'image_character_association',
@@ -82,14 +122,23 @@ class User(Base):
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     qq_number = Column(String(20), unique=True, nullable=False, index=True)
-    role = Column(String(20), nullable=False, default=UserRole.USER.value)
+    role = Column(
+        Enum(UserRole, native_enum=False, length=20, values_callable=_enum_values),
+        nullable=False,
+        default=UserRole.USER,
+    )
     password_hash = Column(String(255), nullable=True)  # 只有管理员需要密码
     nickname = Column(String(100), nullable=True)
     avatar_url = Column(String(500), nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    last_notice_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=utc_now)
+    updated_at = Column(DateTime, default=utc_now, onupdate=utc_now)
+    last_notice_at = Column(DateTime, default=utc_now)
     
+    __table_args__ = (
+        CheckConstraint(UserRole.check_sql("role"), name="ck_users_role"),
+        Index("ix_users_role", "role"),
+    )
+
     # 关联待审核请求（指定外键以避免歧义）
     pending_requests = relationship(
         "PendingRequest", 
@@ -103,8 +152,15 @@ class PendingRequest(Base):
     __tablename__ = 'pending_requests'
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    request_type = Column(String(20), nullable=False)  # add, edit, delete
-    status = Column(String(20), nullable=False, default=RequestStatus.PENDING.value)
+    request_type = Column(
+        Enum(RequestType, native_enum=False, length=20, values_callable=_enum_values),
+        nullable=False,
+    )
+    status = Column(
+        Enum(RequestStatus, native_enum=False, length=20, values_callable=_enum_values),
+        nullable=False,
+        default=RequestStatus.PENDING,
+    )
     
     # 用户信息（可能是登录用户或游客）
     user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
@@ -121,7 +177,7 @@ class PendingRequest(Base):
     original_filename = Column(String(500), nullable=True)
     rejection_reason = Column(Text, nullable=True)
     
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=utc_now)
     reviewed_at = Column(DateTime, nullable=True)
     reviewed_by = Column(Integer, ForeignKey('users.id'), nullable=True)
     
@@ -129,6 +185,16 @@ class PendingRequest(Base):
     user = relationship("User", foreign_keys=[user_id], back_populates="pending_requests")
     reviewer = relationship("User", foreign_keys=[reviewed_by])
 
+    __table_args__ = (
+        CheckConstraint(RequestType.check_sql("request_type"), name="ck_pending_requests_type"),
+        CheckConstraint(RequestStatus.check_sql("status"), name="ck_pending_requests_status"),
+        # 按状态计数与待审核列表按时间排序共用
+        Index("ix_pending_requests_status_created", "status", "created_at"),
+        # 个人通知计数 / 统计按 (user_id, status) 过滤，个人请求列表按 created_at 倒序
+        Index("ix_pending_requests_user_status_reviewed", "user_id", "status", "reviewed_at"),
+        Index("ix_pending_requests_user_created", "user_id", "created_at"),
+    )
+
 
 class GuestLimit(Base):
     """游客操作限制表"""
@@ -138,8 +204,10 @@ class GuestLimit(Base):
     ip_address = Column(String(50), nullable=False, index=True)
     date = Column(Date, nullable=False, index=True)
     operation_count = Column(Integer, default=0)
-    
-    # 联合唯一约束由代码层面控制
+
+    __table_args__ = (
+        Index("ix_guest_ip_date", "ip_address", "date", unique=True),
+    )
 
 
 class UserSession(Base):
@@ -150,14 +218,19 @@ class UserSession(Base):
     session_id = Column(String(36), unique=True, nullable=False, index=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=True)  # None表示游客
     guest_ip = Column(String(50), nullable=True)  # 游客IP
-    is_guest = Column(String(5), nullable=False, default="false")  # "true" 或 "false"
-    created_at = Column(DateTime, default=datetime.utcnow)
-    last_activity = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    is_guest = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime, default=utc_now)
+    last_activity = Column(DateTime, default=utc_now, onupdate=utc_now)
     expires_at = Column(DateTime, nullable=False)  # 过期时间
     
     # 关联用户
     user = relationship("User")
 
+    __table_args__ = (
+        Index("ix_session_expires", "session_id", "expires_at"),
+        Index("ix_user_sessions_expires_at", "expires_at"),
+    )
+
 
 class LoginTicket(Base):
     """One-time QQ login ticket issued by trusted bot-side services."""
@@ -169,7 +242,7 @@ class LoginTicket(Base):
     purpose = Column(String(50), nullable=False, default="login", index=True)
     redirect_path = Column(String(500), nullable=True)
     created_by = Column(String(100), nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=utc_now)
     expires_at = Column(DateTime, nullable=False, index=True)
     used_at = Column(DateTime, nullable=True)
 
@@ -181,8 +254,8 @@ class Group(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String(255), unique=True, nullable=False, index=True)
     description = Column(Text, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, default=utc_now)
+    updated_at = Column(DateTime, default=utc_now, onupdate=utc_now)
     
     # 关联角色
     characters = relationship("Character", back_populates="group", cascade="all, delete-orphan")
@@ -210,11 +283,16 @@ class Character(Base):
     name = Column(String(255), nullable=False, index=True)
     group_id = Column(Integer, ForeignKey('groups.id'), nullable=False)
     description = Column(Text, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, default=utc_now)
+    updated_at = Column(DateTime, default=utc_now, onupdate=utc_now)
     
     # 关联分组
     group = relationship("Group", back_populates="characters")
+
+    __table_args__ = (
+        # 同分组重名检查与按分组列出角色
+        Index("ix_characters_group_name", "group_id", "name"),
+    )
     # 关联图片（多对多）
     images = relationship("Image", secondary=image_character_association, back_populates="characters")
     emojis = relationship("Emoji", secondary=emoji_character_association, back_populates="characters")
@@ -241,8 +319,8 @@ class FeatureTag(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String(255), unique=True, nullable=False, index=True)
     description = Column(Text, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, default=utc_now)
+    updated_at = Column(DateTime, default=utc_now, onupdate=utc_now)
 
     characters = relationship("Character", secondary=character_feature_tag_association, back_populates="feature_tags")
     images = relationship("Image", secondary=image_feature_tag_association, back_populates="feature_tags")
@@ -267,8 +345,8 @@ class EmotionTag(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String(255), unique=True, nullable=False, index=True)
     description = Column(Text, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, default=utc_now)
+    updated_at = Column(DateTime, default=utc_now, onupdate=utc_now)
 
     emojis = relationship("Emoji", secondary=emoji_emotion_association, back_populates="emotions")
     aliases = relationship("EmotionTagAlias", back_populates="emotion", cascade="all, delete-orphan")
@@ -310,8 +388,8 @@ class Image(Base):
     file_checked_at = Column(DateTime, nullable=True)
     thumb_status = Column(String(20), nullable=False, default="pending", index=True)
     # 创建和更新时间
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, default=utc_now)
+    updated_at = Column(DateTime, default=utc_now, onupdate=utc_now)
     
     # 关联角色（多对多）
     characters = relationship("Character", secondary=image_character_association, back_populates="images")
@@ -336,8 +414,8 @@ class Emoji(Base):
     file_path = Column(String(1000), nullable=False)
     file_status = Column(String(20), nullable=False, default="available", index=True)
     file_checked_at = Column(DateTime, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, default=utc_now)
+    updated_at = Column(DateTime, default=utc_now, onupdate=utc_now)
 
     groups = relationship("Group", secondary=emoji_group_association, back_populates="emojis")
     characters = relationship("Character", secondary=emoji_character_association, back_populates="emojis")
@@ -353,7 +431,7 @@ class ImageViewCount(Base):
 
     image_id = Column(String(10), ForeignKey('images.image_id'), primary_key=True)
     view_count = Column(Integer, default=0)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = Column(DateTime, default=utc_now, onupdate=utc_now)
 
     image = relationship("Image")
 
@@ -364,7 +442,7 @@ class CharacterQueryCount(Base):
 
     character_id = Column(Integer, ForeignKey('characters.id'), primary_key=True)
     query_count = Column(Integer, default=0)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = Column(DateTime, default=utc_now, onupdate=utc_now)
 
     character = relationship("Character")
 
@@ -378,4 +456,4 @@ class GuestbookMessage(Base):
     content = Column(Text, nullable=False)
     parent_id = Column(Integer, ForeignKey("guestbook_messages.id"), nullable=True, index=True)
     author_qq = Column(String(20), nullable=True, index=True)
-    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+    created_at = Column(DateTime, nullable=False, default=utc_now, index=True)
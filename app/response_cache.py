@@ -0,0 +1,38 @@
+"""In-process TTL cache for read-mostly admin responses.
+
+Entries are grouped by namespace so write paths can drop everything derived from
+the data they changed with a single ``invalidate("stats")`` call.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Hashable
+
+_lock = threading.Lock()
+_namespaces: dict[str, dict[Hashable, tuple[float, Any]]] = {}
+# 每次失效递增，避免失效前开始计算的旧结果在失效后被写回
+_generations: dict[str, int] = {}
+
+
+def cached_response(namespace: str, ttl_seconds: float, builder: Callable[[], Any], key: Hashable = None) -> Any:
+    """返回命名空间下未过期的缓存结果，否则调用 builder 生成并缓存"""
+    now = time.monotonic()
+    with _lock:
+        entry = _namespaces.get(namespace, {}).get(key)
+        generation = _generations.get(namespace, 0)
+    if entry is not None and entry[0] > now:
+        return entry[1]
+
+    value = builder()
+    with _lock:
+        if _generations.get(namespace, 0) == generation:
+            _namespaces.setdefault(namespace, {})[key] = (now + ttl_seconds, value)
+    return value
+
+
+def invalidate(*namespaces: str) -> None:
+    """清空指定命名空间的所有缓存"""
+    with _lock:
+        for namespace in namespaces:
+            _namespaces.pop(namespace, None)
+            _generations[namespace] = _generations.get(namespace, 0) + 1
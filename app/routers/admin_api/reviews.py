@@ -1,31 +1,96 @@
-from fastapi import APIRouter, HTTPException, Request
-from typing import List
-from datetime import datetime
-import json
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query, Request, Response
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session, joinedload, load_only, selectinload
+from typing import List, Optional
 import os
 
 from ... import schemas
 from ...config import settings
-from ...database import get_db_context
+from ...database import get_db_context, row_exists
+from ...response_cache import invalidate
 from ...models import Character, Group, Image, PendingRequest, RequestStatus, User, UserRole
 from ...security.permissions import require_admin_user_id, require_root_user_id
 from ...services import CharacterService, GroupService, ImageService
+from ...utils import as_int, as_int_list, file_extension_of, json_loads, utc_now
 
 router = APIRouter()
 
 
+# 待审核列表语句，模块加载时构造一次
+_PENDING_LIST = select(PendingRequest).where(
+    PendingRequest.status == RequestStatus.PENDING
+).order_by(PendingRequest.created_at.desc(), PendingRequest.id.desc())
+
+
 @router.get("/pending", response_model=List[schemas.PendingRequestInfo])
-async def get_pending_requests(request: Request):
-    """获取待审核请求列表"""
-    require_admin_user_id(request)
-    
+def get_pending_requests(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[int] = Query(None, ge=1),
+):
+    """获取待审核请求列表
+
+    不传 limit 时返回全部；传入 limit 时按页返回，下一页游标放在 X-Next-Cursor 响应头，
+    作为下一次请求的 cursor 参数。
+    """
     with get_db_context() as db:
-        requests = db.query(PendingRequest).filter(
-            PendingRequest.status == RequestStatus.PENDING.value
-        ).order_by(PendingRequest.created_at.desc()).all()
+        require_admin_user_id(request, db)
+        stmt = _PENDING_LIST
+        if cursor is not None:
+            # id 自增且与 created_at 同序，可直接作为游标
+            stmt = stmt.where(PendingRequest.id < cursor)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        requests = db.execute(stmt).scalars().all()
+        if limit is not None and len(requests) == limit:
+            response.headers["X-Next-Cursor"] = str(requests[-1].id)
+
+        # 先解析全部 image_data 并收集引用的 ID，再按表批量查询，避免逐条 N+1 查询
+        parsed = [(req, json_loads(req.image_data) if req.image_data else None) for req in requests]
+        user_ids, group_ids, character_ids, image_ids = set(), set(), set(), set()
+        for req, image_data in parsed:
+            if req.user_id:
+                user_ids.add(req.user_id)
+            if req.request_type in ["edit", "delete"] and req.image_id:
+                image_ids.add(req.image_id)
+            if not image_data:
+                continue
+            group_id = as_int(image_data.get("group_id"))
+            if group_id is not None:
+                group_ids.add(group_id)
+            character_ids.update(as_int_list(image_data.get("character_ids")))
+            character_id = as_int(image_data.get("character_id"))
+            if character_id is not None:
+                character_ids.add(character_id)
+
+        users = {
+            user.id: user
+            for user in db.query(User).options(
+                load_only(User.id, User.qq_number, User.nickname, User.avatar_url)
+            ).filter(User.id.in_(user_ids)).all()
+        } if user_ids else {}
+        groups = {
+            group.id: group
+            for group in db.query(Group).options(selectinload(Group.aliases)).filter(Group.id.in_(group_ids)).all()
+        } if group_ids else {}
+        characters = {
+            character.id: character
+            for character in db.query(Character).options(
+                joinedload(Character.group),
+                selectinload(Character.nicknames)
+            ).filter(Character.id.in_(character_ids)).all()
+        } if character_ids else {}
+        images = {
+            image.image_id: image
+            for image in db.query(Image).options(
+                load_only(Image.image_id, Image.pid, Image.description, Image.file_path, Image.file_extension),
+                selectinload(Image.characters).load_only(Character.id, Character.name)
+            ).filter(Image.image_id.in_(image_ids)).all()
+        } if image_ids else {}
         
         result = []
-        for req in requests:
+        for req, image_data in parsed:
             item = {
                 "id": req.id,
                 "request_type": req.request_type,
@@ -35,7 +100,7 @@ async def get_pending_requests(request: Request):
                 "user_avatar": None,
                 "guest_ip": req.guest_ip,
                 "image_id": req.image_id,
-                "image_data": json.loads(req.image_data) if req.image_data else None,
+                "image_data": image_data,
                 "temp_file_path": req.temp_file_path,
                 "original_filename": req.original_filename,
                 "rejection_reason": req.rejection_reason,
@@ -49,42 +114,39 @@ async def get_pending_requests(request: Request):
                 "reviewed_at": req.reviewed_at
             }
             
-            if req.user_id:
-                user = db.query(User).filter(User.id == req.user_id).first()
-                if user:
-                    item["user_qq"] = user.qq_number
-                    item["user_nickname"] = user.nickname
-                    item["user_avatar"] = user.avatar_url
+            user = users.get(req.user_id) if req.user_id else None
+            if user:
+                item["user_qq"] = user.qq_number
+                item["user_nickname"] = user.nickname
+                item["user_avatar"] = user.avatar_url
             
             # 获取分组和角色信息
-            if item["image_data"]:
-                image_data = item["image_data"]
+            if image_data:
+                group = groups.get(as_int(image_data.get("group_id")))
                 
                 # 处理分组信息（从image_data中的group_id获取）
-                if image_data.get("group_id"):
-                    group = db.query(Group).filter(Group.id == image_data["group_id"]).first()
-                    if group:
-                        item["group_info"] = {"id": group.id, "name": group.name}
+                if group:
+                    item["group_info"] = {"id": group.id, "name": group.name}
                 
                 # 处理角色信息
                 if image_data.get("character_ids"):
-                    characters = db.query(Character).filter(
-                        Character.id.in_(image_data["character_ids"])
-                    ).all()
-                    if characters:
-                        item["character_names"] = [ch.name for ch in characters]
+                    names = [
+                        characters[cid].name
+                        for cid in dict.fromkeys(as_int_list(image_data["character_ids"]))
+                        if cid in characters
+                    ]
+                    if names:
+                        item["character_names"] = names
 
                 # 分组/角色审核数据
                 if req.request_type.startswith("group_"):
-                    if image_data.get("group_id"):
-                        group = db.query(Group).filter(Group.id == image_data["group_id"]).first()
-                        if group:
-                            item["original_group"] = {
-                                "id": group.id,
-                                "name": group.name,
-                                "aliases": [alias.alias for alias in group.aliases] if group.aliases else [],
-                                "description": group.description
-                            }
+                    if group:
+                        item["original_group"] = {
+                            "id": group.id,
+                            "name": group.name,
+                            "aliases": [alias.alias for alias in group.aliases] if group.aliases else [],
+                            "description": group.description
+                        }
                     if image_data.get("name"):
                         item["group_info"] = {
                             "id": image_data.get("group_id"),
@@ -96,27 +158,26 @@ async def get_pending_requests(request: Request):
                             "name": item["original_group"]["name"]
                         }
                 elif req.request_type.startswith("character_"):
-                    if image_data.get("character_id"):
-                        character = db.query(Character).filter(Character.id == image_data["character_id"]).first()
-                        if character:
-                            item["original_character"] = {
-                                "id": character.id,
-                                "name": character.name,
-                                "group_name": character.group.name if character.group else "",
-                                "nicknames": [n.nickname for n in character.nicknames] if character.nicknames else [],
-                                "description": character.description
-                            }
+                    character = characters.get(as_int(image_data.get("character_id")))
+                    if character:
+                        item["original_character"] = {
+                            "id": character.id,
+                            "name": character.name,
+                            "group_name": character.group.name if character.group else "",
+                            "nicknames": [n.nickname for n in character.nicknames] if character.nicknames else [],
+                            "description": character.description
+                        }
                     if any(key in image_data for key in ["name", "group_id", "nicknames", "description", "character_id"]):
-                        group = None
+                        target_group = None
                         if image_data.get("group_id"):
-                            group = db.query(Group).filter(Group.id == image_data["group_id"]).first()
-                        elif item.get("original_character"):
-                            group = db.query(Group).filter(Group.name == item["original_character"].get("group_name")).first()
+                            target_group = group
+                        elif character:
+                            target_group = character.group
                         item["character_info"] = {
                             "id": image_data.get("character_id"),
                             "name": image_data.get("name"),
                             "group_id": image_data.get("group_id"),
-                            "group_name": group.name if group else "",
+                            "group_name": target_group.name if target_group else "",
                             "nicknames": image_data.get("nicknames") or [],
                             "description": image_data.get("description")
                         }
@@ -131,205 +192,321 @@ async def get_pending_requests(request: Request):
                         }
             
             # 对于 edit 和 delete 请求，获取原图信息
-            if req.request_type in ["edit", "delete"] and req.image_id:
-                original_img = db.query(Image).filter(Image.image_id == req.image_id).first()
-                if original_img:
-                    # 获取原图的角色信息
-                    original_characters = [ch.name for ch in original_img.characters] if original_img.characters else []
-                    item["original_image"] = {
-                        "image_id": original_img.image_id,
-                        "pid": original_img.pid,
-                        "description": original_img.description,
-                        "character_names": original_characters,
-                        "file_path": original_img.file_path,
-                        "file_extension": original_img.file_extension
-                    }
+            original_img = images.get(req.image_id) if req.request_type in ["edit", "delete"] and req.image_id else None
+            if original_img:
+                # 获取原图的角色信息
+                original_characters = [ch.name for ch in original_img.characters] if original_img.characters else []
+                item["original_image"] = {
+                    "image_id": original_img.image_id,
+                    "pid": original_img.pid,
+                    "description": original_img.description,
+                    "character_names": original_characters,
+                    "file_path": original_img.file_path,
+                    "file_extension": original_img.file_extension
+                }
             
-            result.append(schemas.PendingRequestInfo(**item))
+            # 直接返回字典，由 response_model 统一校验一次，不再逐条构造模型
+            result.append(item)
         
         return result
 
 
+def _remove_temp_file(path: Optional[str]) -> None:
+    # 直接 unlink，不存在时忽略；省去 exists 检查的一次系统调用和竞态
+    if not path:
+        return
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def _approve_add(db: Session, pending_req: PendingRequest, image_data: dict) -> Optional[str]:
+    """处理添加图片请求，返回提交后需要删除的临时文件路径"""
+    if not (pending_req.temp_file_path and os.path.exists(pending_req.temp_file_path)):
+        raise HTTPException(status_code=400, detail="临时文件不存在")
+
+    # 从pending目录移动到store
+    file_extension = file_extension_of(pending_req.original_filename)
+    image_create = schemas.ImageCreate(
+        character_ids=image_data.get("character_ids", []),
+        group_ids=image_data.get("group_ids") or ([image_data.get("group_id")] if image_data.get("group_id") else []),
+        feature_tag_ids=image_data.get("feature_tag_ids", []),
+        pid=image_data.get("pid"),
+        description=image_data.get("description")
+    )
+    ImageService.create_image(
+        db, image_create,
+        pending_req.temp_file_path,
+        pending_req.original_filename,
+        file_extension,
+        settings.STORE_PATH,
+        commit=False,
+    )
+
+    # 与请求状态更新一起由调用方提交；临时文件在提交后由调用方删除
+    return pending_req.temp_file_path
+
+
+def _approve_edit(db: Session, pending_req: PendingRequest, image_data: dict) -> Optional[str]:
+    """处理编辑图片请求"""
+    image_update = schemas.ImageUpdate(
+        pid=image_data.get("pid"),
+        description=image_data.get("description"),
+        character_ids=image_data.get("character_ids"),
+        group_ids=image_data.get("group_ids"),
+        feature_tag_ids=image_data.get("feature_tag_ids")
+    )
+
+    if not ImageService.update_image(db, pending_req.image_id, image_update):
+        raise HTTPException(status_code=404, detail="图片不存在")
+
+
+def _approve_group_add(db: Session, pending_req: PendingRequest, image_data: dict) -> Optional[str]:
+    """创建分组"""
+    if row_exists(db, Group.name == image_data.get("name")):
+        raise HTTPException(status_code=400, detail="分组名称已存在")
+    group_create = schemas.GroupCreate(
+        name=image_data.get("name"),
+        aliases=image_data.get("aliases") or [],
+        description=image_data.get("description")
+    )
+    GroupService.create_group(db, group_create)
+
+
+def _approve_group_edit(db: Session, pending_req: PendingRequest, image_data: dict) -> Optional[str]:
+    """更新分组"""
+    group_id = image_data.get("group_id")
+    if not group_id:
+        raise HTTPException(status_code=400, detail="缺少分组ID")
+    if "name" in image_data and image_data.get("name"):
+        if row_exists(db, Group.name == image_data.get("name"), Group.id != group_id):
+            raise HTTPException(status_code=400, detail="分组名称已存在")
+    update_data = {k: image_data[k] for k in ["name", "aliases", "description"] if k in image_data}
+    group_update = schemas.GroupUpdate(**update_data)
+    updated = GroupService.update_group(db, group_id, group_update)
+    if not updated:
+        raise HTTPException(status_code=404, detail="分组不存在")
+
+
+def _approve_group_delete(db: Session, pending_req: PendingRequest, image_data: dict) -> Optional[str]:
+    """删除分组"""
+    group_id = image_data.get("group_id")
+    if not group_id:
+        raise HTTPException(status_code=400, detail="缺少分组ID")
+    success = GroupService.delete_group(db, group_id)
+    if not success:
+        raise HTTPException(status_code=404, detail="分组不存在")
+
+
+def _approve_character_add(db: Session, pending_req: PendingRequest, image_data: dict) -> Optional[str]:
+    """创建角色"""
+    if row_exists(db, Character.group_id == image_data.get("group_id"), Character.name == image_data.get("name")):
+        raise HTTPException(status_code=400, detail="该分组下已存在同名角色")
+    char_create = schemas.CharacterCreate(
+        name=image_data.get("name"),
+        group_id=image_data.get("group_id"),
+        description=image_data.get("description"),
+        nicknames=image_data.get("nicknames"),
+        feature_tag_ids=image_data.get("feature_tag_ids")
+    )
+    CharacterService.create_character(db, char_create)
+
+
+def _approve_character_edit(db: Session, pending_req: PendingRequest, image_data: dict) -> Optional[str]:
+    """更新角色"""
+    char_id = image_data.get("character_id")
+    if not char_id:
+        raise HTTPException(status_code=400, detail="缺少角色ID")
+    if "name" in image_data and image_data.get("name"):
+        group_id = image_data.get("group_id")
+        if not group_id:
+            group_id = db.query(Character.group_id).filter(Character.id == char_id).scalar()
+        if group_id:
+            if row_exists(
+                db,
+                Character.group_id == group_id,
+                Character.name == image_data.get("name"),
+                Character.id != char_id
+            ):
+                raise HTTPException(status_code=400, detail="该分组下已存在同名角色")
+    update_data = {k: image_data[k] for k in ["name", "group_id", "description", "nicknames", "feature_tag_ids"] if k in image_data}
+    char_update = schemas.CharacterUpdate(**update_data)
+    updated = CharacterService.update_character(db, char_id, char_update)
+    if not updated:
+        raise HTTPException(status_code=404, detail="角色不存在")
+
+
+def _approve_character_delete(db: Session, pending_req: PendingRequest, image_data: dict) -> Optional[str]:
+    """删除角色"""
+    char_id = image_data.get("character_id")
+    if not char_id:
+        raise HTTPException(status_code=400, detail="缺少角色ID")
+    success = CharacterService.delete_character(db, char_id)
+    if not success:
+        raise HTTPException(status_code=404, detail="角色不存在")
+
+
+# 按请求类型分派批准逻辑；delete 类型不需要在批准时处理，管理员手动删除
+_APPROVERS = {
+    "add": _approve_add,
+    "edit": _approve_edit,
+    "group_add": _approve_group_add,
+    "group_edit": _approve_group_edit,
+    "group_delete": _approve_group_delete,
+    "character_add": _approve_character_add,
+    "character_edit": _approve_character_edit,
+    "character_delete": _approve_character_delete,
+}
+
+
+def _approve_pending_request(db: Session, pending_req: PendingRequest) -> Optional[str]:
+    """执行批准逻辑，返回提交后需要删除的临时文件路径"""
+    pending_req.rejection_reason = None
+    approver = _APPROVERS.get(pending_req.request_type)
+    if approver is None:
+        return None
+    image_data = json_loads(pending_req.image_data) if pending_req.image_data else {}
+    return approver(db, pending_req, image_data)
+
+
+def _mark_reviewed(db: Session, request_id: int, admin_user_id: int, **values):
+    """仅当请求仍为待审核时写入审核结果（UPDATE ... WHERE status='pending'），已被处理时返回 None"""
+    return db.execute(
+        update(PendingRequest)
+        .where(PendingRequest.id == request_id, PendingRequest.status == RequestStatus.PENDING)
+        .values(reviewed_at=utc_now(), reviewed_by=admin_user_id, **values)
+        .returning(PendingRequest.request_type, PendingRequest.temp_file_path)
+    ).one_or_none()
+
+
+def _reject_pending_request(db: Session, request_id: int, admin_user_id: int, reason: Optional[str]):
+    """原子地拒绝请求，返回 (是否成功, 提交后需要删除的临时文件路径)"""
+    row = _mark_reviewed(
+        db, request_id, admin_user_id,
+        status=RequestStatus.REJECTED,
+        rejection_reason=reason.strip() if reason else None,
+    )
+    if row is None:
+        return False, None
+    # 如果是添加请求，删除临时文件
+    return True, row.temp_file_path if row.request_type == "add" else None
+
+
+def _handle_approve(db: Session, request_id: int, admin_user_id: int, action: schemas.PendingRequestAction) -> Optional[str]:
+    # 批准需要请求数据执行副作用，最终状态同样以带条件的 UPDATE 写入，防止重复批准
+    pending_req = db.query(PendingRequest).filter(PendingRequest.id == request_id).first()
+    if not pending_req:
+        raise HTTPException(status_code=404, detail="请求不存在")
+    if pending_req.status != RequestStatus.PENDING:
+        raise HTTPException(status_code=400, detail="请求已处理")
+    cleanup_path = _approve_pending_request(db, pending_req)
+    if _mark_reviewed(db, request_id, admin_user_id, status=RequestStatus.APPROVED) is None:
+        raise HTTPException(status_code=400, detail="请求已处理")
+    return cleanup_path
+
+
+def _handle_reject(db: Session, request_id: int, admin_user_id: int, action: schemas.PendingRequestAction) -> Optional[str]:
+    # 拒绝只改状态：一条带状态条件的 UPDATE 完成，无需先查询
+    rejected, cleanup_path = _reject_pending_request(db, request_id, admin_user_id, action.reason)
+    if not rejected:
+        if not row_exists(db, PendingRequest.id == request_id):
+            raise HTTPException(status_code=404, detail="请求不存在")
+        raise HTTPException(status_code=400, detail="请求已处理")
+    return cleanup_path
+
+
+_REVIEW_ACTIONS = {
+    "approve": _handle_approve,
+    "reject": _handle_reject,
+}
+
+
+@router.post("/pending/bulk")
+def handle_pending_requests_bulk(
+    bulk: schemas.PendingRequestBulkAction,
+    request: Request,
+    background_tasks: BackgroundTasks
+):
+    """批量处理待审核请求，单条失败不影响其余请求"""
+    results = {}
+    cleanup_paths = []
+    with get_db_context() as db:
+        admin_user_id = require_admin_user_id(request, db)
+        actions = {item.request_id: item for item in bulk.actions}
+        pending_map = {
+            req.id: req
+            for req in db.query(PendingRequest).filter(PendingRequest.id.in_(actions)).all()
+        } if actions else {}
+
+        approvals, rejections = [], []
+        for request_id, item in actions.items():
+            pending_req = pending_map.get(request_id)
+            if not pending_req:
+                results[request_id] = {"status": "error", "detail": "请求不存在"}
+            elif pending_req.status != RequestStatus.PENDING:
+                results[request_id] = {"status": "error", "detail": "请求已处理"}
+            elif item.action == "approve":
+                approvals.append(pending_req)
+            elif item.action == "reject":
+                rejections.append(pending_req)
+            else:
+                results[request_id] = {"status": "error", "detail": "无效的操作"}
+
+        # 部分服务方法内部会提交，批准只能逐条提交；失败时回滚该条并继续
+        for pending_req in approvals:
+            request_id = pending_req.id
+            try:
+                cleanup_path = _approve_pending_request(db, pending_req)
+                if _mark_reviewed(db, request_id, admin_user_id, status=RequestStatus.APPROVED) is None:
+                    raise HTTPException(status_code=400, detail="请求已处理")
+                db.commit()
+            except Exception as exc:
+                db.rollback()
+                detail = exc.detail if isinstance(exc, HTTPException) else str(exc)
+                results[request_id] = {"status": "error", "detail": detail}
+                continue
+            if cleanup_path:
+                cleanup_paths.append(cleanup_path)
+            results[request_id] = {"status": "approved"}
+
+        # 拒绝只修改请求本身，统一在一次提交中完成
+        for pending_req in rejections:
+            request_id = pending_req.id
+            rejected, cleanup_path = _reject_pending_request(db, request_id, admin_user_id, actions[request_id].reason)
+            if not rejected:
+                results[request_id] = {"status": "error", "detail": "请求已处理"}
+                continue
+            if cleanup_path:
+                cleanup_paths.append(cleanup_path)
+            results[request_id] = {"status": "rejected"}
+
+    invalidate("stats", "rankings")
+    # 提交完成后再删除临时文件
+    for path in cleanup_paths:
+        background_tasks.add_task(_remove_temp_file, path)
+
+    return {"results": results}
+
+
 @router.post("/pending/{request_id}")
-async def handle_pending_request(
+def handle_pending_request(
     request_id: int,
     action: schemas.PendingRequestAction,
-    request: Request
+    request: Request,
+    background_tasks: BackgroundTasks
 ):
-    """处理待审核请求"""
-    admin_user_id = require_admin_user_id(request)
-    
+    """处理待审核请求（同步函数，由线程池执行，不阻塞事件循环）"""
     with get_db_context() as db:
-        pending_req = db.query(PendingRequest).filter(PendingRequest.id == request_id).first()
-        if not pending_req:
-            raise HTTPException(status_code=404, detail="请求不存在")
-        
-        if pending_req.status != RequestStatus.PENDING.value:
-            raise HTTPException(status_code=400, detail="请求已处理")
-        
-        if action.action == "approve":
-            # 批准请求
-            pending_req.rejection_reason = None
-            if pending_req.request_type == "add":
-                # 处理添加图片请求
-                image_data = json.loads(pending_req.image_data) if pending_req.image_data else {}
-                
-                if pending_req.temp_file_path and os.path.exists(pending_req.temp_file_path):
-                    # 从pending目录移动到store
-                    store_path = settings.STORE_PATH
-                    file_extension = pending_req.original_filename.split('.')[-1].lower()
-                    
-                    image_create = schemas.ImageCreate(
-                        character_ids=image_data.get("character_ids", []),
-                        group_ids=image_data.get("group_ids") or ([image_data.get("group_id")] if image_data.get("group_id") else []),
-                        feature_tag_ids=image_data.get("feature_tag_ids", []),
-                        pid=image_data.get("pid"),
-                        description=image_data.get("description")
-                    )
-                    
-                    image = ImageService.create_image(
-                        db, image_create, 
-                        pending_req.temp_file_path, 
-                        pending_req.original_filename, 
-                        file_extension, 
-                        store_path
-                    )
-                    
-                    # 删除临时文件
-                    try:
-                        os.unlink(pending_req.temp_file_path)
-                    except:
-                        pass
-                else:
-                    raise HTTPException(status_code=400, detail="临时文件不存在")
-            
-            elif pending_req.request_type == "edit":
-                # 处理编辑图片请求
-                image_data = json.loads(pending_req.image_data) if pending_req.image_data else {}
-                
-                image_update = schemas.ImageUpdate(
-                    pid=image_data.get("pid"),
-                    description=image_data.get("description"),
-                    character_ids=image_data.get("character_ids"),
-                    group_ids=image_data.get("group_ids"),
-                    feature_tag_ids=image_data.get("feature_tag_ids")
-                )
-                
-                image = ImageService.update_image(db, pending_req.image_id, image_update)
-                if not image:
-                    raise HTTPException(status_code=404, detail="图片不存在")
-            
-            elif pending_req.request_type == "group_add":
-                group_data = json.loads(pending_req.image_data) if pending_req.image_data else {}
-                exists = db.query(Group).filter(Group.name == group_data.get("name")).first()
-                if exists:
-                    raise HTTPException(status_code=400, detail="分组名称已存在")
-                group_create = schemas.GroupCreate(
-                    name=group_data.get("name"),
-                    aliases=group_data.get("aliases") or [],
-                    description=group_data.get("description")
-                )
-                GroupService.create_group(db, group_create)
-
-            elif pending_req.request_type == "group_edit":
-                group_data = json.loads(pending_req.image_data) if pending_req.image_data else {}
-                group_id = group_data.get("group_id")
-                if not group_id:
-                    raise HTTPException(status_code=400, detail="缺少分组ID")
-                if "name" in group_data and group_data.get("name"):
-                    exists = db.query(Group).filter(
-                        Group.name == group_data.get("name"),
-                        Group.id != group_id
-                    ).first()
-                    if exists:
-                        raise HTTPException(status_code=400, detail="分组名称已存在")
-                update_data = {k: group_data[k] for k in ["name", "aliases", "description"] if k in group_data}
-                group_update = schemas.GroupUpdate(**update_data)
-                updated = GroupService.update_group(db, group_id, group_update)
-                if not updated:
-                    raise HTTPException(status_code=404, detail="分组不存在")
-
-            elif pending_req.request_type == "group_delete":
-                group_data = json.loads(pending_req.image_data) if pending_req.image_data else {}
-                group_id = group_data.get("group_id")
-                if not group_id:
-                    raise HTTPException(status_code=400, detail="缺少分组ID")
-                success = GroupService.delete_group(db, group_id)
-                if not success:
-                    raise HTTPException(status_code=404, detail="分组不存在")
-
-            elif pending_req.request_type == "character_add":
-                char_data = json.loads(pending_req.image_data) if pending_req.image_data else {}
-                exists = db.query(Character).filter(
-                    Character.group_id == char_data.get("group_id"),
-                    Character.name == char_data.get("name")
-                ).first()
-                if exists:
-                    raise HTTPException(status_code=400, detail="该分组下已存在同名角色")
-                char_create = schemas.CharacterCreate(
-                    name=char_data.get("name"),
-                    group_id=char_data.get("group_id"),
-                    description=char_data.get("description"),
-                    nicknames=char_data.get("nicknames"),
-                    feature_tag_ids=char_data.get("feature_tag_ids")
-                )
-                CharacterService.create_character(db, char_create)
-
-            elif pending_req.request_type == "character_edit":
-                char_data = json.loads(pending_req.image_data) if pending_req.image_data else {}
-                char_id = char_data.get("character_id")
-                if not char_id:
-                    raise HTTPException(status_code=400, detail="缺少角色ID")
-                if "name" in char_data and char_data.get("name"):
-                    group_id = char_data.get("group_id")
-                    if not group_id:
-                        existing = db.query(Character).filter(Character.id == char_id).first()
-                        group_id = existing.group_id if existing else None
-                    if group_id:
-                        exists = db.query(Character).filter(
-                            Character.group_id == group_id,
-                            Character.name == char_data.get("name"),
-                            Character.id != char_id
-                        ).first()
-                        if exists:
-                            raise HTTPException(status_code=400, detail="该分组下已存在同名角色")
-                update_data = {k: char_data[k] for k in ["name", "group_id", "description", "nicknames", "feature_tag_ids"] if k in char_data}
-                char_update = schemas.CharacterUpdate(**update_data)
-                updated = CharacterService.update_character(db, char_id, char_update)
-                if not updated:
-                    raise HTTPException(status_code=404, detail="角色不存在")
-
-            elif pending_req.request_type == "character_delete":
-                char_data = json.loads(pending_req.image_data) if pending_req.image_data else {}
-                char_id = char_data.get("character_id")
-                if not char_id:
-                    raise HTTPException(status_code=400, detail="缺少角色ID")
-                success = CharacterService.delete_character(db, char_id)
-                if not success:
-                    raise HTTPException(status_code=404, detail="角色不存在")
-
-            # delete类型不需要在批准时处理，管理员手动删除
-            
-            pending_req.status = RequestStatus.APPROVED.value
-        
-        elif action.action == "reject":
-            # 拒绝请求
-            pending_req.status = RequestStatus.REJECTED.value
-            pending_req.rejection_reason = action.reason.strip() if action.reason else None
-            
-            # 如果是添加请求，删除临时文件
-            if pending_req.request_type == "add" and pending_req.temp_file_path:
-                try:
-                    if os.path.exists(pending_req.temp_file_path):
-                        os.unlink(pending_req.temp_file_path)
-                except:
-                    pass
-        
-        else:
+        admin_user_id = require_admin_user_id(request, db)
+        handler = _REVIEW_ACTIONS.get(action.action)
+        if handler is None:
             raise HTTPException(status_code=400, detail="无效的操作")
-        
-        pending_req.reviewed_at = datetime.utcnow()
-        pending_req.reviewed_by = admin_user_id
+        cleanup_path = handler(db, request_id, admin_user_id, action)
         db.commit()
-        
-        return {"message": f"请求已{('批准' if action.action == 'approve' else '拒绝')}"}
+
+    invalidate("stats", "rankings")
+    # 提交完成后再删除临时文件
+    if cleanup_path:
+        background_tasks.add_task(_remove_temp_file, cleanup_path)
+    return {"message": f"请求已{('批准' if action.action == 'approve' else '拒绝')}"}
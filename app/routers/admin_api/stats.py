@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException, Request
+from sqlalchemy import text
 from typing import List
 from datetime import datetime
 import json
@@ -7,30 +8,33 @@ import os
 from ... import schemas
 from ...config import settings
 from ...database import get_db_context
-from ...models import Character, Group, Image, PendingRequest, RequestStatus, User, UserRole
+from ...response_cache import cached_response
+from ...models import Character, Group, Image, RequestStatus, UserRole
 from ...security.permissions import require_admin_user_id, require_root_user_id
 from ...services import CharacterService, GroupService, ImageService
 
 router = APIRouter()
 
 
+STATS_CACHE_TTL_SECONDS = 15
+
+
 @router.get("/stats")
-async def get_admin_stats(request: Request):
+def get_admin_stats(request: Request):
     """获取管理统计信息"""
-    require_admin_user_id(request)
-    
     with get_db_context() as db:
-        pending_count = db.query(PendingRequest).filter(
-            PendingRequest.status == RequestStatus.PENDING.value
-        ).count()
-        
-        total_users = db.query(User).count()
-        admin_count = db.query(User).filter(
-            User.role.in_([UserRole.ROOT.value, UserRole.ADMIN.value])
-        ).count()
-        
-        return {
-            "pending_requests": pending_count,
-            "total_users": total_users,
-            "admin_count": admin_count
-        }
+        require_admin_user_id(request, db)
+
+        def build():
+            # 一条语句取回全部计数，各计数均可走索引
+            row = db.execute(text(
+                f"""
+                SELECT
+                    (SELECT COUNT(*) FROM pending_requests WHERE status = '{RequestStatus.PENDING}') AS pending_requests,
+                    (SELECT COUNT(*) FROM users) AS total_users,
+                    (SELECT COUNT(*) FROM users WHERE role IN ('{UserRole.ROOT}', '{UserRole.ADMIN}')) AS admin_count
+                """
+            )).one()
+            return dict(row._mapping)
+
+        return cached_response("stats", STATS_CACHE_TTL_SECONDS, build)
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException, Request
+from pydantic import TypeAdapter
 from typing import List
 from datetime import datetime
 import json
@@ -7,72 +8,86 @@ import os
 from ... import schemas
 from ...config import settings
 from ...database import get_db_context
-from ...models import Character, Group, Image, PendingRequest, RequestStatus, User, UserRole
+from ...response_cache import cached_response, invalidate
+from ...models import Character, Group, Image, PendingRequest, RequestStatus, User, UserRole, ADMIN_ROLES, ADMIN_ROLE_SET
 from ...security.permissions import require_admin_user_id, require_root_user_id
+from ...security.role_cache import invalidate_user_role
 from ...services import CharacterService, GroupService, ImageService
 
 router = APIRouter()
 
 
+ADMINS_CACHE_TTL_SECONDS = 60
+# 整个列表一次性在 pydantic-core 中校验，替代逐条 model_validate
+_ADMIN_LIST_ADAPTER = TypeAdapter(List[schemas.AdminInfo])
+
+
 @router.get("/admins", response_model=List[schemas.AdminInfo])
-async def get_admins(request: Request):
+def get_admins(request: Request):
     """获取管理员列表（仅root）"""
-    require_root_user_id(request)
-    
     with get_db_context() as db:
-        admins = db.query(User).filter(
-            User.role.in_([UserRole.ROOT.value, UserRole.ADMIN.value])
-        ).all()
-        
-        return [schemas.AdminInfo.model_validate(admin) for admin in admins]
+        require_root_user_id(request, db)
+
+        def build():
+            rows = db.query(
+                User.id, User.qq_number, User.role, User.nickname, User.avatar_url, User.created_at
+            ).filter(
+                User.role.in_(ADMIN_ROLES)
+            ).all()
+            return _ADMIN_LIST_ADAPTER.validate_python(rows, from_attributes=True)
+
+        return cached_response("admins", ADMINS_CACHE_TTL_SECONDS, build)
 
 
 @router.post("/admins")
 async def add_admin(admin_data: schemas.AdminCreate, request: Request):
     """Add or promote an admin. Password login is disabled; access is via QQ ticket."""
-    require_root_user_id(request)
-
     with get_db_context() as db:
+        require_root_user_id(request, db)
         existing = db.query(User).filter(User.qq_number == admin_data.qq_number).first()
 
         if existing:
-            if existing.role in [UserRole.ROOT.value, UserRole.ADMIN.value]:
+            if existing.role in ADMIN_ROLE_SET:
                 raise HTTPException(status_code=400, detail="?????????")
-            existing.role = UserRole.ADMIN.value
+            existing.role = UserRole.ADMIN
             existing.password_hash = None
             db.commit()
+            invalidate_user_role(existing.id)
+            invalidate("admins", "stats")
             return {"message": f"?? {admin_data.qq_number} ???????"}
 
         new_admin = User(
             qq_number=admin_data.qq_number,
-            role=UserRole.ADMIN.value,
+            role=UserRole.ADMIN,
             password_hash=None,
             nickname=f"???{admin_data.qq_number[-4:]}",
         )
         db.add(new_admin)
         db.commit()
+        invalidate("admins", "stats")
         return {"message": f"??? {admin_data.qq_number} ????"}
 
 
 @router.delete("/admins/{qq_number}")
 async def remove_admin(qq_number: str, request: Request):
     """移除管理员（仅root）"""
-    require_root_user_id(request)
-    
     with get_db_context() as db:
+        require_root_user_id(request, db)
         user = db.query(User).filter(User.qq_number == qq_number).first()
         if not user:
             raise HTTPException(status_code=404, detail="用户不存在")
         
-        if user.role == UserRole.ROOT.value:
+        if user.role == UserRole.ROOT:
             raise HTTPException(status_code=400, detail="不能移除root用户")
         
-        if user.role != UserRole.ADMIN.value:
+        if user.role != UserRole.ADMIN:
             raise HTTPException(status_code=400, detail="该用户不是管理员")
         
         # 降级为普通用户
-        user.role = UserRole.USER.value
+        user.role = UserRole.USER
         user.password_hash = None
         db.commit()
+        invalidate_user_role(user.id)
+        invalidate("admins", "stats")
         
         return {"message": f"用户 {qq_number} 已被移除管理员权限"}
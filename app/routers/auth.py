@@ -5,26 +5,116 @@ helpers used by route modules and permission checks.
 """
 
 from fastapi import HTTPException, Request
+from sqlalchemy import Date, DateTime, bindparam, select, text
 from sqlalchemy.orm import Session
 from typing import Optional
-from datetime import datetime, date, timedelta
+from datetime import date, timedelta
+import asyncio
 import os
+import time
 import httpx
 import uuid
 
 from ..database import get_db_context
-from ..models import User, UserRole, GuestLimit, UserSession
+from ..models import User, UserRole, UserSession
 from ..logger import log_info, log_success, log_error
 from ..config import settings
+from ..response_cache import invalidate
+from ..utils import utc_now
+from ..security.role_cache import invalidate_user_role
+from ..security.session_cache import cache_session, get_cached_session, invalidate_session
 
 
 # Root账户配置
 ROOT_QQ = settings.ROOT_QQ
 GUEST_DAILY_LIMIT = 5
 
+# 依赖 guest_limits (ip_address, date) 唯一索引
+_CONSUME_GUEST_OPERATION = text(
+    """
+    INSERT INTO guest_limits (ip_address, date, operation_count)
+    VALUES (:ip_address, :date, 1)
+    ON CONFLICT(ip_address, date) DO UPDATE SET
+        operation_count = COALESCE(guest_limits.operation_count, 0) + 1
+    WHERE COALESCE(guest_limits.operation_count, 0) < :limit
+    RETURNING operation_count
+    """
+).bindparams(bindparam("date", type_=Date))
+
+# 分批删除过期 session，每批一个短事务，避免一次性大删除长时间占用写锁
+SESSION_CLEANUP_BATCH_SIZE = 4096
+_DELETE_EXPIRED_SESSIONS = text(
+    """
+    DELETE FROM user_sessions WHERE id IN (
+        SELECT id FROM user_sessions WHERE expires_at <= :now LIMIT :batch
+    )
+    """
+).bindparams(bindparam("now", type_=DateTime))
+
+_SESSION_BY_ID = select(UserSession).where(UserSession.session_id == bindparam("sid"))
+_USER_BY_ID = select(User).where(User.id == bindparam("uid"))
+
 # Session过期时间配置（秒）
 USER_SESSION_TIMEOUT = 86400 * 7  # 登录用户7天
 GUEST_SESSION_TIMEOUT = 86400  # 游客1天
+SESSION_ACTIVITY_WRITE_INTERVAL_SECONDS = 60
+
+# 拉取QQ信息共用的客户端：保持长连接，登录时不必每次重新握手
+_QQ_HTTP_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+}
+_qq_http_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_qq_http_client() -> httpx.AsyncClient:
+    """返回共用的 AsyncClient，首次使用（或关闭后）再创建"""
+    global _qq_http_client
+    if _qq_http_client is None or _qq_http_client.is_closed:
+        _qq_http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(5.0),
+            headers=_QQ_HTTP_HEADERS,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+        )
+    return _qq_http_client
+
+
+# 昵称很少变化：成功拉取的结果按 QQ 号缓存一段时间，重复登录不再访问外部接口
+QQ_NICKNAME_CACHE_TTL_SECONDS = 3600
+QQ_NICKNAME_CACHE_MAXSIZE = 4096
+_qq_nickname_cache: dict[str, tuple[float, str]] = {}
+
+
+def qq_avatar_url(qq_number: str) -> str:
+    """QQ头像地址由号码直接拼出，无需请求"""
+    return f"https://q1.qlogo.cn/g?b=qq&nk={qq_number}&s=640"
+
+
+def _get_cached_qq_nickname(qq_number: str) -> Optional[str]:
+    entry = _qq_nickname_cache.get(qq_number)
+    if entry is None:
+        return None
+    if entry[0] <= time.monotonic():
+        _qq_nickname_cache.pop(qq_number, None)
+        return None
+    return entry[1]
+
+
+def _cache_qq_nickname(qq_number: str, nickname: str) -> None:
+    if len(_qq_nickname_cache) >= QQ_NICKNAME_CACHE_MAXSIZE and qq_number not in _qq_nickname_cache:
+        now = time.monotonic()
+        for key in [key for key, entry in _qq_nickname_cache.items() if entry[0] <= now]:
+            del _qq_nickname_cache[key]
+        if len(_qq_nickname_cache) >= QQ_NICKNAME_CACHE_MAXSIZE:
+            _qq_nickname_cache.pop(next(iter(_qq_nickname_cache)))
+    _qq_nickname_cache[qq_number] = (time.monotonic() + QQ_NICKNAME_CACHE_TTL_SECONDS, nickname)
+
+
+async def close_qq_http_client():
+    """应用关闭时释放连接池"""
+    global _qq_http_client
+    if _qq_http_client is not None:
+        await _qq_http_client.aclose()
+        _qq_http_client = None
 
 def init_root_user(db: Session):
     """初始化root用户"""
@@ -32,115 +122,111 @@ def init_root_user(db: Session):
     if not root_user:
         root_user = User(
             qq_number=ROOT_QQ,
-            role=UserRole.ROOT.value,
+            role=UserRole.ROOT,
             password_hash=None,
         )
         db.add(root_user)
         db.commit()
         db.refresh(root_user)
-    elif root_user.role != UserRole.ROOT.value or root_user.password_hash:
+        invalidate("admins", "stats")
+    elif root_user.role != UserRole.ROOT or root_user.password_hash:
         # Ensure the configured QQ is the only root identity. Password login is disabled.
-        root_user.role = UserRole.ROOT.value
+        root_user.role = UserRole.ROOT
         root_user.password_hash = None
         db.commit()
+        invalidate_user_role(root_user.id)
+        invalidate("admins", "stats")
     return root_user
 
+async def _nickname_from_360(client: httpx.AsyncClient, qq_number: str) -> Optional[str]:
+    resp = await client.get("https://qq.api.360.cn/qq/qqcheck", params={"qq": qq_number})
+    if resp.status_code == 200:
+        data = resp.json()
+        if data.get("result") == 0:
+            return data.get("name")
+    return None
+
+
+async def _nickname_from_tenapi(client: httpx.AsyncClient, qq_number: str) -> Optional[str]:
+    resp = await client.get("https://api.tenapi.cn/qq/", params={"qq": qq_number})
+    if resp.status_code == 200:
+        data = resp.json()
+        if data.get("code") == 200:
+            return data.get("data", {}).get("name")
+    return None
+
+
+async def _nickname_from_alapi(client: httpx.AsyncClient, qq_number: str) -> Optional[str]:
+    resp = await client.get("https://api.alapi.cn/api/qq", params={"qq": qq_number})
+    if resp.status_code == 200:
+        data = resp.json()
+        if data.get("code") == 0:
+            return data.get("data", {}).get("name")
+    return None
+
+
+_QQ_NICKNAME_PROVIDERS = (
+    ("qq.api.360.cn", _nickname_from_360),
+    ("tenapi.cn", _nickname_from_tenapi),
+    ("alapi.cn", _nickname_from_alapi),
+)
+
+
+async def _fetch_qq_nickname(qq_number: str) -> Optional[str]:
+    """同时请求各备选接口，取最先返回的有效昵称，其余请求随即取消"""
+    client = _get_qq_http_client()
+    tasks = {
+        asyncio.create_task(fetch(client, qq_number)): name
+        for name, fetch in _QQ_NICKNAME_PROVIDERS
+    }
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                # 单个接口出错或超时不影响其余接口
+                if task.cancelled() or task.exception() is not None:
+                    continue
+                nickname = task.result()
+                if nickname:
+                    log_success(f"QQ昵称获取成功: {tasks[task]}")
+                    return nickname
+        return None
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
 async def fetch_qq_info(qq_number: str) -> dict:
     """从QQ获取头像和昵称"""
-    try:
-        # 使用QQ头像API
-        avatar_url = f"https://q1.qlogo.cn/g?b=qq&nk={qq_number}&s=640"
-        
-        # 尝试获取昵称（使用多个备选API）
-        nickname = None
-        
-        # 请求头配置
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-        }
+    # 使用QQ头像API
+    avatar_url = qq_avatar_url(qq_number)
 
-        log_info(f"拉取QQ信息: {qq_number}")
-        
-        try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                # 方案1: 尝试 qq.api.360.cn
-                try:
-                    resp = await client.get(
-                        f"https://qq.api.360.cn/qq/qqcheck",
-                        params={"qq": qq_number},
-                        headers=headers
-                    )
-                    if resp.status_code == 200:
-                        data = resp.json()
-                        if data.get("result") == 0:
-                            nickname = data.get("name")
-                            if nickname:
-                                log_success("QQ昵称获取成功: qq.api.360.cn")
-                                return {
-                                    "avatar_url": avatar_url,
-                                    "nickname": nickname
-                                }
-                except Exception as e:
-                    pass
-                
-                # 方案2: 尝试 tenapi API
-                if not nickname:
-                    try:
-                        resp = await client.get(
-                            "https://api.tenapi.cn/qq/",
-                            params={"qq": qq_number},
-                            headers=headers,
-                            timeout=5.0
-                        )
-                        if resp.status_code == 200:
-                            data = resp.json()
-                            if data.get("code") == 200:
-                                nickname = data.get("data", {}).get("name")
-                                if nickname:
-                                    log_success("QQ昵称获取成功: tenapi.cn")
-                                    return {
-                                        "avatar_url": avatar_url,
-                                        "nickname": nickname
-                                    }
-                    except Exception as e:
-                        pass
-                
-                # 方案3: 尝试 alapi.net
-                if not nickname:
-                    try:
-                        resp = await client.get(
-                            f"https://api.alapi.cn/api/qq",
-                            params={"qq": qq_number},
-                            headers=headers,
-                            timeout=5.0
-                        )
-                        if resp.status_code == 200:
-                            data = resp.json()
-                            if data.get("code") == 0:
-                                nickname = data.get("data", {}).get("name")
-                                if nickname:
-                                    log_success("QQ昵称获取成功: alapi.cn")
-                                    return {
-                                        "avatar_url": avatar_url,
-                                        "nickname": nickname
-                                    }
-                    except Exception as e:
-                        pass
-        except:
-            pass
-        
-        # 如果所有API都失败，返回默认昵称
-        log_error("QQ昵称获取失败，使用默认昵称")
-        return {
-            "avatar_url": avatar_url,
-            "nickname": f"用户{qq_number[-4:]}"
-        }
-    except:
+    nickname = _get_cached_qq_nickname(qq_number)
+    if nickname:
+        return {"avatar_url": avatar_url, "nickname": nickname}
+
+    # 尝试获取昵称（多个备选API并发请求）
+    log_info(f"拉取QQ信息: {qq_number}")
+    try:
+        nickname = await _fetch_qq_nickname(qq_number)
+    except Exception:
         log_error("QQ昵称获取异常，使用默认昵称")
-        return {
-            "avatar_url": f"https://q1.qlogo.cn/g?b=qq&nk={qq_number}&s=640",
-            "nickname": f"用户{qq_number[-4:]}"
-        }
+        return {"avatar_url": avatar_url, "nickname": f"用户{qq_number[-4:]}"}
+
+    if nickname:
+        _cache_qq_nickname(qq_number, nickname)
+        return {"avatar_url": avatar_url, "nickname": nickname}
+
+    # 如果所有API都失败，返回默认昵称
+    log_error("QQ昵称获取失败，使用默认昵称")
+    return {
+        "avatar_url": avatar_url,
+        "nickname": f"用户{qq_number[-4:]}"
+    }
+
 
 def get_client_ip(request: Request) -> str:
     """获取客户端IP"""
@@ -152,25 +238,65 @@ def get_client_ip(request: Request) -> str:
 
 def cleanup_expired_sessions(db: Session):
     """清理过期的session"""
-    now = datetime.utcnow()
-    expired = db.query(UserSession).filter(UserSession.expires_at <= now).delete()
-    if expired > 0:
-        db.commit()
-    return expired
+    now = utc_now()
+    expired = 0
+    while True:
+        deleted = db.execute(_DELETE_EXPIRED_SESSIONS, {"now": now, "batch": SESSION_CLEANUP_BATCH_SIZE}).rowcount
+        if deleted > 0:
+            db.commit()
+        expired += deleted
+        if deleted < SESSION_CLEANUP_BATCH_SIZE:
+            return expired
+
+
+SESSION_SWEEP_INTERVAL_SECONDS = 300
+_session_sweeper_task: Optional[asyncio.Task] = None
+
+
+def _sweep_expired_sessions() -> None:
+    try:
+        with get_db_context() as db:
+            cleanup_expired_sessions(db)
+    except Exception as exc:
+        log_error(f"清理过期session失败: {exc}")
+
+
+async def _session_sweeper() -> None:
+    """定期清理过期 session，代替每次登录时的全表删除"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await loop.run_in_executor(None, _sweep_expired_sessions)
+        await asyncio.sleep(SESSION_SWEEP_INTERVAL_SECONDS)
+
+
+def start_session_sweeper() -> None:
+    """在运行中的事件循环上启动清理任务，需在 FastAPI 启动时调用"""
+    global _session_sweeper_task
+    if _session_sweeper_task is None:
+        _session_sweeper_task = asyncio.get_running_loop().create_task(_session_sweeper())
+
+
+async def stop_session_sweeper() -> None:
+    global _session_sweeper_task
+    if _session_sweeper_task is None:
+        return
+    _session_sweeper_task.cancel()
+    await asyncio.gather(_session_sweeper_task, return_exceptions=True)
+    _session_sweeper_task = None
 
 
 def create_session(db: Session, user: Optional[User], guest_ip: Optional[str] = None, timeout: int = USER_SESSION_TIMEOUT) -> str:
     """在数据库中创建会话"""
     session_id = str(uuid.uuid4())
-    expires_at = datetime.utcnow() + timedelta(seconds=timeout)
+    expires_at = utc_now() + timedelta(seconds=timeout)
     
     session = UserSession(
         session_id=session_id,
         user_id=user.id if user else None,
         guest_ip=guest_ip,
-        is_guest="true" if user is None else "false",
-        created_at=datetime.utcnow(),
-        last_activity=datetime.utcnow(),
+        is_guest=user is None,
+        created_at=utc_now(),
+        last_activity=utc_now(),
         expires_at=expires_at
     )
     
@@ -180,34 +306,44 @@ def create_session(db: Session, user: Optional[User], guest_ip: Optional[str] =
 
 
 def get_session(db: Session, session_id: str) -> Optional[dict]:
-    """从数据库获取会话"""
-    session = db.query(UserSession).filter(UserSession.session_id == session_id).first()
+    """从数据库获取会话；短时间内重复访问直接使用进程内缓存"""
+    now = utc_now()
+    cached = get_cached_session(session_id, now)
+    if cached is not None:
+        return cached
+
+    session = db.execute(_SESSION_BY_ID, {"sid": session_id}).scalar_one_or_none()
     
     if not session:
         return None
     
     # 检查是否过期
-    if session.expires_at <= datetime.utcnow():
+    if session.expires_at <= now:
         db.delete(session)
         db.commit()
         return None
     
-    # 更新最后活动时间
-    session.last_activity = datetime.utcnow()
-    db.commit()
+    # 更新最后活动时间；间隔很短时跳过，避免每个请求都写一次库
+    last_activity = session.last_activity
+    if last_activity is None or (now - last_activity).total_seconds() > SESSION_ACTIVITY_WRITE_INTERVAL_SECONDS:
+        session.last_activity = now
+        db.commit()
     
-    return {
+    info = {
         "user_id": session.user_id,
-        "is_guest": session.is_guest == "true",
+        "is_guest": bool(session.is_guest),
         "guest_ip": session.guest_ip,
         "created_at": session.created_at,
         "session_id": session.session_id
     }
+    cache_session(session_id, session.expires_at, info)
+    return info
 
 
 def delete_session(db: Session, session_id: str):
     """从数据库删除会话"""
-    session = db.query(UserSession).filter(UserSession.session_id == session_id).first()
+    invalidate_session(session_id)
+    session = db.execute(_SESSION_BY_ID, {"sid": session_id}).scalar_one_or_none()
     if session:
         db.delete(session)
         db.commit()
@@ -215,27 +351,20 @@ def delete_session(db: Session, session_id: str):
 
 def check_guest_limit(db: Session, ip_address: str) -> bool:
     """检查游客是否还有操作次数，如果有则消耗一次"""
-    today = date.today()
-    limit_record = db.query(GuestLimit).filter(
-        GuestLimit.ip_address == ip_address,
-        GuestLimit.date == today
-    ).first()
-    
-    if not limit_record:
-        # 创建新记录
-        limit_record = GuestLimit(
-            ip_address=ip_address,
-            date=today,
-            operation_count=1
-        )
-        db.add(limit_record)
-        return True
-    
-    if limit_record.operation_count >= GUEST_DAILY_LIMIT:
-        return False
-    
-    limit_record.operation_count += 1
-    return True
+    # 单条 upsert 完成"查询 + 插入/自增"：当日次数已满时 WHERE 不成立，不返回行
+    row = db.execute(_CONSUME_GUEST_OPERATION, {
+        "ip_address": ip_address,
+        "date": date.today(),
+        "limit": GUEST_DAILY_LIMIT,
+    }).first()
+    return row is not None
+
+
+def get_user(db: Session, user_id: Optional[int]) -> Optional[User]:
+    """按 id 获取用户"""
+    if user_id is None:
+        return None
+    return db.execute(_USER_BY_ID, {"uid": user_id}).scalar_one_or_none()
 
 
 def get_current_session(request: Request, db: Optional[Session] = None) -> dict:
@@ -243,13 +372,20 @@ def get_current_session(request: Request, db: Optional[Session] = None) -> dict:
     session_id = request.cookies.get("session_id")
     if not session_id:
         return None
-    
+
+    # 同一请求内只查询（并刷新活动时间）一次，后续鉴权直接复用
+    cached = getattr(request.state, "session_info", None)
+    if cached is not None and cached[0] == session_id:
+        return cached[1]
+
     # 如果没有传入db，则创建一个新的context
     if db is None:
         with get_db_context() as db:
-            return get_session(db, session_id)
+            session = get_session(db, session_id)
     else:
-        return get_session(db, session_id)
+        session = get_session(db, session_id)
+    request.state.session_info = (session_id, session)
+    return session
 
 
 def is_admin_or_root(request: Request) -> bool:
@@ -259,9 +395,11 @@ def is_admin_or_root(request: Request) -> bool:
         if not session or session["is_guest"]:
             return False
         
-        user = db.query(User).filter(User.id == session["user_id"]).first()
-        if not user:
+        row = db.execute(
+            select(User.role, User.qq_number).where(User.id == session["user_id"])
+        ).first()
+        if row is None:
             return False
-        if user.role == UserRole.ROOT.value:
-            return user.qq_number == ROOT_QQ
-        return user.role == UserRole.ADMIN.value
+        if row.role == UserRole.ROOT:
+            return row.qq_number == ROOT_QQ
+        return row.role == UserRole.ADMIN
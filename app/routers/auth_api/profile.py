@@ -1,14 +1,15 @@
 from fastapi import APIRouter, HTTPException, Request
 from collections import Counter
-from datetime import datetime, date
+from datetime import date
 from typing import List
-import json
+from sqlalchemy import func
 import os
 
 from ... import schemas
 from ...database import get_db_context
-from ...models import PendingRequest, GuestLimit, RequestStatus, User, Group, Character
-from ..auth import GUEST_DAILY_LIMIT, get_current_session, get_session
+from ...models import PendingRequest, GuestLimit, RequestStatus, Group, Character
+from ..auth import GUEST_DAILY_LIMIT, get_current_session, get_session, get_user
+from ...utils import as_int, as_int_list, json_loads, utc_now
 
 router = APIRouter()
 
@@ -25,7 +26,7 @@ async def get_my_requests(request: Request):
         if not session or session["is_guest"]:
             raise HTTPException(status_code=403, detail="游客不开放")
 
-        user = db.query(User).filter(User.id == session["user_id"]).first()
+        user = get_user(db, session["user_id"])
         if not user:
             raise HTTPException(status_code=401, detail="用户不存在")
 
@@ -33,8 +34,27 @@ async def get_my_requests(request: Request):
             PendingRequest.user_id == user.id
         ).order_by(PendingRequest.created_at.desc()).all()
 
+        parsed = [(req, json_loads(req.image_data) if req.image_data else None) for req in requests]
+
+        # 先收集全部分组/角色 id，各用一次 IN 查询取名称，避免逐条查询
+        group_ids = set()
+        character_ids = set()
+        for _, image_data in parsed:
+            if not image_data:
+                continue
+            group_id = as_int(image_data.get("group_id"))
+            if group_id is not None:
+                group_ids.add(group_id)
+            character_ids.update(as_int_list(image_data.get("character_ids")))
+
+        group_names = dict(db.query(Group.id, Group.name).filter(Group.id.in_(group_ids)).all()) if group_ids else {}
+        character_names = (
+            dict(db.query(Character.id, Character.name).filter(Character.id.in_(character_ids)).all())
+            if character_ids else {}
+        )
+
         result = []
-        for req in requests:
+        for req, image_data in parsed:
             item = {
                 "id": req.id,
                 "request_type": req.request_type,
@@ -44,7 +64,7 @@ async def get_my_requests(request: Request):
                 "user_avatar": user.avatar_url,
                 "guest_ip": None,
                 "image_id": req.image_id,
-                "image_data": json.loads(req.image_data) if req.image_data else None,
+                "image_data": image_data,
                 "temp_file_path": req.temp_file_path,
                 "original_filename": req.original_filename,
                 "rejection_reason": req.rejection_reason,
@@ -58,18 +78,17 @@ async def get_my_requests(request: Request):
                 "reviewed_at": req.reviewed_at
             }
 
-            if item["image_data"]:
-                image_data = item["image_data"]
-                if image_data.get("group_id"):
-                    group = db.query(Group).filter(Group.id == image_data["group_id"]).first()
-                    if group:
-                        item["group_info"] = {"id": group.id, "name": group.name}
-                if image_data.get("character_ids"):
-                    characters = db.query(Character).filter(
-                        Character.id.in_(image_data["character_ids"])
-                    ).all()
-                    if characters:
-                        item["character_names"] = [ch.name for ch in characters]
+            if image_data:
+                group_id = as_int(image_data.get("group_id"))
+                if group_id in group_names:
+                    item["group_info"] = {"id": group_id, "name": group_names[group_id]}
+                names = [
+                    character_names[cid]
+                    for cid in dict.fromkeys(as_int_list(image_data.get("character_ids")))
+                    if cid in character_names
+                ]
+                if names:
+                    item["character_names"] = names
 
             result.append(schemas.PendingRequestInfo(**item))
 
@@ -96,14 +115,13 @@ async def cancel_my_request(request_id: int, request: Request):
         if not pending_req:
             raise HTTPException(status_code=404, detail="请求不存在")
 
-        if pending_req.status != RequestStatus.PENDING.value:
+        if pending_req.status != RequestStatus.PENDING:
             raise HTTPException(status_code=400, detail="请求已处理，无法撤销")
 
         if pending_req.request_type == "add" and pending_req.temp_file_path:
             try:
-                if os.path.exists(pending_req.temp_file_path):
-                    os.unlink(pending_req.temp_file_path)
-            except Exception:
+                os.unlink(pending_req.temp_file_path)
+            except OSError:
                 pass
 
         db.delete(pending_req)
@@ -123,28 +141,26 @@ async def get_notifications(request: Request):
         if not session or session["is_guest"]:
             return {"approved": 0, "rejected": 0}
 
-        user = db.query(User).filter(User.id == session["user_id"]).first()
+        user = get_user(db, session["user_id"])
         if not user:
             raise HTTPException(status_code=401, detail="用户不存在")
 
-        last_notice_at = user.last_notice_at or datetime.utcnow()
-        approved = db.query(PendingRequest).filter(
-            PendingRequest.user_id == user.id,
-            PendingRequest.status == RequestStatus.APPROVED.value,
-            PendingRequest.reviewed_at != None,
-            PendingRequest.reviewed_at > last_notice_at
-        ).count()
-        rejected = db.query(PendingRequest).filter(
+        last_notice_at = user.last_notice_at or utc_now()
+        # 通过与驳回数量一次 GROUP BY 取回
+        counts = dict(db.query(PendingRequest.status, func.count()).filter(
             PendingRequest.user_id == user.id,
-            PendingRequest.status == RequestStatus.REJECTED.value,
+            PendingRequest.status.in_((RequestStatus.APPROVED, RequestStatus.REJECTED)),
             PendingRequest.reviewed_at != None,
             PendingRequest.reviewed_at > last_notice_at
-        ).count()
+        ).group_by(PendingRequest.status).all())
 
-        user.last_notice_at = datetime.utcnow()
+        user.last_notice_at = utc_now()
         db.commit()
 
-        return {"approved": approved, "rejected": rejected}
+        return {
+            "approved": counts.get(RequestStatus.APPROVED, 0),
+            "rejected": counts.get(RequestStatus.REJECTED, 0),
+        }
 
 
 @router.get("/profile-stats")
@@ -162,22 +178,24 @@ async def get_profile_stats(request: Request):
         if session["is_guest"]:
             raise HTTPException(status_code=403, detail="游客不开放")
 
-        user = db.query(User).filter(User.id == session["user_id"]).first()
+        user = get_user(db, session["user_id"])
         if not user:
             raise HTTPException(status_code=401, detail="用户不存在")
 
-        user_requests = db.query(PendingRequest).filter(
+        # 按 (类型, 状态) 在库内聚合计数，不再把全部请求行取回逐条统计
+        type_status_counts = db.query(
+            PendingRequest.request_type, PendingRequest.status, func.count()
+        ).filter(
             PendingRequest.user_id == user.id
-        ).all()
-
-        total_submissions = len(user_requests)
-        approved_requests = [
-            req for req in user_requests
-            if req.status == RequestStatus.APPROVED.value
-        ]
+        ).group_by(PendingRequest.request_type, PendingRequest.status).all()
 
-        approved_total = len(approved_requests)
-        approved_counts = Counter(req.request_type for req in approved_requests)
+        total_submissions = sum(count for _, _, count in type_status_counts)
+        approved_counts = Counter({
+            request_type: count
+            for request_type, status, count in type_status_counts
+            if status == RequestStatus.APPROVED
+        })
+        approved_total = sum(approved_counts.values())
 
         approved_add = approved_counts.get("add", 0)
         approved_edit = approved_counts.get("edit", 0)
@@ -206,11 +224,19 @@ async def get_profile_stats(request: Request):
         character_counter = Counter()
         missing_group_entries = []
 
-        for req in approved_requests:
-            if req.request_type != "add" or not req.image_data:
+        # 只取审核通过的添加请求的 image_data 一列
+        approved_add_data = db.query(PendingRequest.image_data).filter(
+            PendingRequest.user_id == user.id,
+            PendingRequest.status == RequestStatus.APPROVED,
+            PendingRequest.request_type == "add",
+            PendingRequest.image_data != None
+        ).all()
+
+        for (image_data,) in approved_add_data:
+            if not image_data:
                 continue
             try:
-                data = json.loads(req.image_data)
+                data = json_loads(image_data)
             except Exception:
                 continue
 
@@ -242,8 +268,10 @@ async def get_profile_stats(request: Request):
                 if isinstance(cid, (int, str)) and str(cid).isdigit()
             }
             if missing_character_ids:
-                characters = db.query(Character).filter(Character.id.in_(missing_character_ids)).all()
-                character_group_map = {c.id: c.group_id for c in characters}
+                # 只取需要的两列，不构造 ORM 实体
+                character_group_map = dict(
+                    db.query(Character.id, Character.group_id).filter(Character.id.in_(missing_character_ids)).all()
+                )
 
                 for entry in missing_group_entries:
                     # 取第一个有效角色的分组作为本次上传分组
@@ -264,13 +292,11 @@ async def get_profile_stats(request: Request):
 
         group_map = {}
         if group_ids:
-            groups = db.query(Group).filter(Group.id.in_(group_ids)).all()
-            group_map = {group.id: group.name for group in groups}
+            group_map = dict(db.query(Group.id, Group.name).filter(Group.id.in_(group_ids)).all())
 
         character_map = {}
         if character_ids:
-            characters = db.query(Character).filter(Character.id.in_(character_ids)).all()
-            character_map = {character.id: character.name for character in characters}
+            character_map = dict(db.query(Character.id, Character.name).filter(Character.id.in_(character_ids)).all())
 
         group_list = [
             {"id": gid, "name": group_map.get(gid, f"分组 {gid}"), "count": count}
@@ -319,7 +345,7 @@ async def set_nickname(nickname_data: schemas.SetNickname, request: Request):
         if not session or session["is_guest"]:
             raise HTTPException(status_code=401, detail="需要登录")
         
-        user = db.query(User).filter(User.id == session["user_id"]).first()
+        user = get_user(db, session["user_id"])
         if not user:
             raise HTTPException(status_code=401, detail="用户不存在")
         
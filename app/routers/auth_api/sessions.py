@@ -3,20 +3,23 @@ from datetime import date
 
 from ... import schemas
 from ...database import get_db_context
+from ...response_cache import invalidate
 from ...models import User, UserRole, GuestLimit
+from ...security.role_cache import invalidate_user_role
 from ...security.tickets import consume_login_ticket
 from ...config import settings
 from ..auth import (
     GUEST_DAILY_LIMIT,
     GUEST_SESSION_TIMEOUT,
     USER_SESSION_TIMEOUT,
-    cleanup_expired_sessions,
     create_session,
     delete_session,
     fetch_qq_info,
     get_client_ip,
     get_session,
+    get_user,
     init_root_user,
+    qq_avatar_url,
     ROOT_QQ,
 )
 
@@ -39,36 +42,44 @@ async def login(login_data: schemas.UserLogin, request: Request, response: Respo
 async def login_with_qq_ticket(ticket_data: schemas.QQTicketLogin, request: Request, response: Response):
     """Login through a one-time QQ ticket issued by the trusted bot plugin."""
     with get_db_context() as db:
-        cleanup_expired_sessions(db)
         ticket = consume_login_ticket(db, ticket_data.ticket, "login")
         qq_number = ticket.qq_number
+        redirect_path = ticket.redirect_path
+        nickname = db.query(User.nickname).filter(User.qq_number == qq_number).scalar()
 
+    # 已有昵称时不再请求外部接口；外部查询可能耗时数秒，放在两个会话之间等待，不占用唯一的写连接
+    if not nickname:
+        nickname = (await fetch_qq_info(qq_number))["nickname"]
+
+    with get_db_context() as db:
         user = db.query(User).filter(User.qq_number == qq_number).first()
-        qq_info = await fetch_qq_info(qq_number)
 
-        target_role = UserRole.ROOT.value if qq_number == ROOT_QQ else UserRole.USER.value
+        target_role = UserRole.ROOT if qq_number == ROOT_QQ else UserRole.USER
         if user:
             if qq_number == ROOT_QQ:
-                user.role = UserRole.ROOT.value
-            elif user.role == UserRole.ROOT.value:
-                user.role = UserRole.USER.value
+                user.role = UserRole.ROOT
+            elif user.role == UserRole.ROOT:
+                user.role = UserRole.USER
             user.password_hash = None
             if not user.nickname:
-                user.nickname = qq_info["nickname"]
-            user.avatar_url = qq_info["avatar_url"]
+                user.nickname = nickname
+            user.avatar_url = qq_avatar_url(qq_number)
         else:
             user = User(
                 qq_number=qq_number,
                 role=target_role,
                 password_hash=None,
-                nickname=qq_info["nickname"],
-                avatar_url=qq_info["avatar_url"],
+                nickname=nickname,
+                avatar_url=qq_avatar_url(qq_number),
             )
             db.add(user)
             db.commit()
             db.refresh(user)
+            invalidate("stats")
 
         session_id = create_session(db, user, timeout=USER_SESSION_TIMEOUT)
+        # create_session 已提交角色变更，此后再失效缓存，避免并发请求把旧角色写回
+        invalidate_user_role(user.id)
         response.set_cookie(
             key="session_id",
             value=session_id,
@@ -81,7 +92,7 @@ async def login_with_qq_ticket(ticket_data: schemas.QQTicketLogin, request: Requ
 
         return {
             "message": "Login successful",
-            "redirect_path": ticket.redirect_path or "/",
+            "redirect_path": redirect_path or "/",
             "user": schemas.UserInfo.model_validate(user),
         }
 
@@ -92,9 +103,6 @@ async def guest_login(request: Request, response: Response):
     client_ip = get_client_ip(request)
     
     with get_db_context() as db:
-        # 清理过期session
-        cleanup_expired_sessions(db)
-
         if settings.DEBUG and _is_debug_loopback(client_ip):
             root_user = init_root_user(db)
             session_id = create_session(db, root_user, timeout=USER_SESSION_TIMEOUT)
@@ -174,7 +182,7 @@ async def get_current_user(request: Request):
             }
         else:
             # 已登录用户
-            user = db.query(User).filter(User.id == session["user_id"]).first()
+            user = get_user(db, session["user_id"])
             if not user:
                 raise HTTPException(status_code=401, detail="用户不存在")
             return {
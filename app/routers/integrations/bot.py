@@ -1,15 +1,17 @@
 from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
 from PIL import Image
 import os
-import tempfile
 
 from ... import schemas
 from ...config import settings
 from ...database import get_db_context
 from ...models import User, UserRole
+from ...response_cache import invalidate
 from ...security.api_key import require_bot_api_key
+from ...security.role_cache import invalidate_user_role
 from ...security.tickets import build_login_url, create_login_ticket, normalize_qq_number
 from ...services import CharacterService, EmojiService, EmotionTagService, FeatureTagService, GroupService, ImageService
+from ...utils import file_extension_of, json_loads, save_upload_to_temp
 
 router = APIRouter(dependencies=[Depends(require_bot_api_key)])
 
@@ -215,30 +217,18 @@ async def upload_bot_emoji(
     """Upload a referenced QQ GIF emoji into PicManager."""
     import json
 
-    file_extension = (file.filename or "").split(".")[-1].lower()
+    file_extension = file_extension_of(file.filename)
     if file_extension != "gif":
         raise HTTPException(status_code=400, detail="Only GIF emoji resources are supported")
     try:
-        character_id_list = [int(item) for item in json.loads(character_ids or "[]")]
-        group_id_list = [int(item) for item in json.loads(group_ids or "[]")]
-        emotion_id_list = [int(item) for item in json.loads(emotion_ids or "[]")]
+        character_id_list = [int(item) for item in json_loads(character_ids or "[]")]
+        group_id_list = [int(item) for item in json_loads(group_ids or "[]")]
+        emotion_id_list = [int(item) for item in json_loads(emotion_ids or "[]")]
     except (TypeError, ValueError, json.JSONDecodeError) as exc:
         raise HTTPException(status_code=400, detail="Invalid tag ids") from exc
 
-    temp_file_path = ""
+    temp_file_path = await save_upload_to_temp(file, suffix=".gif")
     try:
-        os.makedirs(settings.TEMP_PATH, exist_ok=True)
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".gif", dir=settings.TEMP_PATH) as temp_file:
-            temp_file_path = temp_file.name
-            total = 0
-            while True:
-                chunk = await file.read(1024 * 1024)
-                if not chunk:
-                    break
-                total += len(chunk)
-                if total > settings.MAX_FILE_SIZE:
-                    raise HTTPException(status_code=413, detail="File too large")
-                temp_file.write(chunk)
         with Image.open(temp_file_path) as image:
             if (image.format or "").upper() != "GIF":
                 raise HTTPException(status_code=400, detail="Only GIF emoji resources are supported")
@@ -262,8 +252,7 @@ async def upload_bot_emoji(
             return _with_emoji_url(EmojiService.emoji_to_dict(emoji))
     finally:
         try:
-            if temp_file_path and os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
+            os.unlink(temp_file_path)
         except OSError:
             pass
 
@@ -276,10 +265,11 @@ def create_bot_login_ticket(ticket_create: schemas.BotLoginTicketCreate):
         nickname = (ticket_create.nickname or "").strip()[:100] or None
         avatar_url = (ticket_create.avatar_url or "").strip()[:500] or None
         user = db.query(User).filter(User.qq_number == qq_number).first()
-        if user is None:
+        created = user is None
+        if created:
             user = User(
                 qq_number=qq_number,
-                role=UserRole.ROOT.value if qq_number == settings.ROOT_QQ else UserRole.USER.value,
+                role=UserRole.ROOT if qq_number == settings.ROOT_QQ else UserRole.USER,
                 password_hash=None,
                 nickname=nickname or f"QQ用户{qq_number[-4:]}",
                 avatar_url=avatar_url or f"https://q1.qlogo.cn/g?b=qq&nk={qq_number}&s=640",
@@ -287,9 +277,9 @@ def create_bot_login_ticket(ticket_create: schemas.BotLoginTicketCreate):
             db.add(user)
         else:
             if qq_number == settings.ROOT_QQ:
-                user.role = UserRole.ROOT.value
-            elif user.role == UserRole.ROOT.value:
-                user.role = UserRole.USER.value
+                user.role = UserRole.ROOT
+            elif user.role == UserRole.ROOT:
+                user.role = UserRole.USER
             user.password_hash = None
             if nickname:
                 user.nickname = nickname
@@ -310,6 +300,11 @@ def create_bot_login_ticket(ticket_create: schemas.BotLoginTicketCreate):
             login_url = f"{base_url}/auth/qq#ticket={issued.ticket}"
         else:
             login_url = build_login_url(issued.ticket, issued.record.redirect_path)
+        # 角色变更提交后再失效缓存，避免并发请求把旧角色写回
+        db.commit()
+        invalidate_user_role(user.id)
+        if created:
+            invalidate("stats")
         return schemas.BotLoginTicketResponse(
             ticket=issued.ticket,
             login_url=login_url,
@@ -4,7 +4,9 @@ from ... import schemas
 from ...config import settings
 from ...database import get_db_context
 from ...models import User, UserRole
+from ...response_cache import invalidate
 from ...security.api_key import require_phrolova_sso_key
+from ...security.role_cache import invalidate_user_role
 from ...security.tickets import consume_login_ticket
 
 
@@ -18,9 +20,10 @@ def exchange_phrolova_ticket(payload: schemas.SSOExchangeRequest):
         ticket = consume_login_ticket(db, payload.ticket, "phrolova")
         qq_number = ticket.qq_number
         user = db.query(User).filter(User.qq_number == qq_number).first()
-        target_role = UserRole.ROOT.value if qq_number == settings.ROOT_QQ else UserRole.USER.value
+        target_role = UserRole.ROOT if qq_number == settings.ROOT_QQ else UserRole.USER
+        created = user is None
 
-        if user is None:
+        if created:
             user = User(
                 qq_number=qq_number,
                 role=target_role,
@@ -31,9 +34,9 @@ def exchange_phrolova_ticket(payload: schemas.SSOExchangeRequest):
             db.add(user)
         else:
             if qq_number == settings.ROOT_QQ:
-                user.role = UserRole.ROOT.value
-            elif user.role == UserRole.ROOT.value:
-                user.role = UserRole.USER.value
+                user.role = UserRole.ROOT
+            elif user.role == UserRole.ROOT:
+                user.role = UserRole.USER
             user.password_hash = None
             if not user.nickname:
                 user.nickname = f"QQ用户{qq_number[-4:]}"
@@ -42,6 +45,9 @@ def exchange_phrolova_ticket(payload: schemas.SSOExchangeRequest):
 
         db.commit()
         db.refresh(user)
+        invalidate_user_role(user.id)
+        if created:
+            invalidate("stats")
         return schemas.SSOIdentityResponse(
             qq_number=user.qq_number,
             nickname=user.nickname,
@@ -5,15 +5,15 @@ from typing import Optional
 from urllib.parse import quote
 import json
 import os
-import tempfile
 
 from PIL import Image, UnidentifiedImageError
 
 from ... import models, schemas
 from ...config import settings
-from ...database import get_db_context
+from ...database import get_db_context, row_exists, find_missing_ids
 from ...security.permissions import require_admin_user_id
 from ...services import EmojiService, EmotionTagService
+from ...utils import file_extension_of, json_loads, save_upload_to_temp
 
 router = APIRouter()
 
@@ -22,7 +22,7 @@ def _parse_id_list(value: str | None, field_name: str) -> list[int]:
     if not value:
         return []
     try:
-        parsed = json.loads(value) if isinstance(value, str) else value
+        parsed = json_loads(value) if isinstance(value, str) else value
         if not isinstance(parsed, list):
             parsed = [parsed]
         return list(dict.fromkeys([int(item) for item in parsed]))
@@ -48,19 +48,16 @@ def _validate_emoji_tags(db, character_ids: list[int], group_ids: list[int], emo
     if len(character_ids) > 1 or len(group_ids) > 1 or len(emotion_ids) > 1:
         raise HTTPException(status_code=400, detail="Emoji supports only one group, one character, and one emotion")
     if character_ids:
-        existing = db.query(models.Character).filter(models.Character.id.in_(character_ids)).all()
-        if len(existing) != len(character_ids):
-            missing = set(character_ids) - {item.id for item in existing}
+        missing = find_missing_ids(db, models.Character.id, character_ids)
+        if missing:
             raise HTTPException(status_code=400, detail=f"Selected characters do not exist: {missing}")
     if group_ids:
-        existing = db.query(models.Group).filter(models.Group.id.in_(group_ids)).all()
-        if len(existing) != len(group_ids):
-            missing = set(group_ids) - {item.id for item in existing}
+        missing = find_missing_ids(db, models.Group.id, group_ids)
+        if missing:
             raise HTTPException(status_code=400, detail=f"Selected groups do not exist: {missing}")
     if emotion_ids:
-        existing = db.query(models.EmotionTag).filter(models.EmotionTag.id.in_(emotion_ids)).all()
-        if len(existing) != len(emotion_ids):
-            missing = set(emotion_ids) - {item.id for item in existing}
+        missing = find_missing_ids(db, models.EmotionTag.id, emotion_ids)
+        if missing:
             raise HTTPException(status_code=400, detail=f"Selected emotions do not exist: {missing}")
 
 
@@ -72,21 +69,19 @@ def list_emotion_tags(skip: int = 0, limit: int = 500):
 
 @router.post("/emotion-tags/", response_model=schemas.EmotionTag)
 def create_emotion_tag(tag: schemas.EmotionTagCreate, request: Request):
-    require_admin_user_id(request)
     with get_db_context() as db:
-        existing = db.query(models.EmotionTag).filter(models.EmotionTag.name == tag.name).first()
-        if existing:
+        require_admin_user_id(request, db)
+        if row_exists(db, models.EmotionTag.name == tag.name):
             raise HTTPException(status_code=400, detail="Emotion already exists")
         return EmotionTagService.create_emotion_tag(db, tag)
 
 
 @router.put("/emotion-tags/{tag_id}", response_model=schemas.EmotionTag)
 def update_emotion_tag(tag_id: int, tag_update: schemas.EmotionTagUpdate, request: Request):
-    require_admin_user_id(request)
     with get_db_context() as db:
+        require_admin_user_id(request, db)
         if tag_update.name:
-            existing = db.query(models.EmotionTag).filter(models.EmotionTag.name == tag_update.name, models.EmotionTag.id != tag_id).first()
-            if existing:
+            if row_exists(db, models.EmotionTag.name == tag_update.name, models.EmotionTag.id != tag_id):
                 raise HTTPException(status_code=400, detail="Emotion already exists")
         updated = EmotionTagService.update_emotion_tag(db, tag_id, tag_update)
         if not updated:
@@ -96,8 +91,8 @@ def update_emotion_tag(tag_id: int, tag_update: schemas.EmotionTagUpdate, reques
 
 @router.delete("/emotion-tags/{tag_id}")
 def delete_emotion_tag(tag_id: int, request: Request):
-    require_admin_user_id(request)
     with get_db_context() as db:
+        require_admin_user_id(request, db)
         if not EmotionTagService.delete_emotion_tag(db, tag_id):
             raise HTTPException(status_code=404, detail="Emotion not found")
         return {"message": "Emotion deleted", "status": "success"}
@@ -153,7 +148,7 @@ async def upload_emoji(
     description: Optional[str] = Form(None),
 ):
     require_admin_user_id(request)
-    file_extension = (file.filename or "").split(".")[-1].lower()
+    file_extension = file_extension_of(file.filename)
     if file_extension != "gif":
         raise HTTPException(status_code=400, detail="Only GIF emoji resources are supported")
 
@@ -161,20 +156,8 @@ async def upload_emoji(
     group_id_list = _parse_id_list(group_ids, "group_ids")
     emotion_id_list = _parse_id_list(emotion_ids, "emotion_ids")
 
-    os.makedirs(settings.TEMP_PATH, exist_ok=True)
-    temp_path = ""
+    temp_path = await save_upload_to_temp(file, suffix=".gif")
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".gif", dir=settings.TEMP_PATH) as temp_file:
-            temp_path = temp_file.name
-            total = 0
-            while True:
-                chunk = await file.read(1024 * 1024)
-                if not chunk:
-                    break
-                total += len(chunk)
-                if total > settings.MAX_FILE_SIZE:
-                    raise HTTPException(status_code=413, detail="File too large")
-                temp_file.write(chunk)
         _verify_gif_file(temp_path)
 
         with get_db_context() as db:
@@ -194,16 +177,15 @@ async def upload_emoji(
             return schemas.UploadImageResponse(image_id=emoji.emoji_id, message="Emoji uploaded successfully")
     finally:
         try:
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
+            os.unlink(temp_path)
         except OSError:
             pass
 
 
 @router.put("/emojis/{emoji_id}")
 def update_emoji(emoji_id: str, emoji_update: schemas.EmojiUpdate, request: Request):
-    require_admin_user_id(request)
     with get_db_context() as db:
+        require_admin_user_id(request, db)
         _validate_emoji_tags(
             db,
             emoji_update.character_ids or [],
@@ -218,8 +200,8 @@ def update_emoji(emoji_id: str, emoji_update: schemas.EmojiUpdate, request: Requ
 
 @router.delete("/emojis/{emoji_id}")
 def delete_emoji(emoji_id: str, request: Request):
-    require_admin_user_id(request)
     with get_db_context() as db:
+        require_admin_user_id(request, db)
         if not EmojiService.delete_emoji(db, emoji_id):
             raise HTTPException(status_code=404, detail="Emoji not found")
         return {"message": "Emoji deleted", "status": "success"}
@@ -1,36 +1,38 @@
 from fastapi import APIRouter, HTTPException, Request
-from typing import List, Union
+from typing import List
 
 from ... import models, schemas
-from ...database import get_db_context
-from ...models import User, UserRole
+from ...database import get_db_context, get_read_db_context, row_exists
+from ...models import UserRole
+from ...security.permissions import get_user_role
 from ...services import FeatureTagService
 from ..auth import get_current_session
 
 router = APIRouter()
 
+_TAG_EDITOR_ROLES = frozenset((UserRole.ROOT, UserRole.ADMIN, UserRole.USER))
+
 
 def _is_logged_in_or_admin(request: Request, db) -> bool:
     session = get_current_session(request, db)
     if not session or session.get("is_guest"):
         return False
-    user = db.query(User).filter(User.id == session["user_id"]).first()
-    return bool(user and user.role in [UserRole.ROOT.value, UserRole.ADMIN.value, UserRole.USER.value])
+    role = get_user_role(db, session["user_id"])
+    return bool(role and role[0] in _TAG_EDITOR_ROLES)
 
 
 @router.get("/feature-tags/", response_model=List[schemas.FeatureTag])
 def get_feature_tags(skip: int = 0, limit: int = 1000):
-    with get_db_context() as db:
+    with get_read_db_context() as db:
         return FeatureTagService.get_feature_tags(db, skip, limit)
 
 
-@router.post("/feature-tags/", response_model=Union[schemas.FeatureTag, dict])
+@router.post("/feature-tags/", response_model=schemas.FeatureTag)
 def create_feature_tag(tag: schemas.FeatureTagCreate, request: Request):
     with get_db_context() as db:
         if not _is_logged_in_or_admin(request, db):
             raise HTTPException(status_code=403, detail="Login required")
-        existing = db.query(models.FeatureTag).filter(models.FeatureTag.name == tag.name).first()
-        if existing:
+        if row_exists(db, models.FeatureTag.name == tag.name):
             raise HTTPException(status_code=400, detail="Feature tag already exists")
         return FeatureTagService.create_feature_tag(db, tag)
 
@@ -41,11 +43,11 @@ def update_feature_tag(tag_id: int, tag_update: schemas.FeatureTagUpdate, reques
         if not _is_logged_in_or_admin(request, db):
             raise HTTPException(status_code=403, detail="Login required")
         if tag_update.name:
-            existing = db.query(models.FeatureTag).filter(
+            if row_exists(
+                db,
                 models.FeatureTag.name == tag_update.name,
                 models.FeatureTag.id != tag_id
-            ).first()
-            if existing:
+            ):
                 raise HTTPException(status_code=400, detail="Feature tag already exists")
         updated = FeatureTagService.update_feature_tag(db, tag_id, tag_update)
         if not updated:
@@ -2,56 +2,39 @@ from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Request
 from sqlalchemy import func
 from typing import List, Optional, Union
 
-from ...database import get_db_context
+from ...database import get_db_context, get_read_db_context, row_exists
 from ...services import GroupService, CharacterService, ImageService
-from ...models import User, UserRole, PendingRequest, ImageViewCount, CharacterQueryCount, RequestStatus, Group, Character
+from ...models import PendingRequest, ImageViewCount, CharacterQueryCount, RequestStatus, Group, Character
 from ... import models, schemas
 from ...config import settings
 from ...logger import log_error
-from ..auth import get_current_session, check_guest_limit
+from ...response_cache import invalidate
+from ...utils import json_dumps
+from ...security.permissions import get_auth_context
 import tempfile
 import os
-import json
 from datetime import datetime
 
 router = APIRouter()
 
 
 # 分组相关路由
-@router.post("/groups/", response_model=Union[schemas.Group, dict])
+@router.post("/groups/", response_model=Union[schemas.Group, schemas.PendingSubmitted])
 def create_group(group: schemas.GroupCreate, request: Request):
     """创建分组"""
     with get_db_context() as db:
-        existing = db.query(models.Group).filter(models.Group.name == group.name).first()
-        if existing:
+        if row_exists(db, models.Group.name == group.name):
             raise HTTPException(status_code=400, detail="分组名称已存在")
 
-        session = get_current_session(request, db)
-        is_admin = False
-        is_logged_in_user = False
-        user_id = None
-        guest_ip = None
-
-        if session:
-            if session.get("is_guest"):
-                guest_ip = session.get("guest_ip")
-                if not check_guest_limit(db, guest_ip):
-                    raise HTTPException(status_code=429, detail="今日操作次数已用完")
-            else:
-                user = db.query(User).filter(User.id == session["user_id"]).first()
-                if user:
-                    user_id = user.id
-                    is_admin = user.role in [UserRole.ROOT.value, UserRole.ADMIN.value]
-                    is_logged_in_user = True
-
-        if is_admin or is_logged_in_user:
+        auth = get_auth_context(request, db)
+        if auth.is_logged_in:
             return GroupService.create_group(db, group)
 
         pending_request = PendingRequest(
             request_type="group_add",
-            user_id=user_id,
-            guest_ip=guest_ip,
-            image_data=json.dumps({
+            user_id=auth.user_id,
+            guest_ip=auth.guest_ip,
+            image_data=json_dumps({
                 "name": group.name,
                 "aliases": group.aliases or [],
                 "description": group.description
@@ -59,12 +42,13 @@ def create_group(group: schemas.GroupCreate, request: Request):
         )
         db.add(pending_request)
         db.commit()
+        invalidate("stats")
         return {"message": "提交成功，等待管理员审核"}
 
 @router.get("/groups/", response_model=List[schemas.Group])
 def get_groups(skip: int = 0, limit: int = 100):
     """获取分组列表"""
-    with get_db_context() as db:
+    with get_read_db_context() as db:
         return GroupService.get_groups(db, skip, limit)
 
 @router.get("/groups/popular")
@@ -72,7 +56,7 @@ def get_popular_groups(limit: int = 5):
     safe_limit = max(1, min(limit, 8))
     image_count = func.count(func.distinct(models.Image.image_id))
 
-    with get_db_context() as db:
+    with get_read_db_context() as db:
         rows = (
             db.query(
                 models.Group.id,
@@ -100,40 +84,22 @@ def get_popular_groups(limit: int = 5):
 @router.get("/groups/{group_id}", response_model=schemas.Group)
 def get_group(group_id: int):
     """获取单个分组"""
-    with get_db_context() as db:
+    with get_read_db_context() as db:
         group = GroupService.get_group(db, group_id)
         if not group:
             raise HTTPException(status_code=404, detail="Group not found")
         return group
 
-@router.put("/groups/{group_id}", response_model=Union[schemas.Group, dict])
+@router.put("/groups/{group_id}", response_model=Union[schemas.Group, schemas.PendingSubmitted])
 def update_group(group_id: int, group_update: schemas.GroupUpdate, request: Request):
     """更新分组"""
     with get_db_context() as db:
-        session = get_current_session(request, db)
-        is_admin = False
-        is_logged_in_user = False
-        user_id = None
-        guest_ip = None
-
-        if session:
-            if session.get("is_guest"):
-                guest_ip = session.get("guest_ip")
-                if not check_guest_limit(db, guest_ip):
-                    raise HTTPException(status_code=429, detail="今日操作次数已用完")
-            else:
-                user = db.query(User).filter(User.id == session["user_id"]).first()
-                if user:
-                    user_id = user.id
-                    is_admin = user.role in [UserRole.ROOT.value, UserRole.ADMIN.value]
-                    is_logged_in_user = True
-
+        auth = get_auth_context(request, db)
         # 校验分组是否存在
-        existing = db.query(models.Group).filter(models.Group.id == group_id).first()
-        if not existing:
+        if not row_exists(db, models.Group.id == group_id):
             raise HTTPException(status_code=404, detail="Group not found")
 
-        if is_admin:
+        if auth.is_admin:
             group = GroupService.update_group(db, group_id, group_update)
             return group
 
@@ -141,42 +107,25 @@ def update_group(group_id: int, group_update: schemas.GroupUpdate, request: Requ
         update_data["group_id"] = group_id
         pending_request = PendingRequest(
             request_type="group_edit",
-            user_id=user_id,
-            guest_ip=guest_ip,
-            image_data=json.dumps(update_data)
+            user_id=auth.user_id,
+            guest_ip=auth.guest_ip,
+            image_data=json_dumps(update_data)
         )
         db.add(pending_request)
         db.commit()
+        invalidate("stats")
         return {"message": "提交成功，等待管理员审核"}
 
 @router.delete("/groups/{group_id}")
 def delete_group(group_id: int, request: Request):
     """删除分组"""
     with get_db_context() as db:
-        session = get_current_session(request, db)
-        is_admin = False
-        is_logged_in_user = False
-        user_id = None
-        guest_ip = None
-
-        if session:
-            if session.get("is_guest"):
-                guest_ip = session.get("guest_ip")
-                if not check_guest_limit(db, guest_ip):
-                    raise HTTPException(status_code=429, detail="今日操作次数已用完")
-            else:
-                user = db.query(User).filter(User.id == session["user_id"]).first()
-                if user:
-                    user_id = user.id
-                    is_admin = user.role in [UserRole.ROOT.value, UserRole.ADMIN.value]
-                    is_logged_in_user = True
-
+        auth = get_auth_context(request, db)
         # 校验分组是否存在
-        existing = db.query(models.Group).filter(models.Group.id == group_id).first()
-        if not existing:
+        if not row_exists(db, models.Group.id == group_id):
             raise HTTPException(status_code=404, detail="Group not found")
 
-        if is_admin:
+        if auth.is_admin:
             success = GroupService.delete_group(db, group_id)
             if not success:
                 raise HTTPException(status_code=404, detail="Group not found")
@@ -184,12 +133,13 @@ def delete_group(group_id: int, request: Request):
 
         pending_request = PendingRequest(
             request_type="group_delete",
-            user_id=user_id,
-            guest_ip=guest_ip,
-            image_data=json.dumps({
+            user_id=auth.user_id,
+            guest_ip=auth.guest_ip,
+            image_data=json_dumps({
                 "group_id": group_id
             })
         )
         db.add(pending_request)
         db.commit()
+        invalidate("stats")
         return {"message": "提交成功，等待管理员审核"}
@@ -1,14 +1,15 @@
-from datetime import datetime, timedelta, timezone
+from datetime import timedelta, timezone
 from time import monotonic
 
 from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel, Field
 
 from ...database import get_db_context
-from ...models import GuestbookMessage, User, UserRole
-from ..auth import get_current_session
+from ...models import GuestbookMessage, UserRole
+from ..auth import get_current_session, get_user
 from ...security.permissions import require_root_user_id
 from ...config import settings
+from ...utils import utc_now
 
 router = APIRouter(prefix="/guestbook", tags=["guestbook"])
 
@@ -27,7 +28,7 @@ class GuestbookReplyCreate(BaseModel):
 
 
 def serialize_message(message: GuestbookMessage) -> dict:
-    created_at = message.created_at or datetime.utcnow()
+    created_at = message.created_at or utc_now()
     created_at_beijing = created_at.replace(tzinfo=timezone.utc).astimezone(BEIJING_TIMEZONE)
     return {
         "id": message.id,
@@ -48,8 +49,8 @@ def can_manage_guestbook(request: Request) -> bool:
         session = get_current_session(request, db)
         if not session or session.get("is_guest"):
             return False
-        user = db.query(User).filter(User.id == session["user_id"]).first()
-        return bool(user and user.role == UserRole.ROOT.value and user.qq_number == settings.ROOT_QQ)
+        user = get_user(db, session["user_id"])
+        return bool(user and user.role == UserRole.ROOT and user.qq_number == settings.ROOT_QQ)
 
 
 @router.get("")
@@ -113,19 +114,19 @@ def create_message(payload: GuestbookMessageCreate, request: Request):
 
 @router.post("/{message_id}/replies", status_code=201)
 def reply_to_message(message_id: int, payload: GuestbookReplyCreate, request: Request):
-    owner_user_id = require_root_user_id(request)
-    content = payload.content.strip()
-    if not content:
-        raise HTTPException(status_code=422, detail="回复不能为空")
-
     with get_db_context() as db:
+        owner_user_id = require_root_user_id(request, db)
+        content = payload.content.strip()
+        if not content:
+            raise HTTPException(status_code=422, detail="回复不能为空")
+
         parent = db.query(GuestbookMessage).filter(
             GuestbookMessage.id == message_id,
             GuestbookMessage.parent_id.is_(None),
         ).first()
         if not parent:
             raise HTTPException(status_code=404, detail="留言不存在")
-        owner = db.query(User).filter(User.id == owner_user_id).first()
+        owner = get_user(db, owner_user_id)
         reply = GuestbookMessage(
             nickname=(owner.nickname if owner and owner.nickname else "拈风"),
             content=content,
@@ -141,8 +142,8 @@ def reply_to_message(message_id: int, payload: GuestbookReplyCreate, request: Re
 
 @router.delete("/{message_id}", status_code=204)
 def delete_message(message_id: int, request: Request):
-    require_root_user_id(request)
     with get_db_context() as db:
+        require_root_user_id(request, db)
         message = db.query(GuestbookMessage).filter(GuestbookMessage.id == message_id).first()
         if not message:
             raise HTTPException(status_code=404, detail="留言不存在")
@@ -4,16 +4,18 @@ from typing import List, Optional, Union
 from pathlib import Path
 from urllib.parse import quote
 
-from ...database import get_db_context
+from ...database import get_db_context, row_exists, find_missing_ids
+from ...counters import bump_image_view, bump_character_query
 from ...services import GroupService, CharacterService, ImageService
-from ...models import User, UserRole, PendingRequest, ImageViewCount, CharacterQueryCount, RequestStatus, Group, Character
+from ...models import PendingRequest, RequestStatus, Group, Character
 from ... import models, schemas
 from ...config import settings
 from ...logger import log_error
-from ..auth import get_current_session, check_guest_limit
+from ...response_cache import invalidate
+from ...utils import json_dumps
+from ...security.permissions import get_auth_context
 import tempfile
 import os
-import json
 from datetime import datetime
 
 router = APIRouter()
@@ -32,17 +34,9 @@ def search_images(
 ):
     """搜索图片"""
     with get_db_context() as db:
-        # 仅在明确按角色查询时统计角色查询次数（排除随机抽取）
+        # 仅在明确按角色查询时统计角色查询次数（排除随机抽取）；不存在的角色在落库时忽略
         if character_id:
-            character = db.query(models.Character).filter(models.Character.id == character_id).first()
-            if character:
-                record = db.query(CharacterQueryCount).filter(
-                    CharacterQueryCount.character_id == character_id
-                ).first()
-                if not record:
-                    record = CharacterQueryCount(character_id=character_id, query_count=0)
-                    db.add(record)
-                record.query_count += 1
+            bump_character_query(character_id)
 
         params = schemas.ImageSearchParams(
             group_id=group_id,
@@ -83,11 +77,7 @@ def get_image(image_id: str):
         if not image:
             raise HTTPException(status_code=404, detail="Image not found")
 
-        record = db.query(ImageViewCount).filter(ImageViewCount.image_id == image_id).first()
-        if not record:
-            record = ImageViewCount(image_id=image_id, view_count=0)
-            db.add(record)
-        record.view_count += 1
+        bump_image_view(image_id)
         return image
 
 
@@ -133,25 +123,9 @@ def update_image(image_id: str, image_update: schemas.ImageUpdate, request: Requ
     """更新图片信息"""
     # 检查用户权限
     with get_db_context() as db:
-        session = get_current_session(request, db)
-        is_admin = False
-        user_id = None
-        guest_ip = None
-        
-        if session:
-            if session.get("is_guest"):
-                guest_ip = session.get("guest_ip")
-                if not check_guest_limit(db, guest_ip):
-                    raise HTTPException(status_code=429, detail="今日操作次数已用完")
-            else:
-                user = db.query(User).filter(User.id == session["user_id"]).first()
-                if user:
-                    user_id = user.id
-                    is_admin = user.role in [UserRole.ROOT.value, UserRole.ADMIN.value]
-
+        auth = get_auth_context(request, db)
         # 校验图片是否存在
-        db_image = db.query(models.Image).filter(models.Image.image_id == image_id).first()
-        if not db_image:
+        if not row_exists(db, models.Image.image_id == image_id):
             raise HTTPException(status_code=404, detail="Image not found")
 
         # 校验角色ID（如有）
@@ -162,11 +136,8 @@ def update_image(image_id: str, image_update: schemas.ImageUpdate, request: Requ
                 raise HTTPException(status_code=400, detail="Invalid character_ids format")
 
             if character_ids:
-                existing_characters = db.query(models.Character).filter(
-                    models.Character.id.in_(character_ids)
-                ).all()
-                if len(existing_characters) != len(character_ids):
-                    missing_ids = set(character_ids) - set(c.id for c in existing_characters)
+                missing_ids = find_missing_ids(db, models.Character.id, character_ids)
+                if missing_ids:
                     raise HTTPException(status_code=400, detail=f"选中的某些角色不存在: {missing_ids}")
             image_update.character_ids = character_ids
 
@@ -176,11 +147,8 @@ def update_image(image_id: str, image_update: schemas.ImageUpdate, request: Requ
             except (TypeError, ValueError):
                 raise HTTPException(status_code=400, detail="Invalid group_ids format")
             if group_ids:
-                existing_groups = db.query(models.Group).filter(
-                    models.Group.id.in_(group_ids)
-                ).all()
-                if len(existing_groups) != len(group_ids):
-                    missing_ids = set(group_ids) - set(g.id for g in existing_groups)
+                missing_ids = find_missing_ids(db, models.Group.id, group_ids)
+                if missing_ids:
                     raise HTTPException(status_code=400, detail=f"Selected groups do not exist: {missing_ids}")
             image_update.group_ids = group_ids
 
@@ -190,15 +158,12 @@ def update_image(image_id: str, image_update: schemas.ImageUpdate, request: Requ
             except (TypeError, ValueError):
                 raise HTTPException(status_code=400, detail="Invalid feature_tag_ids format")
             if feature_tag_ids:
-                existing_tags = db.query(models.FeatureTag).filter(
-                    models.FeatureTag.id.in_(feature_tag_ids)
-                ).all()
-                if len(existing_tags) != len(feature_tag_ids):
-                    missing_ids = set(feature_tag_ids) - set(t.id for t in existing_tags)
+                missing_ids = find_missing_ids(db, models.FeatureTag.id, feature_tag_ids)
+                if missing_ids:
                     raise HTTPException(status_code=400, detail=f"Selected feature tags do not exist: {missing_ids}")
             image_update.feature_tag_ids = feature_tag_ids
         
-        if is_admin:
+        if auth.is_admin:
             # 管理员直接更新
             image = ImageService.update_image(db, image_id, image_update)
             if not image:
@@ -208,10 +173,10 @@ def update_image(image_id: str, image_update: schemas.ImageUpdate, request: Requ
         # 非管理员，创建待审核请求
         pending_request = PendingRequest(
             request_type="edit",
-            user_id=user_id,
-            guest_ip=guest_ip,
+            user_id=auth.user_id,
+            guest_ip=auth.guest_ip,
             image_id=image_id,
-            image_data=json.dumps({
+            image_data=json_dumps({
                 "pid": image_update.pid,
                 "description": image_update.description,
                 "character_ids": image_update.character_ids,
@@ -221,6 +186,7 @@ def update_image(image_id: str, image_update: schemas.ImageUpdate, request: Requ
         )
         db.add(pending_request)
         db.commit()
+        invalidate("stats")
 
         return {"message": "已提交，等待管理员审核", "status": "pending"}
 
@@ -229,28 +195,12 @@ def delete_image(image_id: str, request: Request):
     """删除图片"""
     # 检查用户权限
     with get_db_context() as db:
-        session = get_current_session(request, db)
-        is_admin = False
-        user_id = None
-        guest_ip = None
-        
-        if session:
-            if session.get("is_guest"):
-                guest_ip = session.get("guest_ip")
-                if not check_guest_limit(db, guest_ip):
-                    raise HTTPException(status_code=429, detail="今日操作次数已用完")
-            else:
-                user = db.query(User).filter(User.id == session["user_id"]).first()
-                if user:
-                    user_id = user.id
-                    is_admin = user.role in [UserRole.ROOT.value, UserRole.ADMIN.value]
-
+        auth = get_auth_context(request, db)
         # 校验图片是否存在
-        db_image = db.query(models.Image).filter(models.Image.image_id == image_id).first()
-        if not db_image:
+        if not row_exists(db, models.Image.image_id == image_id):
             raise HTTPException(status_code=404, detail="Image not found")
         
-        if is_admin:
+        if auth.is_admin:
             # 管理员直接删除
             store_path = settings.STORE_PATH
             success = ImageService.delete_image(db, image_id, store_path)
@@ -261,11 +211,12 @@ def delete_image(image_id: str, request: Request):
         # 非管理员，创建待审核请求
         pending_request = PendingRequest(
             request_type="delete",
-            user_id=user_id,
-            guest_ip=guest_ip,
+            user_id=auth.user_id,
+            guest_ip=auth.guest_ip,
             image_id=image_id
         )
         db.add(pending_request)
         db.commit()
+        invalidate("stats")
 
         return {"message": "已提交，等待管理员审核", "status": "pending"}
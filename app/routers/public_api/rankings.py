@@ -1,85 +1,79 @@
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Request
+from sqlalchemy import case, func
+from sqlalchemy.orm import joinedload, raiseload
 from typing import List, Optional, Union
 
-from ...database import get_db_context
+from ...database import get_read_db_context
 from ...services import GroupService, CharacterService, ImageService
-from ...models import User, UserRole, PendingRequest, ImageViewCount, CharacterQueryCount, RequestStatus, Group, Character
+from ...models import User, UserRole, PendingRequest, ImageViewCount, CharacterQueryCount, RequestStatus, RequestType, Character
 from ... import models, schemas
 from ...config import settings
 from ...logger import log_error
+from ...response_cache import cached_response
 from ..auth import get_current_session, check_guest_limit
 import tempfile
 import os
 import json
 from datetime import datetime
-import time
 
 router = APIRouter()
 
-_RANKINGS_CACHE = {"key": None, "expires_at": 0.0, "data": None}
+RANKINGS_CACHE_TTL_SECONDS = 60
+
+# 贡献度权重：新增图片 2 分，编辑图片 1 分，其余类型不计分
+CONTRIBUTION_WEIGHTS = {
+    RequestType.ADD: 2,
+    RequestType.EDIT: 1,
+}
 
 
 @router.get("/rankings")
 def get_rankings(limit: int = 10):
-    limit = max(1, min(limit, 50))
-    now = time.time()
-    if (
-        _RANKINGS_CACHE["key"] == limit
-        and _RANKINGS_CACHE["data"] is not None
-        and _RANKINGS_CACHE["expires_at"] > now
-    ):
-        return _RANKINGS_CACHE["data"]
     """获取贡献榜、角色人气榜、图片人气榜"""
-    with get_db_context() as db:
-        # 贡献榜（仅登录用户）
-        approved_requests = db.query(PendingRequest).filter(
-            PendingRequest.user_id.isnot(None),
-            PendingRequest.status == RequestStatus.APPROVED.value
-        ).all()
-
-        weights = {
-            "add": 2,
-            "edit": 1
-        }
-
-        contribution_map = {}
-        for req in approved_requests:
-            if not req.user_id:
-                continue
-            user_score = contribution_map.setdefault(req.user_id, {
-                "score": 0,
-                "counts": {}
-            })
-            user_score["score"] += weights.get(req.request_type, 0)
+    limit = max(1, min(limit, 50))
+    # 每个 limit 单独缓存；审核通过后由审核接口主动失效
+    return cached_response("rankings", RANKINGS_CACHE_TTL_SECONDS, lambda: _build_rankings(limit), key=limit)
 
-        user_ids = list(contribution_map.keys())
-        users = db.query(User).filter(User.id.in_(user_ids)).all() if user_ids else []
-        user_map = {user.id: user for user in users}
 
-        contribution_list = []
-        for user_id, info in contribution_map.items():
-            user = user_map.get(user_id)
-            if not user:
-                continue
-            contribution_list.append({
-                "user_id": user_id,
-                "nickname": user.nickname or user.qq_number,
-                "qq_number": user.qq_number,
-                "avatar_url": user.avatar_url,
-                "role": user.role,
-                "score": info["score"]
-            })
+def _build_rankings(limit: int) -> dict:
+    with get_read_db_context() as db:
+        # 贡献榜（仅登录用户）：在数据库中按用户聚合加权分数，只取前 limit 行
+        score = func.sum(case(
+            CONTRIBUTION_WEIGHTS, value=PendingRequest.request_type, else_=0
+        )).label("score")
+        contribution_rows = db.query(
+            User.id, User.nickname, User.qq_number, User.avatar_url, User.role, score
+        ).join(
+            PendingRequest, PendingRequest.user_id == User.id
+        ).filter(
+            PendingRequest.status == RequestStatus.APPROVED
+        ).group_by(User.id).order_by(
+            # 同分时按首次贡献先后排序
+            score.desc(), func.min(PendingRequest.id)
+        ).limit(limit).all()
 
-        contribution_list.sort(key=lambda item: item["score"], reverse=True)
-        contribution_list = contribution_list[:limit]
+        contribution_list = [
+            {
+                "user_id": row.id,
+                "nickname": row.nickname or row.qq_number,
+                "qq_number": row.qq_number,
+                "avatar_url": row.avatar_url,
+                "role": row.role,
+                "score": row.score
+            }
+            for row in contribution_rows
+        ]
 
+        # 榜单只读取已预加载的字段；raiseload 让遗漏的关系访问直接报错，而不是悄悄产生 N+1 查询
         # 角色人气榜（无统计时回退到最新角色）
         character_query_rows = db.query(CharacterQueryCount).order_by(
             CharacterQueryCount.query_count.desc()
         ).limit(limit).all()
         if character_query_rows:
             character_ids = [row.character_id for row in character_query_rows]
-            characters = db.query(Character).filter(Character.id.in_(character_ids)).all()
+            characters = db.query(Character).options(
+                joinedload(Character.group), raiseload("*")
+            ).filter(Character.id.in_(character_ids)).all()
             character_map = {c.id: c for c in characters}
 
             character_rank = []
@@ -87,22 +81,22 @@ def get_rankings(limit: int = 10):
                 character = character_map.get(row.character_id)
                 if not character:
                     continue
-                group = db.query(Group).filter(Group.id == character.group_id).first()
                 character_rank.append({
                     "character_id": character.id,
                     "name": character.name,
-                    "group_name": group.name if group else None,
+                    "group_name": character.group.name if character.group else None,
                     "count": row.query_count
                 })
         else:
-            latest_characters = db.query(Character).order_by(Character.created_at.desc()).limit(limit).all()
+            latest_characters = db.query(Character).options(
+                joinedload(Character.group), raiseload("*")
+            ).order_by(Character.created_at.desc()).limit(limit).all()
             character_rank = []
             for character in latest_characters:
-                group = db.query(Group).filter(Group.id == character.group_id).first()
                 character_rank.append({
                     "character_id": character.id,
                     "name": character.name,
-                    "group_name": group.name if group else None,
+                    "group_name": character.group.name if character.group else None,
                     "count": 0
                 })
 
@@ -112,7 +106,7 @@ def get_rankings(limit: int = 10):
         ).limit(limit).all()
         if image_view_rows:
             image_ids = [row.image_id for row in image_view_rows]
-            images = db.query(models.Image).filter(
+            images = db.query(models.Image).options(raiseload("*")).filter(
                 models.Image.image_id.in_(image_ids),
                 models.Image.file_status == ImageService.AVAILABLE
             ).all()
@@ -130,7 +124,7 @@ def get_rankings(limit: int = 10):
                     "count": row.view_count
                 })
         else:
-            latest_images = db.query(models.Image).filter(
+            latest_images = db.query(models.Image).options(raiseload("*")).filter(
                 models.Image.file_status == ImageService.AVAILABLE
             ).order_by(
                 models.Image.created_at.desc(),
@@ -146,14 +140,8 @@ def get_rankings(limit: int = 10):
                 for image in latest_images
             ]
 
-        data = {
+        return {
             "contribution": contribution_list,
             "characters": character_rank,
             "images": image_rank
         }
-        _RANKINGS_CACHE.update({
-            "key": limit,
-            "expires_at": time.time() + 60,
-            "data": data,
-        })
-        return data
@@ -1,75 +1,97 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Request
+from fastapi import APIRouter, BackgroundTasks, HTTPException, UploadFile, File, Form, Request, Response
 from typing import List, Optional, Union
 from pathlib import Path
 
-from ...database import get_db_context
+from ...database import get_db_context, find_missing_ids, row_exists
 from ...services import GroupService, CharacterService, EmojiService, ImageService
-from ...models import User, UserRole, PendingRequest, ImageViewCount, CharacterQueryCount, RequestStatus, Group, Character
+from ...models import PendingRequest, ImageViewCount, CharacterQueryCount, RequestStatus, Group, Character
 from ... import models, schemas
-from ...config import settings
+from ...config import settings, TEMP_DIR
 from ...logger import log_error
-from ...security.permissions import require_admin_user_id
-from ..auth import get_current_session, check_guest_limit
+from ...response_cache import cached_response, invalidate
+from ...security.permissions import get_auth_context, require_admin_user_id
+from ...utils import file_extension_of, json_dumps, json_loads, list_image_files, save_upload_to_temp, utc_now
 from PIL import Image, UnidentifiedImageError
-import tempfile
 import os
 import json
-from datetime import datetime
+import hashlib
 
 router = APIRouter()
 
 Image.MAX_IMAGE_PIXELS = 50_000_000
 
+# 后台会轮询临时目录；短 TTL 内复用同一次扫描，导入/删除时立即失效
+TEMP_LISTING_CACHE_TTL_SECONDS = 2
 
-def _allowed_image_extensions() -> set[str]:
-    return {ext.lower().lstrip(".") for ext in settings.ALLOWED_EXTENSIONS}
 
-
-async def _save_limited_upload(file: UploadFile, suffix: str) -> str:
-    total = 0
-    temp_file_path = ""
-    try:
-        os.makedirs(settings.TEMP_PATH, exist_ok=True)
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix, dir=settings.TEMP_PATH) as temp_file:
-            temp_file_path = temp_file.name
-            while True:
-                chunk = await file.read(1024 * 1024)
-                if not chunk:
-                    break
-                total += len(chunk)
-                if total > settings.MAX_FILE_SIZE:
-                    raise HTTPException(status_code=413, detail="File too large")
-                temp_file.write(chunk)
-        return temp_file_path
-    except Exception:
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-            except OSError:
-                pass
-        raise
+_ALLOWED_IMAGE_EXTENSIONS = frozenset(ext.lower().lstrip(".") for ext in settings.ALLOWED_EXTENSIONS)
 
 
-def _verify_image_file(path: str) -> None:
+def _verify_image_file(path: str, missing_detail: str = "Image not found") -> dict:
+    """校验图片内容；同一次打开顺带取得尺寸和大小，入库时不必再打开文件"""
     try:
-        with Image.open(path) as image:
-            image.verify()
+        with open(path, "rb") as fh:
+            info = {"file_size": os.fstat(fh.fileno()).st_size}
+            with Image.open(fh) as image:
+                info["width"], info["height"] = image.size
+                image.verify()
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=404, detail=missing_detail) from exc
     except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as exc:
         raise HTTPException(status_code=400, detail="Invalid image content") from exc
+    return info
 
 
 def _safe_temp_image_path(filename: str) -> Path:
     if not filename or "/" in filename or "\\" in filename or "\x00" in filename:
         raise HTTPException(status_code=400, detail="Invalid filename")
-    temp_root = Path(settings.TEMP_PATH).resolve()
-    image_path = (temp_root / filename).resolve()
+    # TEMP_DIR 在启动时已解析为绝对路径，这里只需解析拼接后的文件路径
+    image_path = (TEMP_DIR / filename).resolve()
     try:
-        image_path.relative_to(temp_root)
+        image_path.relative_to(TEMP_DIR)
     except ValueError as exc:
         raise HTTPException(status_code=400, detail="Invalid filename") from exc
     return image_path
 
 
+def _commit_imported_image(db, stored_path: str, source_path: str) -> None:
+    """提交以 move=True 导入的图片；提交失败时回滚，并把文件移回原处"""
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        ImageService.discard_saved_file(stored_path, source_path)
+        raise
+
+
+def _remove_imported_temp_file(path: Path) -> None:
+    """导入完成后删除临时文件（响应发出后执行），并让临时目录列表缓存失效"""
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        log_error(f"Failed to delete temp file: {e}")
+    invalidate("temp_images")
+
+
+def _scan_temp_listing() -> tuple[tuple[str, ...], str, bytes]:
+    names = list_image_files(TEMP_DIR)
+    digest = hashlib.blake2b("\0".join(names).encode("utf-8", "surrogateescape"), digest_size=8).hexdigest()
+    # 响应体随列表一起缓存，缓存期内的请求不再重复序列化
+    body = json_dumps({"images": names}).encode("utf-8", "surrogateescape")
+    return names, f'W/"{digest}"', body
+
+
+def _temp_listing() -> tuple[tuple[str, ...], str, bytes]:
+    """缓存的临时图片列表、ETag 及已序列化的响应体；多个请求共享同一份结果"""
+    return cached_response("temp_images", TEMP_LISTING_CACHE_TTL_SECONDS, _scan_temp_listing)
+
+
+def _list_temp_images() -> tuple[str, ...]:
+    return _temp_listing()[0]
+
+
 # 上传相关路由
 @router.post("/upload/single", response_model=schemas.UploadImageResponse)
 async def upload_single_image(
@@ -86,7 +108,7 @@ async def upload_single_image(
     """单张图片上传"""
     # 解析角色ID列表
     try:
-        character_id_list = json.loads(character_ids) if isinstance(character_ids, str) else character_ids
+        character_id_list = json_loads(character_ids) if isinstance(character_ids, str) else character_ids
         # 确保是列表
         if not isinstance(character_id_list, list):
             character_id_list = [character_id_list]
@@ -97,7 +119,7 @@ async def upload_single_image(
         raise HTTPException(status_code=400, detail=f"Invalid character_ids format: {str(e)}")
 
     try:
-        group_id_list = json.loads(group_ids) if group_ids else []
+        group_id_list = json_loads(group_ids) if group_ids else []
         if group_id:
             group_id_list.append(int(group_id))
         if not isinstance(group_id_list, list):
@@ -107,7 +129,7 @@ async def upload_single_image(
         raise HTTPException(status_code=400, detail=f"Invalid group_ids format: {str(e)}")
 
     try:
-        feature_tag_id_list = json.loads(feature_tag_ids) if feature_tag_ids else []
+        feature_tag_id_list = json_loads(feature_tag_ids) if feature_tag_ids else []
         if not isinstance(feature_tag_id_list, list):
             feature_tag_id_list = [feature_tag_id_list]
         feature_tag_id_list = list(dict.fromkeys([int(tid) for tid in feature_tag_id_list]))
@@ -115,7 +137,7 @@ async def upload_single_image(
         raise HTTPException(status_code=400, detail=f"Invalid feature_tag_ids format: {str(e)}")
 
     try:
-        emotion_id_list = json.loads(emotion_ids) if emotion_ids else []
+        emotion_id_list = json_loads(emotion_ids) if emotion_ids else []
         if not isinstance(emotion_id_list, list):
             emotion_id_list = [emotion_id_list]
         emotion_id_list = list(dict.fromkeys([int(eid) for eid in emotion_id_list]))
@@ -123,34 +145,27 @@ async def upload_single_image(
         raise HTTPException(status_code=400, detail=f"Invalid emotion_ids format: {str(e)}")
     
     # 验证文件类型
-    file_extension = (file.filename or "").split('.')[-1].lower()
-    if file_extension not in _allowed_image_extensions():
+    file_extension = file_extension_of(file.filename)
+    if file_extension not in _ALLOWED_IMAGE_EXTENSIONS:
         raise HTTPException(status_code=400, detail="Unsupported file type")
 
+    # Stream the upload to disk so large images do not sit in memory.
+    # 先落盘再打开会话：写连接只有一个，等待上传期间不能占着它
+    temp_file_path = await save_upload_to_temp(file, suffix=f'.{file_extension}')
+
     with get_db_context() as db:
-        session = get_current_session(request, db)
-        is_admin = False
-        user_id = None
-        guest_ip = None
-        
-        if session:
-            if session.get("is_guest"):
-                guest_ip = session.get("guest_ip")
-                # 检查游客操作限制
-                if not check_guest_limit(db, guest_ip):
-                    raise HTTPException(status_code=429, detail="今日操作次数已用完")
-            else:
-                user = db.query(User).filter(User.id == session["user_id"]).first()
-                if user:
-                    user_id = user.id
-                    is_admin = user.role in [UserRole.ROOT.value, UserRole.ADMIN.value]
-        
-        # Stream the upload to disk so large images do not sit in memory.
-        temp_file_path = await _save_limited_upload(file, suffix=f'.{file_extension}')
-        _verify_image_file(temp_file_path)
+        try:
+            auth = get_auth_context(request, db)
+            image_info = _verify_image_file(temp_file_path)
+        except HTTPException:
+            try:
+                os.unlink(temp_file_path)
+            except OSError:
+                pass
+            raise
 
         if file_extension == "gif":
-            if not is_admin:
+            if not auth.is_admin:
                 try:
                     os.unlink(temp_file_path)
                 except OSError:
@@ -161,19 +176,16 @@ async def upload_single_image(
                     if not getattr(gif_image, "is_animated", False):
                         raise HTTPException(status_code=400, detail="Static GIF images are not supported in emoji library")
                 if character_id_list:
-                    existing_characters = db.query(models.Character).filter(models.Character.id.in_(character_id_list)).all()
-                    if len(existing_characters) != len(character_id_list):
-                        missing_ids = set(character_id_list) - set(c.id for c in existing_characters)
+                    missing_ids = find_missing_ids(db, models.Character.id, character_id_list)
+                    if missing_ids:
                         raise HTTPException(status_code=400, detail=f"Selected characters do not exist: {missing_ids}")
                 if group_id_list:
-                    existing_groups = db.query(models.Group).filter(models.Group.id.in_(group_id_list)).all()
-                    if len(existing_groups) != len(group_id_list):
-                        missing_ids = set(group_id_list) - set(g.id for g in existing_groups)
+                    missing_ids = find_missing_ids(db, models.Group.id, group_id_list)
+                    if missing_ids:
                         raise HTTPException(status_code=400, detail=f"Selected groups do not exist: {missing_ids}")
                 if emotion_id_list:
-                    existing_emotions = db.query(models.EmotionTag).filter(models.EmotionTag.id.in_(emotion_id_list)).all()
-                    if len(existing_emotions) != len(emotion_id_list):
-                        missing_ids = set(emotion_id_list) - set(e.id for e in existing_emotions)
+                    missing_ids = find_missing_ids(db, models.EmotionTag.id, emotion_id_list)
+                    if missing_ids:
                         raise HTTPException(status_code=400, detail=f"Selected emotions do not exist: {missing_ids}")
                 emoji = EmojiService.create_emoji(
                     db,
@@ -197,7 +209,7 @@ async def upload_single_image(
                 except OSError:
                     pass
 
-        if is_admin:
+        if auth.is_admin:
             # 管理员直接上传
             try:
                 store_path = settings.STORE_PATH
@@ -209,18 +221,22 @@ async def upload_single_image(
                     description=description
                 )
                 
+                # 图片与贡献记录在同一事务中写入
                 image = ImageService.create_image(
-                    db, image_create, temp_file_path, file.filename, file_extension, store_path
+                    db, image_create, temp_file_path, file.filename, file_extension, store_path,
+                    commit=False, image_info=image_info, move=True,
                 )
+                image_id = image.image_id
+                stored_path = os.path.join(store_path, f"{image_id}.{image.file_extension}")
 
                 # 记录贡献度（直接通过）
-                if user_id:
+                if auth.user_id:
                     pending_request = PendingRequest(
                         request_type="add",
-                        user_id=user_id,
-                        status=RequestStatus.APPROVED.value,
+                        user_id=auth.user_id,
+                        status=RequestStatus.APPROVED,
                         image_id=image.image_id,
-                        image_data=json.dumps({
+                        image_data=json_dumps({
                             "character_ids": character_id_list,
                             "group_id": group_id_list[0] if group_id_list else None,
                             "group_ids": group_id_list,
@@ -228,14 +244,14 @@ async def upload_single_image(
                             "pid": pid,
                             "description": description
                         }),
-                        reviewed_at=datetime.utcnow(),
-                        reviewed_by=user_id
+                        reviewed_at=utc_now(),
+                        reviewed_by=auth.user_id
                     )
                     db.add(pending_request)
-                    db.commit()
+                _commit_imported_image(db, stored_path, temp_file_path)
                 
                 return schemas.UploadImageResponse(
-                    image_id=image.image_id,
+                    image_id=image_id,
                     message="图片上传成功"
                 )
             finally:
@@ -252,11 +268,8 @@ async def upload_single_image(
         validation_error = None
         if character_id_list:
             try:
-                existing_characters = db.query(models.Character).filter(
-                    models.Character.id.in_(character_id_list)
-                ).all()
-                if len(existing_characters) != len(character_id_list):
-                    missing_ids = set(character_id_list) - set(c.id for c in existing_characters)
+                missing_ids = find_missing_ids(db, models.Character.id, character_id_list)
+                if missing_ids:
                     validation_error = f"选中的某些角色不存在，无效ID: {missing_ids}"
             except Exception as e:
                 validation_error = f"角色验证失败: {str(e)}"
@@ -265,28 +278,19 @@ async def upload_single_image(
         if not validation_error and group_id:
             try:
                 group_id_int = int(group_id)
-                group_exists = db.query(models.Group).filter(
-                    models.Group.id == group_id_int
-                ).first()
-                if not group_exists:
+                if not row_exists(db, models.Group.id == group_id_int):
                     validation_error = f"选中的分组不存在 (ID: {group_id_int})"
             except (ValueError, TypeError) as e:
                 validation_error = f"分组ID格式错误: {str(e)}"
 
         if not validation_error and group_id_list:
-            existing_groups = db.query(models.Group).filter(
-                models.Group.id.in_(group_id_list)
-            ).all()
-            if len(existing_groups) != len(group_id_list):
-                missing_ids = set(group_id_list) - set(g.id for g in existing_groups)
+            missing_ids = find_missing_ids(db, models.Group.id, group_id_list)
+            if missing_ids:
                 validation_error = f"Selected groups do not exist: {missing_ids}"
 
         if not validation_error and feature_tag_id_list:
-            existing_tags = db.query(models.FeatureTag).filter(
-                models.FeatureTag.id.in_(feature_tag_id_list)
-            ).all()
-            if len(existing_tags) != len(feature_tag_id_list):
-                missing_ids = set(feature_tag_id_list) - set(t.id for t in existing_tags)
+            missing_ids = find_missing_ids(db, models.FeatureTag.id, feature_tag_id_list)
+            if missing_ids:
                 validation_error = f"Selected feature tags do not exist: {missing_ids}"
 
         if validation_error:
@@ -307,9 +311,9 @@ async def upload_single_image(
         try:
             pending_request = PendingRequest(
                 request_type="add",
-                user_id=user_id,
-                guest_ip=guest_ip,
-                image_data=json.dumps({
+                user_id=auth.user_id,
+                guest_ip=auth.guest_ip,
+                image_data=json_dumps({
                     "character_ids": character_id_list,
                     "group_id": group_id_list[0] if group_id_list else None,
                     "group_ids": group_id_list,
@@ -322,18 +326,16 @@ async def upload_single_image(
             )
             db.add(pending_request)
             db.commit()
+            invalidate("stats")
 
             return schemas.UploadImageResponse(
                 image_id="pending",
                 message="提交成功，等待管理员审核"
             )
         except Exception as e:
-            # 如果数据库操作失败，清理临时文件
+            # 如果数据库操作失败，清理临时文件（此时已移入 pending 目录）
             try:
-                if os.path.exists(pending_file_path):
-                    os.unlink(pending_file_path)
-                elif os.path.exists(temp_file_path):
-                    os.unlink(temp_file_path)
+                os.unlink(pending_file_path)
             except OSError:
                 pass
             raise HTTPException(status_code=500, detail=f"创建待审核请求失败: {str(e)}")
@@ -342,65 +344,45 @@ async def upload_single_image(
 def get_temp_images_count(request: Request):
     """Return temp image count for admins."""
     require_admin_user_id(request)
-    temp_path = settings.TEMP_PATH
-    if not os.path.exists(temp_path):
-        return {"count": 0}
-    allowed_extensions = {f".{ext}" for ext in _allowed_image_extensions()}
-    count = len([f for f in os.listdir(temp_path) if any(f.lower().endswith(ext) for ext in allowed_extensions)])
-    return {"count": count}
+    # 直接取缓存元组的长度，不为计数再构造列表
+    return {"count": len(_list_temp_images())}
 
 
 @router.get("/upload/temp-images")
 def get_temp_images(request: Request):
     """Return temp image filenames for admins."""
     require_admin_user_id(request)
-    temp_path = settings.TEMP_PATH
-    if not os.path.exists(temp_path):
-        return {"images": []}
-    allowed_extensions = {f".{ext}" for ext in _allowed_image_extensions()}
-    images = [f for f in os.listdir(temp_path) if any(f.lower().endswith(ext) for ext in allowed_extensions)]
-    return {"images": images}
+    _, etag, body = _temp_listing()
+    # 目录内容未变时只回 304，前端轮询无需重新传输和解析列表
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
 
 
 @router.post("/upload/temp", response_model=schemas.UploadImageResponse)
-def upload_temp_image(temp_upload: schemas.TempImageUpload, request: Request):
+def upload_temp_image(temp_upload: schemas.TempImageUpload, request: Request, background_tasks: BackgroundTasks):
     """Import an existing temp image into the managed store. Admin only."""
-    require_admin_user_id(request)
-    image_path = _safe_temp_image_path(temp_upload.filename)
-    if not image_path.exists():
-        raise HTTPException(status_code=404, detail="Image not found in temp directory")
-
-    file_extension = temp_upload.filename.split('.')[-1].lower()
-    if file_extension not in _allowed_image_extensions():
-        raise HTTPException(status_code=400, detail="Unsupported file type")
-    _verify_image_file(str(image_path))
-
     with get_db_context() as db:
-        session = get_current_session(request, db)
-        user_id = None
-        is_admin = False
-        if session and not session.get("is_guest"):
-            user = db.query(User).filter(User.id == session["user_id"]).first()
-            if user:
-                user_id = user.id
-                is_admin = user.role in [UserRole.ROOT.value, UserRole.ADMIN.value]
-        if not is_admin:
-            raise HTTPException(status_code=403, detail="Admin permission required")
+        # 鉴权复用本请求的会话，不再单独开一个
+        user_id = require_admin_user_id(request, db)
+        image_path = _safe_temp_image_path(temp_upload.filename)
+        file_extension = file_extension_of(temp_upload.filename)
+        if file_extension not in _ALLOWED_IMAGE_EXTENSIONS:
+            raise HTTPException(status_code=400, detail="Unsupported file type")
+        # 文件是否存在由打开校验时的 FileNotFoundError 判断，不再预先 stat
+        image_info = _verify_image_file(str(image_path), missing_detail="Image not found in temp directory")
 
         if temp_upload.character_ids:
-            existing_characters = db.query(models.Character).filter(models.Character.id.in_(temp_upload.character_ids)).all()
-            if len(existing_characters) != len(temp_upload.character_ids):
-                missing_ids = set(temp_upload.character_ids) - set(c.id for c in existing_characters)
+            missing_ids = find_missing_ids(db, models.Character.id, temp_upload.character_ids)
+            if missing_ids:
                 raise HTTPException(status_code=400, detail=f"Selected characters do not exist: {missing_ids}")
         if temp_upload.group_ids:
-            existing_groups = db.query(models.Group).filter(models.Group.id.in_(temp_upload.group_ids)).all()
-            if len(existing_groups) != len(temp_upload.group_ids):
-                missing_ids = set(temp_upload.group_ids) - set(g.id for g in existing_groups)
+            missing_ids = find_missing_ids(db, models.Group.id, temp_upload.group_ids)
+            if missing_ids:
                 raise HTTPException(status_code=400, detail=f"Selected groups do not exist: {missing_ids}")
         if temp_upload.feature_tag_ids:
-            existing_tags = db.query(models.FeatureTag).filter(models.FeatureTag.id.in_(temp_upload.feature_tag_ids)).all()
-            if len(existing_tags) != len(temp_upload.feature_tag_ids):
-                missing_ids = set(temp_upload.feature_tag_ids) - set(t.id for t in existing_tags)
+            missing_ids = find_missing_ids(db, models.FeatureTag.id, temp_upload.feature_tag_ids)
+            if missing_ids:
                 raise HTTPException(status_code=400, detail=f"Selected feature tags do not exist: {missing_ids}")
 
         if file_extension == "gif":
@@ -416,10 +398,7 @@ def upload_temp_image(temp_upload: schemas.TempImageUpload, request: Request):
                 temp_upload.filename,
                 "gif",
             )
-            try:
-                image_path.unlink()
-            except Exception as e:
-                log_error(f"Failed to delete temp file: {e}")
+            background_tasks.add_task(_remove_imported_temp_file, image_path)
             return schemas.UploadImageResponse(image_id=emoji.emoji_id, message="Imported temp GIF emoji successfully")
 
         image_create = schemas.ImageCreate(
@@ -429,15 +408,21 @@ def upload_temp_image(temp_upload: schemas.TempImageUpload, request: Request):
             pid=temp_upload.pid,
             description=temp_upload.description
         )
-        image = ImageService.create_image(db, image_create, str(image_path), temp_upload.filename, file_extension, settings.STORE_PATH)
+        # 图片与贡献记录在同一事务中写入
+        image = ImageService.create_image(
+            db, image_create, str(image_path), temp_upload.filename, file_extension, settings.STORE_PATH,
+            commit=False, image_info=image_info, move=True,
+        )
+        image_id = image.image_id
+        stored_path = os.path.join(settings.STORE_PATH, f"{image_id}.{image.file_extension}")
 
-        if is_admin and user_id:
+        if user_id:
             pending_request = PendingRequest(
                 request_type="add",
                 user_id=user_id,
-                status=RequestStatus.APPROVED.value,
+                status=RequestStatus.APPROVED,
                 image_id=image.image_id,
-                image_data=json.dumps({
+                image_data=json_dumps({
                     "character_ids": temp_upload.character_ids,
                     "group_id": temp_upload.group_ids[0] if temp_upload.group_ids else None,
                     "group_ids": temp_upload.group_ids,
@@ -445,17 +430,15 @@ def upload_temp_image(temp_upload: schemas.TempImageUpload, request: Request):
                     "pid": temp_upload.pid,
                     "description": temp_upload.description
                 }),
-                reviewed_at=datetime.utcnow(),
+                reviewed_at=utc_now(),
                 reviewed_by=user_id
             )
             db.add(pending_request)
-            db.commit()
+        _commit_imported_image(db, stored_path, str(image_path))
 
-        try:
-            image_path.unlink()
-        except Exception as e:
-            log_error(f"Failed to delete temp file: {e}")
-        return schemas.UploadImageResponse(image_id=image.image_id, message="Imported temp image successfully")
+        # 临时文件已移入存储目录，只需让列表缓存失效
+        invalidate("temp_images")
+        return schemas.UploadImageResponse(image_id=image_id, message="Imported temp image successfully")
 
 
 @router.delete("/upload/temp/{filename}")
@@ -463,14 +446,14 @@ def delete_temp_image(filename: str, request: Request):
     """Delete a temp image. Admin only."""
     require_admin_user_id(request)
     image_path = _safe_temp_image_path(filename)
-    if not image_path.exists():
-        raise HTTPException(status_code=404, detail="Image not found in temp directory")
-
-    file_extension = filename.split('.')[-1].lower() if '.' in filename else ''
-    if file_extension not in _allowed_image_extensions():
+    file_extension = file_extension_of(filename)
+    if file_extension not in _ALLOWED_IMAGE_EXTENSIONS:
         raise HTTPException(status_code=400, detail="File is not an image")
     try:
         image_path.unlink()
-        return {"message": f"Temp image {filename} deleted"}
-    except Exception as e:
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Image not found in temp directory")
+    except OSError as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete image: {str(e)}")
+    invalidate("temp_images")
+    return {"message": f"Temp image {filename} deleted"}
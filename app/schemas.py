@@ -339,6 +339,16 @@ class PendingRequestAction(BaseModel):
     action: str  # approve 或 reject
     reason: Optional[str] = None
 
+class PendingRequestBulkItem(PendingRequestAction):
+    request_id: int
+
+class PendingRequestBulkAction(BaseModel):
+    actions: List[PendingRequestBulkItem]
+
+class PendingSubmitted(BaseModel):
+    """非管理员提交修改后返回的待审核提示"""
+    message: str
+
 class SetNickname(BaseModel):
     nickname: str
 
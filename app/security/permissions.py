@@ -1,36 +1,105 @@
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
 from fastapi import HTTPException, Request
+from sqlalchemy import bindparam, select
+from sqlalchemy.orm import Session
 
 from ..database import get_db_context
-from ..models import User, UserRole
-from ..routers.auth import get_current_session
+from ..models import User, UserRole, ADMIN_ROLE_SET
+from ..routers.auth import check_guest_limit, get_current_session
 from ..config import settings
+from .role_cache import cache_user_role, get_cached_user_role
+
+
+# 模块级语句对象：只取需要的列，不构造 ORM 实体，编译结果由引擎缓存复用
+_ROLE_BY_ID = select(User.id, User.role, User.qq_number).where(User.id == bindparam("uid"))
+
+
+def get_user_role(db: Session, user_id: int) -> Optional[Tuple[str, str]]:
+    """Return ``(role, qq_number)`` for a user via the role cache; None if the user is gone."""
+    cached = get_cached_user_role(user_id)
+    if cached is not None:
+        return cached
+    row = db.execute(_ROLE_BY_ID, {"uid": user_id}).one_or_none()
+    if row is None:
+        return None
+    cache_user_role(row.id, row.role, row.qq_number)
+    return row.role, row.qq_number
+
+
+def _session_role(request: Request, db: Session, label: str) -> Tuple[int, str, str]:
+    """Return ``(user_id, role, qq_number)``; the role lookup is served from a short TTL cache."""
+    session = get_current_session(request, db)
+    if not session or session.get("is_guest"):
+        raise HTTPException(status_code=401, detail=f"{label} login required")
+
+    user_id = session["user_id"]
+    role = get_user_role(db, user_id)
+    if role is None:
+        raise HTTPException(status_code=401, detail="User not found")
+    return (user_id, *role)
+
+
+def require_admin_user_id(request: Request, db: Optional[Session] = None) -> int:
+    """Return current user id when the request belongs to an admin or root user.
+
+    Pass the handler's ``db`` to reuse its session instead of opening another one.
+    """
+    if db is None:
+        with get_db_context() as db:
+            return require_admin_user_id(request, db)
+
+    user_id, role, _ = _session_role(request, db, "Admin")
+    if role not in ADMIN_ROLE_SET:
+        raise HTTPException(status_code=403, detail="Admin permission required")
+    return user_id
+
+
+def require_root_user_id(request: Request, db: Optional[Session] = None) -> int:
+    """Return current user id when the request belongs to the root user.
+
+    Pass the handler's ``db`` to reuse its session instead of opening another one.
+    """
+    if db is None:
+        with get_db_context() as db:
+            return require_root_user_id(request, db)
+
+    user_id, role, qq_number = _session_role(request, db, "Root")
+    if role != UserRole.ROOT or qq_number != settings.ROOT_QQ:
+        raise HTTPException(status_code=403, detail="Root permission required")
+    return user_id
+
+
+@dataclass(slots=True)
+class AuthContext:
+    """写操作的调用者身份：登录用户、管理员或游客"""
+    user_id: Optional[int] = None
+    is_admin: bool = False
+    guest_ip: Optional[str] = None
+
+    @property
+    def is_logged_in(self) -> bool:
+        return self.user_id is not None
+
+
+def get_auth_context(request: Request, db: Session) -> AuthContext:
+    """解析当前会话的写操作身份；游客会在此消耗一次当日操作次数。
+
+    角色只查 ``(id, role, qq_number)`` 三列并走短 TTL 缓存，不加载完整的 User 实体。
+    """
+    session = get_current_session(request, db)
+    if not session:
+        return AuthContext()
 
+    if session.get("is_guest"):
+        guest_ip = session.get("guest_ip")
+        if not check_guest_limit(db, guest_ip):
+            raise HTTPException(status_code=429, detail="今日操作次数已用完")
+        return AuthContext(guest_ip=guest_ip)
 
-def require_admin_user_id(request: Request) -> int:
-    """Return current user id when the request belongs to an admin or root user."""
-    with get_db_context() as db:
-        session = get_current_session(request, db)
-        if not session or session.get("is_guest"):
-            raise HTTPException(status_code=401, detail="Admin login required")
-
-        user = db.query(User).filter(User.id == session["user_id"]).first()
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
-        if user.role not in [UserRole.ROOT.value, UserRole.ADMIN.value]:
-            raise HTTPException(status_code=403, detail="Admin permission required")
-        return user.id
-
-
-def require_root_user_id(request: Request) -> int:
-    """Return current user id when the request belongs to the root user."""
-    with get_db_context() as db:
-        session = get_current_session(request, db)
-        if not session or session.get("is_guest"):
-            raise HTTPException(status_code=401, detail="Root login required")
-
-        user = db.query(User).filter(User.id == session["user_id"]).first()
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
-        if user.role != UserRole.ROOT.value or user.qq_number != settings.ROOT_QQ:
-            raise HTTPException(status_code=403, detail="Root permission required")
-        return user.id
+    user_id = session["user_id"]
+    role = get_user_role(db, user_id)
+    if role is None:
+        return AuthContext()
+    return AuthContext(user_id=user_id, is_admin=role[0] in ADMIN_ROLE_SET)
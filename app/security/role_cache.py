@@ -0,0 +1,41 @@
+import threading
+import time
+from typing import Optional, Tuple
+
+ROLE_CACHE_TTL_SECONDS = 30
+ROLE_CACHE_MAXSIZE = 1024
+
+_lock = threading.Lock()
+_entries: dict[int, Tuple[float, str, str]] = {}
+
+
+def get_cached_user_role(user_id: int) -> Optional[Tuple[str, str]]:
+    """Return cached ``(role, qq_number)`` for a user, or None when missing or expired."""
+    with _lock:
+        entry = _entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, role, qq_number = entry
+        if expires_at <= time.monotonic():
+            del _entries[user_id]
+            return None
+        return role, qq_number
+
+
+def cache_user_role(user_id: int, role: str, qq_number: str) -> None:
+    with _lock:
+        if len(_entries) >= ROLE_CACHE_MAXSIZE and user_id not in _entries:
+            now = time.monotonic()
+            for key in [key for key, entry in _entries.items() if entry[0] <= now]:
+                del _entries[key]
+            if len(_entries) >= ROLE_CACHE_MAXSIZE:
+                _entries.pop(next(iter(_entries)))
+        _entries[user_id] = (time.monotonic() + ROLE_CACHE_TTL_SECONDS, role, qq_number)
+
+
+def invalidate_user_role(user_id: Optional[int]) -> None:
+    """Drop the cached role after any change to a user's role."""
+    if user_id is None:
+        return
+    with _lock:
+        _entries.pop(user_id, None)
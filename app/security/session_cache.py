@@ -0,0 +1,46 @@
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+SESSION_CACHE_TTL_SECONDS = 60
+SESSION_CACHE_MAXSIZE = 65536
+
+_lock = threading.Lock()
+_entries: dict[str, tuple[float, datetime, dict]] = {}
+
+
+def get_cached_session(session_id: str, now: datetime) -> Optional[dict]:
+    """Return a copy of the cached session info, or None when missing, stale or past ``expires_at``."""
+    with _lock:
+        entry = _entries.get(session_id)
+        if entry is None:
+            return None
+        cached_until, expires_at, info = entry
+        if cached_until <= time.monotonic() or expires_at <= now:
+            del _entries[session_id]
+            return None
+        return dict(info)
+
+
+def cache_session(session_id: str, expires_at: datetime, info: dict) -> None:
+    with _lock:
+        if len(_entries) >= SESSION_CACHE_MAXSIZE and session_id not in _entries:
+            now = time.monotonic()
+            for key in [key for key, entry in _entries.items() if entry[0] <= now]:
+                del _entries[key]
+            if len(_entries) >= SESSION_CACHE_MAXSIZE:
+                _entries.pop(next(iter(_entries)))
+        _entries[session_id] = (time.monotonic() + SESSION_CACHE_TTL_SECONDS, expires_at, dict(info))
+
+
+def invalidate_session(session_id: Optional[str]) -> None:
+    """Drop the cached session after logout or deletion.
+
+    Only this process's cache is cleared. With several workers, a logged-out cookie
+    stays valid on the others until their entry ages out (``SESSION_CACHE_TTL_SECONDS``).
+    """
+    if session_id is None:
+        return
+    with _lock:
+        _entries.pop(session_id, None)
@@ -3,7 +3,7 @@ from __future__ import annotations
 import hashlib
 import secrets
 from dataclasses import dataclass
-from datetime import datetime, timedelta
+from datetime import timedelta
 from urllib.parse import urlencode
 
 from fastapi import HTTPException
@@ -11,6 +11,7 @@ from sqlalchemy.orm import Session
 
 from ..config import settings
 from ..models import LoginTicket
+from ..utils import utc_now
 
 DEFAULT_TICKET_TTL_SECONDS = 300
 ALLOWED_PURPOSES = {"login", "upload", "admin", "phrolova"}
@@ -62,7 +63,7 @@ def create_login_ticket(
         purpose=normalize_purpose(purpose),
         redirect_path=normalize_redirect_path(redirect_path),
         created_by=(created_by or None),
-        expires_at=datetime.utcnow() + timedelta(seconds=max(ttl, 30)),
+        expires_at=utc_now() + timedelta(seconds=max(ttl, 30)),
     )
     db.add(record)
     db.flush()
@@ -72,7 +73,7 @@ def create_login_ticket(
 def consume_login_ticket(db: Session, ticket: str, purpose: str = "login") -> LoginTicket:
     ticket_hash = hash_ticket((ticket or "").strip())
     normalized_purpose = normalize_purpose(purpose)
-    now = datetime.utcnow()
+    now = utc_now()
     record = db.query(LoginTicket).filter(LoginTicket.ticket_hash == ticket_hash).first()
     if not record:
         raise HTTPException(status_code=401, detail="Invalid login ticket")
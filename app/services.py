@@ -1,16 +1,32 @@
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, or_, func
+from sqlalchemy import and_, bindparam, or_, func, select
 from typing import List, Optional, Tuple
-from datetime import datetime
 from collections import defaultdict, deque
 from . import models, schemas
 from .config import settings
+from .logger import log_error
+from .utils import list_image_files, utc_now
 import os
 import secrets
 from PIL import Image as PILImage
 import shutil
 import uuid
 
+# 按主键取实体的语句在模块级构造一次，执行时只绑定参数
+_GROUP_BY_ID = select(models.Group).where(models.Group.id == bindparam("id"))
+_CHARACTER_BY_ID = select(models.Character).where(models.Character.id == bindparam("id"))
+_IMAGE_BY_ID = select(models.Image).where(models.Image.image_id == bindparam("id"))
+
+
+def _remove_file(path: str) -> None:
+    """直接删除文件，不存在时忽略；省去 exists 检查的一次系统调用和竞态"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        log_error(f"删除文件失败 {path}: {e}")
+
 class GroupService:
     """分组服务"""
 
@@ -59,7 +75,7 @@ class GroupService:
     @staticmethod
     def get_group(db: Session, group_id: int) -> Optional[dict]:
         """获取分组"""
-        group = db.query(models.Group).filter(models.Group.id == group_id).first()
+        group = db.execute(_GROUP_BY_ID, {"id": group_id}).scalar_one_or_none()
         if not group:
             return None
         return GroupService.group_to_dict(group)
@@ -73,7 +89,7 @@ class GroupService:
     @staticmethod
     def update_group(db: Session, group_id: int, group_update: schemas.GroupUpdate) -> Optional[dict]:
         """更新分组"""
-        db_group = db.query(models.Group).filter(models.Group.id == group_id).first()
+        db_group = db.execute(_GROUP_BY_ID, {"id": group_id}).scalar_one_or_none()
         if db_group:
             update_data = group_update.dict(exclude_unset=True)
             aliases = None
@@ -101,7 +117,7 @@ class GroupService:
     @staticmethod
     def delete_group(db: Session, group_id: int) -> bool:
         """删除分组"""
-        db_group = db.query(models.Group).filter(models.Group.id == group_id).first()
+        db_group = db.execute(_GROUP_BY_ID, {"id": group_id}).scalar_one_or_none()
         if db_group:
             db.delete(db_group)
             db.commit()
@@ -231,7 +247,7 @@ class CharacterService:
     @staticmethod
     def update_character(db: Session, character_id: int, character_update: schemas.CharacterUpdate) -> Optional[dict]:
         """更新角色"""
-        db_character = db.query(models.Character).filter(models.Character.id == character_id).first()
+        db_character = db.execute(_CHARACTER_BY_ID, {"id": character_id}).scalar_one_or_none()
         if db_character:
             update_data = character_update.dict(exclude_unset=True)
             nicknames = None
@@ -282,7 +298,7 @@ class CharacterService:
     @staticmethod
     def delete_character(db: Session, character_id: int) -> bool:
         """删除角色"""
-        db_character = db.query(models.Character).filter(models.Character.id == character_id).first()
+        db_character = db.execute(_CHARACTER_BY_ID, {"id": character_id}).scalar_one_or_none()
         if db_character:
             db.delete(db_character)
             db.commit()
@@ -462,7 +478,7 @@ class EmojiService:
     def mark_file_status(db: Session, emoji: models.Emoji, exists: Optional[bool] = None) -> str:
         exists = EmojiService.emoji_file_exists(emoji) if exists is None else exists
         emoji.file_status = EmojiService.AVAILABLE if exists else EmojiService.MISSING
-        emoji.file_checked_at = datetime.utcnow()
+        emoji.file_checked_at = utc_now()
         return emoji.file_status
 
     @staticmethod
@@ -495,9 +511,9 @@ class EmojiService:
 
     @staticmethod
     def save_emoji_file(file_path: str, emoji_id: str, file_extension: str, store_path: str) -> Tuple[str, dict]:
+        """file_extension 需已规范化（小写、无点），由 create_emoji 统一处理"""
         os.makedirs(store_path, exist_ok=True)
-        extension = file_extension.lower().lstrip(".") or "gif"
-        new_filename = f"{emoji_id}.{extension}"
+        new_filename = f"{emoji_id}.{file_extension}"
         new_file_path = os.path.join(store_path, new_filename)
         relative_path = f"resource/emojis/{new_filename}"
         shutil.copy2(file_path, new_file_path)
@@ -517,15 +533,17 @@ class EmojiService:
             if not db.query(models.Emoji).filter(models.Emoji.emoji_id == emoji_id).first():
                 break
 
+        # 扩展名只规范化一次，文件名与记录共用
+        file_extension = file_extension.lower().lstrip(".") or "gif"
         relative_path, info = EmojiService.save_emoji_file(file_path, emoji_id, file_extension, settings.EMOJI_PATH)
         db_emoji = models.Emoji(
             emoji_id=emoji_id,
             description=emoji.description,
             original_filename=original_filename,
-            file_extension=file_extension.lower().lstrip(".") or "gif",
+            file_extension=file_extension,
             file_path=relative_path,
             file_status=EmojiService.AVAILABLE,
-            file_checked_at=datetime.utcnow(),
+            file_checked_at=utc_now(),
             **info,
         )
         EmojiService._apply_relationships(db, db_emoji, emoji.character_ids, emoji.group_ids, emoji.emotion_ids)
@@ -696,11 +714,7 @@ class EmojiService:
         full_path = EmojiService.emoji_full_path(db_emoji)
         db.delete(db_emoji)
         db.commit()
-        try:
-            if os.path.isfile(full_path):
-                os.remove(full_path)
-        except OSError:
-            pass
+        _remove_file(full_path)
         return True
 
 
@@ -732,7 +746,7 @@ class ImageService:
     def mark_file_status(db: Session, image: models.Image, exists: Optional[bool] = None) -> str:
         exists = ImageService.image_file_exists(image) if exists is None else exists
         image.file_status = ImageService.AVAILABLE if exists else ImageService.MISSING
-        image.file_checked_at = datetime.utcnow()
+        image.file_checked_at = utc_now()
         return image.file_status
 
     @staticmethod
@@ -909,7 +923,7 @@ class ImageService:
     @staticmethod
     def sync_images_for_group(db: Session, group_id: int) -> int:
         """Add a group tag to images linked to characters from that group."""
-        group = db.query(models.Group).filter(models.Group.id == group_id).first()
+        group = db.execute(_GROUP_BY_ID, {"id": group_id}).scalar_one_or_none()
         if not group:
             return 0
 
@@ -937,19 +951,28 @@ class ImageService:
         return secrets.token_hex(5).upper()  # 生成10位十六进制字符串
     
     @staticmethod
-    def save_image_file(file_path: str, image_id: str, file_extension: str, store_path: str) -> Tuple[str, dict]:
-        """保存图片文件并返回相对路径和图片信息"""
+    def save_image_file(file_path: str, image_id: str, file_extension: str, store_path: str,
+                        image_info: Optional[dict] = None, move: bool = False) -> Tuple[str, dict]:
+        """保存图片文件并返回相对路径和图片信息；file_extension 需已是小写。
+        调用方已读取过尺寸/大小时传入 image_info，不再重新打开复制后的文件；
+        move=True 表示源文件之后不再需要，同一文件系统内直接 rename，不复制数据"""
         # 确保存储目录存在
         os.makedirs(store_path, exist_ok=True)
         
         # 新文件路径
-        new_filename = f"{image_id}.{file_extension.lower()}"
+        new_filename = f"{image_id}.{file_extension}"
         new_file_path = os.path.join(store_path, new_filename)
         relative_path = f"resource/store/{new_filename}"
         
-        # 复制文件
-        shutil.copy2(file_path, new_file_path)
+        if move:
+            # 跨文件系统时 shutil.move 退回到复制后删除源文件
+            shutil.move(file_path, new_file_path)
+        else:
+            shutil.copy2(file_path, new_file_path)
         
+        if image_info is not None:
+            return relative_path, image_info
+
         # 获取图片信息
         image_info = {}
         try:
@@ -960,49 +983,74 @@ class ImageService:
             pass
         
         return relative_path, image_info
+
+    @staticmethod
+    def discard_saved_file(stored_path: str, source_path: Optional[str] = None) -> None:
+        """撤销 save_image_file：移动过来的文件移回 source_path，复制出的文件直接删除"""
+        try:
+            if source_path:
+                shutil.move(stored_path, source_path)
+            else:
+                os.remove(stored_path)
+        except FileNotFoundError:
+            pass
+        except OSError as exc:
+            log_error(f"撤销图片文件失败: {stored_path}: {exc}")
     
     @staticmethod
     def create_image(db: Session, image: schemas.ImageCreate, file_path: str, original_filename: str, 
-                    file_extension: str, store_path: str) -> models.Image:
-        """创建图片记录"""
+                    file_extension: str, store_path: str, commit: bool = True,
+                    image_info: Optional[dict] = None, move: bool = False) -> models.Image:
+        """创建图片记录；commit=False 时只 flush，由调用方与其他写入一起提交"""
+        # 扩展名只规范化一次，存储文件名与记录共用
+        file_extension = file_extension.lower()
         # 生成唯一ID
         while True:
             image_id = ImageService.generate_image_id()
-            if not db.query(models.Image).filter(models.Image.image_id == image_id).first():
+            if not db.execute(_IMAGE_BY_ID, {"id": image_id}).scalar_one_or_none():
                 break
         
         # 保存图片文件
         relative_path, image_info = ImageService.save_image_file(
-            file_path, image_id, file_extension, store_path
-        )
-        
-        # 创建数据库记录
-        db_image = models.Image(
-            image_id=image_id,
-            pid=image.pid,
-            description=image.description,
-            original_filename=original_filename,
-            file_extension=file_extension,
-            file_path=relative_path,
-            file_status=ImageService.AVAILABLE,
-            file_checked_at=datetime.utcnow(),
-            thumb_status=ImageService.THUMB_PENDING,
-            **image_info
-        )
-        
-        # 关联角色
-        ImageService._apply_tag_relationships(
-            db,
-            db_image,
-            image.character_ids,
-            image.group_ids,
-            image.feature_tag_ids,
+            file_path, image_id, file_extension, store_path, image_info, move
         )
+        stored_path = os.path.join(store_path, f"{image_id}.{file_extension}")
 
-        ImageService.ensure_thumbnail(db_image)
-        
-        db.add(db_image)
-        db.commit()
+        try:
+            # 创建数据库记录
+            db_image = models.Image(
+                image_id=image_id,
+                pid=image.pid,
+                description=image.description,
+                original_filename=original_filename,
+                file_extension=file_extension,
+                file_path=relative_path,
+                file_status=ImageService.AVAILABLE,
+                file_checked_at=utc_now(),
+                thumb_status=ImageService.THUMB_PENDING,
+                **image_info
+            )
+
+            # 关联角色
+            ImageService._apply_tag_relationships(
+                db,
+                db_image,
+                image.character_ids,
+                image.group_ids,
+                image.feature_tag_ids,
+            )
+
+            ImageService.ensure_thumbnail(db_image)
+
+            db.add(db_image)
+            if not commit:
+                db.flush()
+                return db_image
+            db.commit()
+        except Exception:
+            # 记录没有写入时不留下存储文件；移动过来的源文件放回原处
+            ImageService.discard_saved_file(stored_path, file_path if move else None)
+            raise
         db.refresh(db_image)
         return db_image
     
@@ -1106,27 +1154,23 @@ class ImageService:
     @staticmethod
     def search_images(db: Session, params: schemas.ImageSearchParams) -> Tuple[List[dict], int]:
         """Search images and ignore records whose files are missing."""
-        query = db.query(models.Image).options(
+        # 总数随分页查询一并返回（count() OVER ()），不再单独执行 COUNT(*)
+        query = db.query(models.Image, func.count().over().label("total")).options(
             joinedload(models.Image.characters).joinedload(models.Character.group),
             joinedload(models.Image.characters).joinedload(models.Character.feature_tags),
             joinedload(models.Image.groups),
             joinedload(models.Image.feature_tags),
         ).filter(models.Image.file_status == ImageService.AVAILABLE)
         
+        # 关联条件用 EXISTS 表达，结果不会重复，窗口计数即为去重后的总数
         if params.group_id:
-            query = query.join(models.Image.groups).filter(
-                models.Group.id == params.group_id
-            )
+            query = query.filter(models.Image.groups.any(models.Group.id == params.group_id))
         
         if params.character_id:
-            query = query.join(models.Image.characters).filter(
-                models.Character.id == params.character_id
-            )
+            query = query.filter(models.Image.characters.any(models.Character.id == params.character_id))
 
         if params.feature_tag_id:
-            query = query.join(models.Image.feature_tags).filter(
-                models.FeatureTag.id == params.feature_tag_id
-            )
+            query = query.filter(models.Image.feature_tags.any(models.FeatureTag.id == params.feature_tag_id))
         
         if params.pid:
             query = query.filter(models.Image.pid.like(f"%{params.pid}%"))
@@ -1136,18 +1180,24 @@ class ImageService:
         
         offset = params.offset or 0
         limit = params.limit or settings.DEFAULT_PAGE_SIZE
-        query = query.distinct()
-        total = query.order_by(None).count()
-        images = query.order_by(
+        rows = query.order_by(
             models.Image.created_at.desc(),
             models.Image.image_id.desc()
         ).offset(offset).limit(limit).all()
+        if rows:
+            total = rows[0].total
+        elif offset:
+            # 翻页越界时没有行可携带总数，退回单独计数
+            total = query.with_entities(func.count(models.Image.image_id)).order_by(None).scalar() or 0
+        else:
+            total = 0
+        images = [row[0] for row in rows]
         return [ImageService.image_to_dict(img) for img in images], total
     
     @staticmethod
     def update_image(db: Session, image_id: str, image_update: schemas.ImageUpdate) -> Optional[models.Image]:
         """更新图片"""
-        db_image = db.query(models.Image).filter(models.Image.image_id == image_id).first()
+        db_image = db.execute(_IMAGE_BY_ID, {"id": image_id}).scalar_one_or_none()
         if db_image:
             update_data = image_update.dict(exclude_unset=True, exclude={'character_ids', 'group_ids', 'feature_tag_ids'})
             for field, value in update_data.items():
@@ -1174,18 +1224,11 @@ class ImageService:
     @staticmethod
     def delete_image(db: Session, image_id: str, store_path: str) -> bool:
         """删除图片"""
-        db_image = db.query(models.Image).filter(models.Image.image_id == image_id).first()
+        db_image = db.execute(_IMAGE_BY_ID, {"id": image_id}).scalar_one_or_none()
         if db_image:
             # 删除实际文件
-            try:
-                full_path = os.path.join(settings.BASE_DIR, db_image.file_path)
-                if os.path.exists(full_path):
-                    os.remove(full_path)
-                thumb_path = ImageService.thumb_path(db_image)
-                if os.path.exists(thumb_path):
-                    os.remove(thumb_path)
-            except Exception:
-                pass
+            _remove_file(os.path.join(settings.BASE_DIR, db_image.file_path))
+            _remove_file(ImageService.thumb_path(db_image))
             
             # 删除数据库记录
             db.delete(db_image)
@@ -1197,7 +1240,7 @@ class ImageService:
     def _store_image_files(store_path: str) -> set[str]:
         if not os.path.exists(store_path):
             return set()
-        allowed_extensions = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp'}
+        allowed_extensions = settings.ALLOWED_EXTENSIONS
         files = set()
         for root, _, filenames in os.walk(store_path):
             for filename in filenames:
@@ -1208,6 +1251,23 @@ class ImageService:
                 files.add(rel_path)
         return files
 
+    @staticmethod
+    def _listed_file_checker(store_files: set[str]):
+        """返回按 store 扫描结果判断记录文件是否存在的函数；集合中没有的再逐个确认，避免误判"""
+        def exists(image: models.Image) -> bool:
+            rel_path = (image.file_path or "").replace("\\", "/").lstrip("/")
+            return rel_path in store_files or ImageService.image_file_exists(image)
+        return exists
+
+    @staticmethod
+    def _thumb_ids() -> set[str]:
+        """一次 scandir 取得已有缩略图对应的 image_id，代替逐条 exists 检查"""
+        try:
+            with os.scandir(settings.THUMB_PATH) as entries:
+                return {entry.name[:-5] for entry in entries if entry.name.endswith(".webp")}
+        except FileNotFoundError:
+            return set()
+
     @staticmethod
     def storage_audit(db: Session, store_path: str, update_status: bool = False, sample_limit: int = 10) -> dict:
         images = db.query(models.Image).all()
@@ -1217,6 +1277,8 @@ class ImageService:
             if image.file_path
         }
         store_files = ImageService._store_image_files(store_path)
+        file_exists = ImageService._listed_file_checker(store_files)
+        thumb_ids = ImageService._thumb_ids()
 
         available = 0
         missing = 0
@@ -1228,7 +1290,7 @@ class ImageService:
         thumb_missing_samples = []
 
         for image in images:
-            exists = ImageService.image_file_exists(image)
+            exists = file_exists(image)
             if exists:
                 available += 1
             else:
@@ -1245,7 +1307,7 @@ class ImageService:
             if image.file_status == ImageService.DELETED:
                 deleted += 1
 
-            thumb_exists = os.path.exists(ImageService.thumb_path(image))
+            thumb_exists = image.image_id in thumb_ids
             if exists and not thumb_exists:
                 thumb_missing += 1
                 if len(thumb_missing_samples) < sample_limit:
@@ -1262,7 +1324,7 @@ class ImageService:
                     image.file_status = ImageService.AVAILABLE
                 elif image.file_status != ImageService.ARCHIVED:
                     image.file_status = ImageService.MISSING
-                image.file_checked_at = datetime.utcnow()
+                image.file_checked_at = utc_now()
                 if not exists:
                     image.thumb_status = ImageService.THUMB_MISSING
                 elif thumb_exists:
@@ -1293,19 +1355,20 @@ class ImageService:
         """Archive or delete database records whose image files are missing."""
         count = 0
         images = db.query(models.Image).all()
+        file_exists = ImageService._listed_file_checker(ImageService._store_image_files(store_path))
         
         for image in images:
-            if not ImageService.image_file_exists(image):
+            if not file_exists(image):
                 if mode == "delete":
                     db.delete(image)
                     count += 1
                 elif image.file_status != ImageService.ARCHIVED:
                     image.file_status = ImageService.ARCHIVED
-                    image.file_checked_at = datetime.utcnow()
+                    image.file_checked_at = utc_now()
                     image.thumb_status = ImageService.THUMB_MISSING
                     count += 1
                 else:
-                    image.file_checked_at = datetime.utcnow()
+                    image.file_checked_at = utc_now()
         
         if count > 0:
             db.commit()
@@ -1338,7 +1401,7 @@ class ImageService:
                 ready += 1
             elif image.thumb_status == ImageService.THUMB_MISSING:
                 image.file_status = ImageService.MISSING
-                image.file_checked_at = datetime.utcnow()
+                image.file_checked_at = utc_now()
                 missing += 1
             else:
                 failed += 1
@@ -1359,22 +1422,21 @@ class ImageService:
 
         os.makedirs(temp_path, exist_ok=True)
 
-        allowed_extensions = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp'}
+        allowed_extensions = settings.ALLOWED_EXTENSIONS
         existing_ids = {row[0] for row in db.query(models.Image.image_id).all()}
 
-        moved = 0
-        for filename in os.listdir(store_path):
-            ext = os.path.splitext(filename)[1].lower()
-            if ext not in allowed_extensions:
-                continue
+        with os.scandir(store_path) as it:
+            # 目录项自带类型信息，判断是否为文件不必再 stat
+            entries = [entry for entry in it if entry.is_file()]
 
-            image_id = os.path.splitext(filename)[0]
-            if image_id in existing_ids:
+        moved = 0
+        for entry in entries:
+            filename = entry.name
+            image_id, ext = os.path.splitext(filename)
+            if ext.lower() not in allowed_extensions or image_id in existing_ids:
                 continue
 
-            src_path = os.path.join(store_path, filename)
-            if not os.path.isfile(src_path):
-                continue
+            src_path = entry.path
 
             dest_path = os.path.join(temp_path, filename)
             if os.path.exists(dest_path):
@@ -1396,44 +1458,25 @@ class SystemService:
     @staticmethod
     def get_system_status(db: Session, store_path: str, temp_path: str) -> schemas.SystemStatus:
         """获取系统状态"""
-        total_images = db.query(func.count(models.Image.image_id)).scalar()
-        available_images = db.query(func.count(models.Image.image_id)).filter(
-            models.Image.file_status == ImageService.AVAILABLE
-        ).scalar()
-        missing_images = db.query(func.count(models.Image.image_id)).filter(
-            models.Image.file_status == ImageService.MISSING
-        ).scalar()
-        archived_images = db.query(func.count(models.Image.image_id)).filter(
-            models.Image.file_status == ImageService.ARCHIVED
-        ).scalar()
-        thumb_missing = db.query(func.count(models.Image.image_id)).filter(
-            models.Image.file_status == ImageService.AVAILABLE,
-            models.Image.thumb_status != ImageService.THUMB_READY
-        ).scalar()
-        thumb_failed = db.query(func.count(models.Image.image_id)).filter(
-            models.Image.thumb_status == ImageService.THUMB_FAILED
-        ).scalar()
-        total_groups = db.query(func.count(models.Group.id)).scalar()
-        total_characters = db.query(func.count(models.Character.id)).scalar()
-        
-        # 统计temp目录的图片数量
-        temp_images_count = 0
-        if os.path.exists(temp_path):
-            temp_images_count = len([
-                f for f in os.listdir(temp_path) 
-                if f.lower().endswith(('.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp'))
-            ])
+        # 一条语句取回全部计数：图片按状态条件聚合，分组/角色为标量子查询
+        Image = models.Image
+        counts = db.execute(select(
+            func.count(Image.image_id).label("total_images"),
+            func.count(Image.image_id).filter(Image.file_status == ImageService.AVAILABLE).label("available_images"),
+            func.count(Image.image_id).filter(Image.file_status == ImageService.MISSING).label("missing_images"),
+            func.count(Image.image_id).filter(Image.file_status == ImageService.ARCHIVED).label("archived_images"),
+            func.count(Image.image_id).filter(
+                Image.file_status == ImageService.AVAILABLE,
+                Image.thumb_status != ImageService.THUMB_READY,
+            ).label("thumb_missing"),
+            func.count(Image.image_id).filter(Image.thumb_status == ImageService.THUMB_FAILED).label("thumb_failed"),
+            select(func.count(models.Group.id)).scalar_subquery().label("total_groups"),
+            select(func.count(models.Character.id)).scalar_subquery().label("total_characters"),
+        )).one()
         
         return schemas.SystemStatus(
-            total_images=total_images,
-            available_images=available_images,
-            missing_images=missing_images,
-            archived_images=archived_images,
-            thumb_missing=thumb_missing,
-            thumb_failed=thumb_failed,
-            total_groups=total_groups,
-            total_characters=total_characters,
-            temp_images_count=temp_images_count,
+            **counts._mapping,
+            temp_images_count=len(list_image_files(temp_path)),
             store_path=store_path,
             temp_path=temp_path
         )
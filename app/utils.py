@@ -1,12 +1,44 @@
 import os
 import secrets
 import hashlib
+import json
+import tempfile
+from datetime import datetime, timezone
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
 from PIL import Image
-from typing import Tuple, Optional
+from starlette.concurrency import run_in_threadpool
+from typing import List, Tuple, Optional
 import mimetypes
 from .config import settings
 from .logger import log_info, log_error
 
+try:
+    import xxhash
+except ImportError:  # 可选依赖：pip install picmanager[fast-hash]
+    xxhash = None
+
+try:
+    import orjson
+except ImportError:  # 可选依赖：pip install picmanager[fast-json]
+    orjson = None
+
+if orjson is not None:
+    class DefaultJSONResponse(JSONResponse):
+        """使用 orjson 编码；非字符串键与标准库一样转为字符串"""
+
+        def render(self, content) -> bytes:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+else:
+    DefaultJSONResponse = JSONResponse
+
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+def utc_now() -> datetime:
+    """当前 UTC 时间（naive），与库中已有时间戳保持同一口径；替代已弃用的 datetime.utcnow()"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 def generate_image_id() -> str:
     """生成唯一的10位十六进制图片ID"""
     return secrets.token_hex(5).upper()
@@ -33,19 +65,108 @@ def get_image_info(file_path: str) -> dict:
         
     return info
 
+def _new_hasher(algorithm: str):
+    """创建哈希对象；"fast" 表示只用于校验内容是否变化的非加密哈希"""
+    if algorithm == 'fast':
+        return xxhash.xxh3_128() if xxhash else hashlib.blake2b()
+    if algorithm.startswith('xxh') and xxhash:
+        return getattr(xxhash, algorithm)()
+    return hashlib.new(algorithm)
+
+
 def calculate_file_hash(file_path: str, algorithm: str = 'md5') -> str:
     """计算文件哈希值"""
-    hash_obj = hashlib.new(algorithm)
-    
     try:
-        with open(file_path, 'rb') as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_obj.update(chunk)
+        hash_obj = _new_hasher(algorithm)
+        buffer = bytearray(HASH_CHUNK_SIZE)
+        view = memoryview(buffer)
+        with open(file_path, 'rb', buffering=0) as f:
+            while size := f.readinto(buffer):
+                hash_obj.update(view[:size])
         return hash_obj.hexdigest()
     except Exception as e:
         log_error(f"计算文件哈希失败: {e}")
         return ""
 
+def json_loads(data):
+    """解析 JSON；安装 orjson 时使用更快的实现"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def json_dumps(data) -> str:
+    """序列化为 JSON 字符串（非 ASCII 字符原样保留）；安装 orjson 时使用更快的实现"""
+    if orjson is not None:
+        return orjson.dumps(data).decode()
+    return json.dumps(data, ensure_ascii=False)
+
+def as_int(value) -> Optional[int]:
+    """宽松转换为 int，无法转换时返回 None（用于 image_data 等 JSON 中的 id）"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def as_int_list(values) -> List[int]:
+    """把 JSON 中的 id 列表转换为 int 列表，跳过无法转换的项；非列表返回空列表"""
+    if not isinstance(values, list):
+        return []
+    return [v for v in (as_int(value) for value in values) if v is not None]
+
+def file_extension_of(filename: Optional[str]) -> str:
+    """返回不带点的小写扩展名，没有扩展名时返回空字符串"""
+    # rpartition 只切一刀，不构造列表；与 splitext 一样忽略 ".png" 这类隐藏文件名
+    head, dot, ext = (filename or "").rpartition(".")
+    if not dot or not head.strip(".") or "/" in ext or "\\" in ext:
+        return ""
+    return ext.lower()
+
+
+# str.endswith 接受元组，整组后缀在 C 层一次比较完
+_IMAGE_SUFFIXES = tuple(ext.lower() for ext in settings.ALLOWED_EXTENSIONS)
+
+
+def list_image_files(directory) -> tuple[str, ...]:
+    """单次 scandir 列出目录中的图片文件名；目录项自带类型信息，无需逐个 stat。目录不存在时返回空元组"""
+    try:
+        with os.scandir(directory) as entries:
+            return tuple(
+                entry.name for entry in entries
+                if entry.name.lower().endswith(_IMAGE_SUFFIXES) and entry.is_file()
+            )
+    except FileNotFoundError:
+        return ()
+
+
+def _copy_upload_to_temp(src, suffix: str, max_size: int) -> str:
+    """按块把上传流写入临时文件，超出大小限制时删除已写入的部分"""
+    os.makedirs(settings.TEMP_PATH, exist_ok=True)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix, dir=settings.TEMP_PATH) as temp_file:
+        temp_file_path = temp_file.name
+        try:
+            total = 0
+            while chunk := src.read(UPLOAD_CHUNK_SIZE):
+                total += len(chunk)
+                if total > max_size:
+                    raise HTTPException(status_code=413, detail="File too large")
+                temp_file.write(chunk)
+        except BaseException:
+            temp_file.close()
+            try:
+                os.unlink(temp_file_path)
+            except OSError:
+                pass
+            raise
+    return temp_file_path
+
+
+async def save_upload_to_temp(file: UploadFile, suffix: str) -> str:
+    """把上传文件流式保存到 TEMP_PATH，返回临时文件路径；内存占用与文件大小无关。
+
+    整个复制过程在一个工作线程内完成，不再每个分块都在事件循环和线程池之间切换。
+    """
+    return await run_in_threadpool(_copy_upload_to_temp, file.file, suffix, settings.MAX_FILE_SIZE)
+
 def ensure_directories():
     """确保所有必要的目录存在"""
     directories = [
@@ -67,7 +188,7 @@ def validate_image_file(file_path: str) -> Tuple[bool, Optional[str]]:
         return False, "文件不存在"
     
     # 检查文件扩展名
-    allowed_extensions = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp'}
+    allowed_extensions = settings.ALLOWED_EXTENSIONS
     _, ext = os.path.splitext(file_path.lower())
     
     if ext not in allowed_extensions:
@@ -4,23 +4,28 @@ from fastapi.responses import HTMLResponse, FileResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 from contextlib import asynccontextmanager
+from anyio import to_thread
 from pathlib import Path
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 import os
 import time
 import uvicorn
-from app.database import init_database, create_db_snapshot
-from app.database import get_db_context
-from app.config import settings
+from app.database import init_database, init_snapshot_jobs, stop_snapshot_jobs
+from app.database import get_read_db_context
+from app.counters import stop_counter_flusher
+from app.config import settings, STORE_DIR, THUMB_DIR
 from app.logger import log_http_request, log_info, log_success
 from app.models import Image as ImageModel
 from app.services import ImageService
 from app.routers.admin_routes import router as admin_router
 from app.routers.auth_routes import router as auth_router
+from app.routers.auth import close_qq_http_client, start_session_sweeper, stop_session_sweeper
 from app.routers.integrations.bot import router as bot_router
 from app.routers.integrations.sso import router as sso_router
 from app.routers.public import router as public_router
 from app.routers.system import router as system_router
 from app.security.permissions import require_admin_user_id
+from app.utils import DefaultJSONResponse
 
 UI_ASSET_VERSION = str(int(time.time()))
 
@@ -29,12 +34,19 @@ UI_ASSET_VERSION = str(int(time.time()))
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
     # 启动时执行
+    # 路由均为同步函数，在线程池中执行；放宽默认上限，避免慢请求占满线程导致排队
+    to_thread.current_default_thread_limiter().total_tokens = settings.THREADPOOL_SIZE
     log_info("正在初始化数据库...")
     init_database()
+    init_snapshot_jobs()
+    start_session_sweeper()
     log_success("数据库初始化完成!")
     yield
     # 关闭时执行（如果需要的话）
-    create_db_snapshot()
+    await stop_session_sweeper()
+    stop_counter_flusher()
+    await stop_snapshot_jobs()
+    await close_qq_http_client()
 
 # 创建FastAPI应用
 app = FastAPI(
@@ -42,6 +54,7 @@ app = FastAPI(
     description="图片编号管理系统 - 基于标签的图片元数据管理工具",
     version="0.1.0",
     lifespan=lifespan,
+    default_response_class=DefaultJSONResponse,
     docs_url="/docs" if settings.ENABLE_API_DOCS else None,
     redoc_url="/redoc" if settings.ENABLE_API_DOCS else None,
     openapi_url="/openapi.json" if settings.ENABLE_API_DOCS else None,
@@ -88,22 +101,18 @@ def _safe_store_resource_path(resource_path: str) -> Path:
     if not normalized or normalized.startswith("../") or "/../" in normalized:
         raise FileNotFoundError
 
-    root = Path(settings.STORE_PATH).resolve()
-    path = (root / normalized).resolve()
-    path.relative_to(root)
+    path = (STORE_DIR / normalized).resolve()
+    path.relative_to(STORE_DIR)
     if not path.is_file():
         raise FileNotFoundError
     return path
 
 
 def _thumbnail_path(resource_path: str) -> Path:
-    thumb_root = Path(settings.THUMB_PATH).resolve()
-    thumb_root.mkdir(parents=True, exist_ok=True)
-
     normalized = resource_path.replace("\\", "/").lstrip("/")
     image_id = Path(normalized).stem
-    thumb = (thumb_root / f"{image_id}.webp").resolve()
-    thumb.relative_to(thumb_root)
+    thumb = (THUMB_DIR / f"{image_id}.webp").resolve()
+    thumb.relative_to(THUMB_DIR)
     if thumb.is_file():
         return thumb
     raise FileNotFoundError
@@ -113,7 +122,7 @@ def _original_from_thumbnail_request(resource_path: str) -> Path:
     image_id = Path(resource_path.replace("\\", "/").lstrip("/")).stem
     if not image_id:
         raise FileNotFoundError
-    with get_db_context() as db:
+    with get_read_db_context() as db:
         image = db.query(ImageModel).filter(
             ImageModel.image_id == image_id,
             ImageModel.file_status == ImageService.AVAILABLE
@@ -136,6 +145,12 @@ async def prevent_stale_ui_cache(request: Request, call_next):
     return response
 
 
+@app.exception_handler(PoolTimeoutError)
+async def database_busy(request: Request, exc: PoolTimeoutError):
+    """写连接池取连接超时：返回 503 让客户端稍后重试，而不是 500"""
+    return DefaultJSONResponse(status_code=503, content={"detail": "数据库繁忙，请稍后重试"})
+
+
 # 配置CORS
 app.add_middleware(
     CORSMiddleware,
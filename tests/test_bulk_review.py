@@ -0,0 +1,90 @@
+import json
+from contextlib import contextmanager
+
+from fastapi import BackgroundTasks
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import schemas
+from app.models import Base, Group, PendingRequest, RequestStatus
+from app.routers.admin_api import reviews as review_routes
+from app.services import ImageService
+
+
+def _failing_update_image(db, image_id, image_update):
+    db.add(Group(name='ghost'))
+    db.flush()
+    raise RuntimeError('approval failed')
+
+
+def test_bulk_review_handles_each_request_independently(tmp_path, monkeypatch):
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+    pending_file = tmp_path / 'pending.png'
+    pending_file.write_bytes(b'png')
+
+    with session_factory() as db:
+        db.add_all([
+            PendingRequest(id=1, request_type='group_add', image_data=json.dumps({'name': 'alpha'})),
+            PendingRequest(id=2, request_type='edit', image_id='ABCDEF1234', image_data=json.dumps({})),
+            PendingRequest(id=3, request_type='add', temp_file_path=str(pending_file), original_filename='a.png'),
+            PendingRequest(id=4, request_type='group_add', status=RequestStatus.APPROVED,
+                           image_data=json.dumps({'name': 'done'})),
+            PendingRequest(id=5, request_type='group_add', image_data=json.dumps({'name': 'beta'})),
+        ])
+        db.commit()
+
+    @contextmanager
+    def database_context():
+        db = session_factory()
+        try:
+            yield db
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    monkeypatch.setattr(review_routes, 'get_db_context', database_context)
+    monkeypatch.setattr(review_routes, 'require_admin_user_id', lambda request, db=None: 1)
+    monkeypatch.setattr(ImageService, 'update_image', staticmethod(_failing_update_image))
+
+    background_tasks = BackgroundTasks()
+    response = review_routes.handle_pending_requests_bulk(
+        schemas.PendingRequestBulkAction(actions=[
+            {'request_id': 1, 'action': 'approve'},
+            {'request_id': 2, 'action': 'approve'},
+            {'request_id': 3, 'action': 'reject', 'reason': ' blurry '},
+            {'request_id': 4, 'action': 'approve'},
+            {'request_id': 5, 'action': 'approve'},
+            {'request_id': 999, 'action': 'reject'},
+        ]),
+        request=None,
+        background_tasks=background_tasks,
+    )
+
+    results = response['results']
+    assert results[1] == {'status': 'approved'}
+    assert results[2] == {'status': 'error', 'detail': 'approval failed'}
+    assert results[3] == {'status': 'rejected'}
+    assert results[4]['status'] == 'error'
+    assert results[5] == {'status': 'approved'}
+    assert results[999]['status'] == 'error'
+
+    with session_factory() as db:
+        statuses = dict(db.query(PendingRequest.id, PendingRequest.status).all())
+        assert statuses == {
+            1: RequestStatus.APPROVED,
+            2: RequestStatus.PENDING,
+            3: RequestStatus.REJECTED,
+            4: RequestStatus.APPROVED,
+            5: RequestStatus.APPROVED,
+        }
+        assert db.get(PendingRequest, 3).rejection_reason == 'blurry'
+        assert sorted(name for (name,) in db.query(Group.name)) == ['alpha', 'beta']
+
+    assert pending_file.exists()
+    assert [task.args for task in background_tasks.tasks] == [(str(pending_file),)]
@@ -0,0 +1,59 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import counters, database
+from app.models import Base, Character, CharacterQueryCount, Group, ImageViewCount
+
+
+@pytest.fixture
+def counter_engine(monkeypatch):
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(database, 'engine', engine)
+    counters._swap_buffers()
+    yield engine
+    counters._swap_buffers()
+
+
+def test_buffered_counts_are_flushed_and_accumulated(counter_engine):
+    with sessionmaker(bind=counter_engine)() as db:
+        group = Group(name='group')
+        db.add(group)
+        db.flush()
+        db.add(Character(name='character', group_id=group.id))
+        db.commit()
+        character_id = db.query(Character.id).scalar()
+
+    for _ in range(3):
+        counters.bump_image_view('ABCDEF1234')
+    counters.bump_character_query(character_id)
+    counters.bump_character_query(character_id + 100)
+    counters.flush_counters()
+    counters.bump_image_view('ABCDEF1234')
+    counters.flush_counters()
+
+    with sessionmaker(bind=counter_engine)() as db:
+        assert db.query(ImageViewCount.view_count).filter_by(image_id='ABCDEF1234').scalar() == 4
+        assert [row.character_id for row in db.query(CharacterQueryCount)] == [character_id]
+
+
+def test_failed_flush_keeps_counts_buffered(counter_engine, monkeypatch):
+    counters.bump_image_view('ABCDEF1234')
+    counters.bump_image_view('ABCDEF1234')
+
+    class BrokenEngine:
+        def begin(self):
+            raise RuntimeError('database is locked')
+
+    monkeypatch.setattr(database, 'engine', BrokenEngine())
+    with pytest.raises(RuntimeError):
+        counters.flush_counters()
+    counters.bump_image_view('ABCDEF1234')
+
+    monkeypatch.setattr(database, 'engine', counter_engine)
+    counters.stop_counter_flusher()
+
+    with sessionmaker(bind=counter_engine)() as db:
+        assert db.query(ImageViewCount.view_count).filter_by(image_id='ABCDEF1234').scalar() == 3
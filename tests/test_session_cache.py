@@ -0,0 +1,61 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.models import Base, UserSession
+from app.routers import auth
+from app.security import session_cache
+from app.utils import utc_now
+
+
+@pytest.fixture
+def db():
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    Base.metadata.create_all(engine)
+    session_cache._entries.clear()
+    with sessionmaker(bind=engine)() as db:
+        yield db
+    session_cache._entries.clear()
+
+
+def _record_statements(db):
+    statements = []
+    event.listen(db.get_bind(), 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    return statements
+
+
+def test_repeated_lookup_is_served_from_cache(db):
+    session_id = auth.create_session(db, None, guest_ip='127.0.0.1')
+    first = auth.get_session(db, session_id)
+
+    statements = _record_statements(db)
+    second = auth.get_session(db, session_id)
+
+    assert second == first
+    assert second is not first
+    assert statements == []
+
+
+def test_cached_session_expires_at_expires_at(db, monkeypatch):
+    session_id = auth.create_session(db, None, guest_ip='127.0.0.1', timeout=60)
+    assert auth.get_session(db, session_id) is not None
+
+    later = utc_now() + timedelta(seconds=61)
+    monkeypatch.setattr(auth, 'utc_now', lambda: later)
+
+    assert auth.get_session(db, session_id) is None
+    assert session_id not in session_cache._entries
+    assert db.query(UserSession).count() == 0
+
+
+def test_delete_session_invalidates_cache(db):
+    session_id = auth.create_session(db, None, guest_ip='127.0.0.1')
+    assert auth.get_session(db, session_id) is not None
+
+    auth.delete_session(db, session_id)
+
+    assert session_id not in session_cache._entries
+    assert auth.get_session(db, session_id) is None
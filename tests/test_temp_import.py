@@ -0,0 +1,107 @@
+from contextlib import contextmanager
+
+import pytest
+from fastapi import BackgroundTasks
+from PIL import Image
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import schemas
+from app.models import Base, Image as ImageModel
+from app.routers.public_api import uploads as upload_routes
+
+
+def test_failed_commit_keeps_temp_image(tmp_path, monkeypatch):
+    temp_dir = tmp_path / 'temp'
+    store_dir = tmp_path / 'store'
+    temp_dir.mkdir()
+    temp_file = temp_dir / 'upload.png'
+    Image.new('RGB', (8, 8), 'red').save(temp_file)
+
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+
+    @contextmanager
+    def database_context():
+        db = session_factory()
+
+        def fail_commit():
+            raise RuntimeError('database is locked')
+
+        db.commit = fail_commit
+        try:
+            yield db
+        finally:
+            db.rollback()
+            db.close()
+
+    invalidated = []
+    monkeypatch.setattr(upload_routes, 'get_db_context', database_context)
+    monkeypatch.setattr(upload_routes, 'require_admin_user_id', lambda request, db=None: 1)
+    monkeypatch.setattr(upload_routes, 'invalidate', lambda *namespaces: invalidated.extend(namespaces))
+    monkeypatch.setattr(upload_routes, 'TEMP_DIR', temp_dir.resolve())
+    monkeypatch.setattr(upload_routes.settings, 'STORE_PATH', str(store_dir))
+
+    with pytest.raises(RuntimeError):
+        upload_routes.upload_temp_image(
+            schemas.TempImageUpload(filename='upload.png', character_ids=[]),
+            request=None,
+            background_tasks=BackgroundTasks(),
+        )
+
+    assert temp_file.is_file()
+    assert list(store_dir.iterdir()) == []
+    assert invalidated == []
+    with session_factory() as db:
+        assert db.query(ImageModel).count() == 0
+
+
+def test_import_reuses_verified_image_info(tmp_path, monkeypatch):
+    temp_dir = tmp_path / 'temp'
+    store_dir = tmp_path / 'store'
+    temp_dir.mkdir()
+    temp_file = temp_dir / 'upload.png'
+    Image.new('RGB', (12, 7), 'red').save(temp_file)
+    file_size = temp_file.stat().st_size
+
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+
+    @contextmanager
+    def database_context():
+        db = session_factory()
+        try:
+            yield db
+            db.commit()
+        finally:
+            db.close()
+
+    opened = []
+    real_open = Image.open
+    monkeypatch.setattr(Image, 'open', lambda fp, *args, **kwargs: opened.append(fp) or real_open(fp, *args, **kwargs))
+    received = []
+    real_create_image = upload_routes.ImageService.create_image
+    monkeypatch.setattr(upload_routes.ImageService, 'create_image', staticmethod(
+        lambda *args, **kwargs: received.append(dict(kwargs['image_info'])) or real_create_image(*args, **kwargs)
+    ))
+    monkeypatch.setattr(upload_routes, 'get_db_context', database_context)
+    monkeypatch.setattr(upload_routes, 'require_admin_user_id', lambda request, db=None: 1)
+    monkeypatch.setattr(upload_routes, 'invalidate', lambda *namespaces: None)
+    monkeypatch.setattr(upload_routes, 'TEMP_DIR', temp_dir.resolve())
+    monkeypatch.setattr(upload_routes.settings, 'STORE_PATH', str(store_dir))
+
+    response = upload_routes.upload_temp_image(
+        schemas.TempImageUpload(filename='upload.png', character_ids=[]),
+        request=None,
+        background_tasks=BackgroundTasks(),
+    )
+
+    assert received == [{'file_size': file_size, 'width': 12, 'height': 7}]
+    assert len(opened) == 1
+    with session_factory() as db:
+        image = db.get(ImageModel, response.image_id)
+        assert (image.width, image.height, image.file_size) == (12, 7, file_size)
+    assert not temp_file.exists()